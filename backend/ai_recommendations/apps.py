@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AiRecommendationsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ai_recommendations"
+
+    def ready(self):
+        import ai_recommendations.signals  # Ensure signals are loaded
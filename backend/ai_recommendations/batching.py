@@ -0,0 +1,93 @@
+# ai_recommendations/batching.py
+"""
+Micro-batching for concurrent embedding requests.
+
+Instead of every request thread running its own one-sentence forward pass,
+submissions are queued and a background thread runs them together: it
+waits at most ``window_ms`` after the first pending item, or until
+``max_batch`` items are queued, then calls ``fn`` once with the whole batch.
+Each caller gets its result back through a ``concurrent.futures.Future``.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch=32, window_ms=5):
+        """``fn`` maps a list of items to a same-length sequence of results."""
+        self.fn = fn
+        self.max_batch = max_batch
+        self.window = window_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked child where the thread did not survive.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='ai-micro-batcher', daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((item, future))
+        return future
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            pending = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not pending:
+                continue
+            items = [item for item, _ in pending]
+            futures = [future for _, future in pending]
+            try:
+                results = self.fn(items)
+            except Exception as e:
+                logger.exception("Micro-batch of %d items failed", len(items))
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+
+def embed_unique(get_embeddings):
+    """Wrap ``get_embeddings`` so identical texts in one batch are encoded once."""
+    def embed(texts):
+        unique = list(dict.fromkeys(texts))
+        vectors = get_embeddings(unique)
+        by_text = dict(zip(unique, vectors))
+        return [by_text[text] for text in texts]
+    return embed
@@ -0,0 +1,491 @@
+# ai_recommendations/benchmarks.py
+"""
+Benchmarks for the recommendation stack.
+
+Run them with ``python manage.py benchmark_ai <suite>``; every suite returns
+a JSON-serialisable dict.
+"""
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+from django.conf import settings
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (ru_maxrss is KiB on Linux)."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+# ========== Startup ==========
+
+# Runs in a fresh interpreter so import cost and RSS are not shared with the caller.
+STARTUP_PROBE = """
+import json, resource, time
+start = time.perf_counter()
+import django
+django.setup()
+from ai_recommendations.views import get_embeddings
+imported = time.perf_counter()
+rss_after_import = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+get_embeddings(["web app using django"])
+done = time.perf_counter()
+print(json.dumps({
+    "import_s": round(imported - start, 3),
+    "first_embedding_s": round(done - imported, 3),
+    "rss_after_import_mb": round(rss_after_import, 1),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}))
+"""
+
+
+def _run_startup_probe(socket_path):
+    env = dict(os.environ, AI_INFERENCE_WORKER_SOCKET=socket_path)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'project.settings')
+    result = subprocess.run(
+        [sys.executable, '-c', STARTUP_PROBE],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run_startup(options):
+    """
+    Startup time and RSS of a web process with the model in-process (the old
+    behaviour) versus delegating to the inference worker on ``--socket``.
+    """
+    results = {'in_process': _run_startup_probe('')}
+    socket_path = options.get('socket') or settings.AI_INFERENCE_WORKER_SOCKET
+    if socket_path:
+        results['worker_client'] = _run_startup_probe(socket_path)
+    return results
+
+
+# ========== Encoder ==========
+
+WORDS = (
+    "build a rest api with django models views serializers authentication "
+    "react frontend dashboard charts database queries testing deployment "
+    "docker linux algorithms data structures machine learning pipeline"
+).split()
+
+
+def synthetic_texts(count, seed=0):
+    """Descriptions of widely varying length, like real assignment briefs."""
+    rng = random.Random(seed)
+    return [" ".join(rng.choices(WORDS, k=rng.randint(5, 300))) for _ in range(count)]
+
+
+def run_encode(options):
+    """
+    Throughput and peak RSS of the chunked encoder per batch size.
+
+    Batch sizes run in ascending order; ru_maxrss only grows, so each peak
+    includes the smaller runs before it.
+    """
+    from . import model
+
+    model.load_model()
+    texts = synthetic_texts(options.get('texts') or 2000)
+    results = {'texts': len(texts), 'baseline_rss_mb': round(peak_rss_mb(), 1), 'runs': []}
+    for batch_size in sorted(options.get('batch_sizes') or [8, 32, 128]):
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - start
+        results['runs'].append({
+            'batch_size': batch_size,
+            'seconds': round(elapsed, 2),
+            'texts_per_s': round(len(texts) / elapsed, 1),
+            'peak_rss_mb': round(peak_rss_mb(), 1),
+        })
+    return results
+
+
+# ========== Vector index ==========
+
+def synthetic_snapshot(size, dim, seed=0, clusters=256):
+    """Clustered unit vectors with course/difficulty columns, shaped like the store."""
+    from .embedding_store import Snapshot, normalize
+
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    vectors = np.empty((size, dim), dtype=np.float32)
+    for start in range(0, size, 65536):
+        n = min(65536, size - start)
+        vectors[start:start + n] = centers[rng.integers(clusters, size=n)] + rng.normal(scale=0.6, size=(n, dim))
+    return Snapshot(
+        generation=0,
+        ids=np.arange(size, dtype=np.int64),
+        vectors=normalize(vectors),
+        course_ids=rng.integers(1, 51, size=size),
+        difficulties=rng.choice(np.array([b"easy", b"medium", b"hard"], dtype="S10"), size=size),
+    )
+
+
+def _percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3)
+
+
+def run_index(options):
+    """
+    Latency of the exact and IVF backends, and IVF recall@N against the exact
+    result, at several catalog sizes (1M x 768 float32 needs ~3 GB of RAM).
+    """
+    from .vector_index import ExactIndex, IVFIndex
+
+    dim = options.get('dim') or 768
+    top_n = options.get('top_n') or 10
+    queries = options.get('queries') or 200
+    results = []
+    for size in options.get('sizes') or [10_000, 100_000, 1_000_000]:
+        snapshot = synthetic_snapshot(size, dim)
+        rng = np.random.default_rng(1)
+        probes = snapshot.vectors[rng.integers(size, size=queries)] + rng.normal(scale=0.3, size=(queries, dim))
+
+        start = time.perf_counter()
+        ivf = IVFIndex(snapshot)
+        build_s = time.perf_counter() - start
+        exact = ExactIndex(snapshot)
+
+        row = {'size': size, 'dim': dim, 'ivf_lists': ivf.n_lists, 'ivf_probe': ivf.n_probe,
+               'ivf_build_s': round(build_s, 2)}
+        for label, filters in (('unfiltered', {}), ('course_difficulty', {'course_id': 7, 'difficulty': 'easy'})):
+            timings = {'exact': [], 'ivf': []}
+            recall = []
+            for query in probes:
+                t0 = time.perf_counter()
+                truth, _ = exact.search(query, top_n, **filters)
+                t1 = time.perf_counter()
+                approx, _ = ivf.search(query, top_n, **filters)
+                t2 = time.perf_counter()
+                timings['exact'].append(t1 - t0)
+                timings['ivf'].append(t2 - t1)
+                recall.append(len(set(truth.tolist()) & set(approx.tolist())) / max(len(truth), 1))
+            row[label] = {
+                f"{name}_p{q}_ms": _percentile_ms(samples, q)
+                for name, samples in timings.items() for q in (50, 95)
+            }
+            row[label][f"ivf_recall_at_{top_n}"] = round(float(np.mean(recall)), 4)
+        results.append(row)
+        del snapshot, exact, ivf
+    return {'top_n': top_n, 'queries': queries, 'results': results}
+
+
+# ========== Micro-batching ==========
+
+def _drive_concurrently(embed, texts, concurrency):
+    from concurrent.futures import ThreadPoolExecutor
+
+    def timed(text):
+        start = time.perf_counter()
+        embed(text)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, texts))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests_per_s': round(len(texts) / elapsed, 1),
+        'p50_ms': _percentile_ms(latencies, 50),
+        'p95_ms': _percentile_ms(latencies, 95),
+    }
+
+
+def run_batching(options):
+    """
+    Throughput of concurrent one-brief embedding requests: each thread
+    running its own forward pass versus the micro-batcher.
+    """
+    from .batching import MicroBatcher, embed_unique
+    from .inference import get_embeddings
+
+    get_embeddings(["warm up"])
+    requests = options.get('texts') or 512
+    texts = [" ".join(words) for words in (t.split()[:12] for t in synthetic_texts(requests, seed=2))]
+    window_ms = options.get('window_ms') if options.get('window_ms') is not None else settings.AI_BATCH_WINDOW_MS
+    max_batch = options.get('max_batch') or settings.AI_BATCH_MAX_SIZE
+    batcher = MicroBatcher(embed_unique(get_embeddings), max_batch=max_batch, window_ms=window_ms)
+
+    results = {'requests': requests, 'window_ms': window_ms, 'max_batch': max_batch, 'runs': []}
+    for concurrency in options.get('concurrency') or [1, 8, 32]:
+        direct = _drive_concurrently(lambda text: get_embeddings([text])[0], texts, concurrency)
+        batches_before, items_before = batcher.batches, batcher.items
+        batched = _drive_concurrently(lambda text: batcher.submit(text).result(), texts, concurrency)
+        batches = batcher.batches - batches_before
+        batched['mean_batch_size'] = round((batcher.items - items_before) / batches, 1) if batches else None
+        results['runs'].append({'concurrency': concurrency, 'direct': direct, 'micro_batched': batched})
+    return results
+
+
+# ========== Quantization ==========
+
+DEFAULT_BRIEFS = [
+    "web app using django",
+    "rest api with authentication",
+    "data structures and algorithms practice",
+    "machine learning model training",
+    "responsive frontend with react",
+]
+
+
+def assignment_corpus():
+    """(titles, descriptions) of the existing assignments, or of data/assignments.csv when the table is empty."""
+    import csv
+    from django.db import DatabaseError
+    from apps.assignments.models import Assignment
+
+    try:
+        rows = list(Assignment.objects.values_list('title', 'description'))
+    except DatabaseError:
+        rows = []
+    if not rows:
+        with open(settings.BASE_DIR / 'data' / 'assignments.csv', newline='') as fh:
+            rows = [(row['title'], row['description']) for row in csv.DictReader(fh)]
+    return [title for title, _ in rows], [description for _, description in rows]
+
+
+def _weights_mb(module):
+    import io
+    import torch
+
+    buffer = io.BytesIO()
+    torch.save(module.state_dict(), buffer)
+    return round(buffer.tell() / 2 ** 20, 1)
+
+
+def stored_corpus(store):
+    """
+    The store's current snapshot and the descriptions of its rows, in row
+    order; None when it is empty or behind the assignments table.
+    """
+    from apps.assignments.models import Assignment
+
+    snapshot = store.load()
+    if not len(snapshot.ids):
+        return None
+    assignments = Assignment.objects.in_bulk(snapshot.ids.tolist())
+    if len(assignments) != len(snapshot.ids):
+        return None
+    return snapshot, [assignments[pk].description for pk in snapshot.ids.tolist()]
+
+
+def run_quantization(options):
+    """
+    Float32 baseline versus the int8 fast mode on the existing assignments:
+    model load RSS, weight size, corpus and single-brief latency, storage
+    size per vector dtype, and top-N overlap with the float32 ranking for
+    every pairing of corpus model, query model and storage dtype. When the
+    embedding store is in step with the table, its own vectors (as served)
+    are also ranked against the queries of each model, which is the
+    production pairing.
+    """
+    from . import model
+    from .embedding_store import DTYPES, EmbeddingStore, Snapshot, normalize, quantize
+    from .vector_index import ExactIndex
+
+    top_n = options.get('top_n') or 5
+    titles, descriptions = assignment_corpus()
+    stored = stored_corpus(EmbeddingStore())
+    if stored is not None:
+        # Rank the store's rows, so its vectors line up with the fresh encodings
+        descriptions = stored[1]
+    queries = DEFAULT_BRIEFS + titles
+    results = {'assignments': len(descriptions), 'queries': len(queries), 'top_n': top_n, 'models': {}, 'agreement': {}}
+
+    encoded = {}
+    for quantized in (False, True):
+        label = 'int8' if quantized else 'float32'
+        rss_before = peak_rss_mb()
+        _, module = model.load_model(quantized)
+        rss_loaded = peak_rss_mb()
+
+        start = time.perf_counter()
+        corpus = normalize(model.encode(descriptions, quantized=quantized))
+        corpus_s = time.perf_counter() - start
+
+        latencies, query_vectors = [], []
+        for query in queries:
+            start = time.perf_counter()
+            query_vectors.append(model.encode([query], quantized=quantized)[0])
+            latencies.append(time.perf_counter() - start)
+
+        encoded[label] = (corpus, normalize(np.stack(query_vectors)))
+        results['models'][label] = {
+            'load_rss_delta_mb': round(rss_loaded - rss_before, 1),
+            'weights_mb': _weights_mb(module),
+            'corpus_encode_s': round(corpus_s, 3),
+            'brief_p50_ms': _percentile_ms(latencies, 50),
+            'brief_p95_ms': _percentile_ms(latencies, 95),
+        }
+
+    def ranking(index, query_vectors):
+        return [set(index.search(q, top_n)[0].tolist()) for q in query_vectors]
+
+    def corpus_index(corpus, dtype):
+        vectors, scales = quantize(corpus, DTYPES[dtype])
+        return ExactIndex(Snapshot(0, np.arange(len(corpus)), vectors, np.zeros(len(corpus)),
+                                   np.zeros(len(corpus), dtype="S10"), scales)), vectors.nbytes
+
+    def agreement(ranked, nbytes):
+        overlap = [len(a & b) / max(len(a), 1) for a, b in zip(baseline, ranked)]
+        return {
+            f"top_{top_n}_overlap": round(float(np.mean(overlap)), 4),
+            'store_bytes_per_vector': nbytes // max(len(descriptions), 1),
+        }
+
+    baseline = ranking(corpus_index(encoded['float32'][0], 'float32')[0], encoded['float32'][1])
+    for corpus_label, (corpus, _) in encoded.items():
+        for dtype in DTYPES:
+            index, nbytes = corpus_index(corpus, dtype)
+            for query_label, (_, query_vectors) in encoded.items():
+                results['agreement'][f"{corpus_label}_corpus/{query_label}_queries/{dtype}_store"] = agreement(
+                    ranking(index, query_vectors), nbytes
+                )
+
+    if stored is not None:
+        snapshot = stored[0]
+        index = ExactIndex(snapshot)
+        nbytes = snapshot.vectors.nbytes + (snapshot.scales.nbytes if snapshot.scales is not None else 0)
+        for query_label, (_, query_vectors) in encoded.items():
+            results['agreement'][f"store_{snapshot.mode}_corpus/{query_label}_queries"] = agreement(
+                ranking(index, query_vectors), nbytes
+            )
+    return results
+
+
+# ========== Endpoint ==========
+
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+
+
+def seed_catalog(courses, assignments, seed=0):
+    """Bulk-create synthetic courses and assignments; returns the course names."""
+    from django.utils import timezone
+    from apps.assignments.models import Assignment
+    from apps.courses.models import Course
+
+    rng = random.Random(seed)
+    now = timezone.now()
+    course_rows = Course.objects.bulk_create([
+        Course(name=f"Benchmark Course {i}", description="Synthetic course for benchmark_ai endpoint")
+        for i in range(courses)
+    ])
+    texts = synthetic_texts(assignments, seed=seed)
+    for start in range(0, assignments, 5000):
+        Assignment.objects.bulk_create([
+            Assignment(
+                title=f"Benchmark Assignment {i}",
+                description=texts[i],
+                course=rng.choice(course_rows),
+                difficulty=rng.choice(DIFFICULTIES),
+                due_date=now,
+                end_date=now + timezone.timedelta(days=7),
+                file_url="https://example.com/benchmark",
+            )
+            for i in range(start, min(start + 5000, assignments))
+        ])
+    return [course.name for course in course_rows]
+
+
+def _latency_summary(samples):
+    return {f"p{q}_ms": _percentile_ms(samples, q) for q in (50, 95, 99)} | {'requests': len(samples)}
+
+
+def _time_requests(view, factory, param_sets):
+    latencies = []
+    for params in param_sets:
+        request = factory.get('/ai/recommendations/', params)
+        start = time.perf_counter()
+        response = view(request)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 500:
+            raise RuntimeError(f"get_recommendations failed for {params}: {response.content[:200]!r}")
+    return latencies
+
+
+def run_endpoint(options):
+    """
+    Seed a synthetic catalog (rolled back afterwards), build its embedding
+    store in a temporary directory, and drive get_recommendations for
+    method_choice=1, 2 and 3. Cold is the first pass over a set of distinct
+    requests (empty query cache), warm is the same set repeated.
+    """
+    import tempfile
+    from django.db import transaction
+    from django.test import RequestFactory
+    from . import views
+    from .embedding_store import EmbeddingStore
+
+    course_count = options.get('courses') or 50
+    assignment_count = options.get('assignments') or 5000
+    request_count = options.get('requests') or 100
+    top_n = options.get('top_n') or 4
+    rng = random.Random(1)
+    factory = RequestFactory()
+    results = {
+        'courses': course_count,
+        'assignments': assignment_count,
+        'requests_per_phase': request_count,
+        'top_n': top_n,
+        'vector_index': settings.AI_VECTOR_INDEX,
+        'embedding_dtype': settings.AI_EMBEDDING_DTYPE,
+        'quantized_inference': settings.AI_QUANTIZED_INFERENCE,
+        'inference_worker': bool(settings.AI_INFERENCE_WORKER_SOCKET),
+    }
+
+    real_store = views.embedding_store
+    with tempfile.TemporaryDirectory() as store_dir, transaction.atomic():
+        try:
+            start = time.perf_counter()
+            course_names = seed_catalog(course_count, assignment_count)
+            results['seed_s'] = round(time.perf_counter() - start, 2)
+
+            views.embedding_store = EmbeddingStore(store_dir)
+            start = time.perf_counter()
+            views.refresh_embeddings()
+            results['embeddings_build_s'] = round(time.perf_counter() - start, 2)
+
+            method_1 = [
+                {'method_choice': '1', 'course_name': rng.choice(course_names),
+                 'difficulty': rng.choice(DIFFICULTIES), 'top_n': top_n}
+                for _ in range(request_count)
+            ]
+            method_2 = [
+                {'method_choice': '2', 'brief_description': brief, 'top_n': top_n}
+                for brief in synthetic_texts(request_count, seed=3)
+            ]
+            method_3 = [
+                dict(params, method_choice='3', brief_description=brief)
+                for params, brief in zip(method_1, synthetic_texts(request_count, seed=4))
+            ]
+
+            for label, param_sets in (('method_1', method_1), ('method_2', method_2), ('method_3', method_3)):
+                views.query_cache.clear()
+                results[label] = {
+                    'cold': _latency_summary(_time_requests(views.get_recommendations, factory, param_sets)),
+                    'warm': _latency_summary(_time_requests(views.get_recommendations, factory, param_sets)),
+                }
+            results['query_cache'] = views.query_cache.stats()
+        finally:
+            views.embedding_store = real_store
+            views.query_cache.clear()
+            transaction.set_rollback(True)
+
+    results['peak_rss_mb'] = round(peak_rss_mb(), 1)
+    return results
+
+
+SUITES = {
+    'startup': run_startup,
+    'encode': run_encode,
+    'index': run_index,
+    'batching': run_batching,
+    'quantization': run_quantization,
+    'endpoint': run_endpoint,
+}
@@ -0,0 +1,305 @@
+# ai_recommendations/embedding_store.py
+
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the meaning of the stored vectors changes so every row is re-encoded.
+FORMAT_VERSION = 5
+
+INDEX_FILE = "index.npz"
+LOCK_FILE = ".lock"
+MATRIX_FILE = "embeddings-{generation}.vec"
+# Per-generation files; the previous generation is kept until the next one is written.
+GENERATION_FILES = [MATRIX_FILE, "ivf-{generation}.npz"]
+
+# Storage types for the vectors (AI_EMBEDDING_DTYPE); the position is the on-disk code.
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+DTYPE_CODES = list(DTYPES)
+
+# Model the vectors were encoded with (AI_QUANTIZED_INFERENCE); the position is the on-disk code.
+MODEL_MODES = ["float32", "int8"]
+
+# One generation of the store. ``vectors`` are L2-normalised, so a dot product
+# is the cosine similarity (times ``scales`` for int8 storage, else None);
+# ``course_ids`` (rows are sorted by course) and ``difficulties`` (lower-cased
+# bytes) allow filtering without touching the database.
+Snapshot = namedtuple(
+    "Snapshot", ["generation", "ids", "vectors", "course_ids", "difficulties", "scales", "mode"],
+    defaults=[None, None],
+)
+
+
+def model_mode():
+    """The model queries and new rows are encoded with: "int8" in the quantized fast mode, else "float32"."""
+    return "int8" if settings.AI_QUANTIZED_INFERENCE else "float32"
+
+
+def content_hash(text, mode="float32"):
+    """
+    SHA-1 digest of a description and the model ``mode`` it is encoded with,
+    used to detect rows that need re-encoding (a mode switch changes them all).
+    """
+    return hashlib.sha1(f"{mode}\0{text or ''}".encode("utf-8")).digest()
+
+
+def normalize(vectors):
+    """L2-normalise rows in place (zero rows are left as zeros)."""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    return vectors
+
+
+def quantize(vectors, dtype):
+    """
+    Convert float32 rows to the storage ``dtype``. int8 uses a symmetric
+    per-row scale, returned alongside (None for float types).
+    """
+    if dtype is np.int8:
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales[scales == 0] = 1.0
+        return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    return vectors.astype(dtype), None
+
+
+def dequantize(vectors, scales=None):
+    """float32 copy of stored rows."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors * scales[:, None] if scales is not None else vectors
+
+
+def empty_snapshot(dim=0, generation=0):
+    return Snapshot(
+        generation=generation,
+        ids=np.empty(0, dtype=np.int64),
+        vectors=np.empty((0, dim), dtype=np.float32),
+        course_ids=np.empty(0, dtype=np.int64),
+        difficulties=np.empty(0, dtype="S10"),
+    )
+
+
+class EmbeddingStore:
+    """
+    On-disk store of assignment embeddings.
+
+    The vectors live in a matrix file (float32, float16 or int8 with per-row
+    scales, see ``AI_EMBEDDING_DTYPE``) that every worker memory-maps
+    read-only; a small index maps each row to its assignment id, course,
+    difficulty and the hash of the description it was encoded from (with
+    the model mode, recorded in the header too). Writers build a new matrix
+    file, then atomically swap the index, so readers never see a
+    half-written store.
+    """
+
+    def __init__(self, directory=None, chunk_size=1024, dtype=None, mode=None):
+        self.directory = Path(directory or settings.AI_EMBEDDINGS_DIR)
+        self.chunk_size = chunk_size
+        self.dtype = DTYPES[dtype or settings.AI_EMBEDDING_DTYPE]
+        self.mode = mode  # None follows AI_QUANTIZED_INFERENCE
+        self._lock = threading.Lock()
+        self._loaded_key = None
+        self._snapshot = empty_snapshot()
+        self._hashes = np.empty(0, dtype="S20")
+
+    @property
+    def index_path(self):
+        return self.directory / INDEX_FILE
+
+    @property
+    def model_mode(self):
+        return self.mode or model_mode()
+
+    # ========== Reading ==========
+
+    def load(self):
+        """
+        Return the current :class:`Snapshot`.
+
+        The index file is re-read only when it has been replaced, so calling this
+        on every request costs a single ``stat``.
+        """
+        try:
+            stat = self.index_path.stat()
+        except FileNotFoundError:
+            return self._snapshot
+
+        # os.replace() gives every new index a fresh inode.
+        key = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if key != self._loaded_key:
+                try:
+                    self._read_index()
+                except FileNotFoundError:
+                    # Two syncs swapped the index and removed its matrix while we read it.
+                    logger.info("Embedding store changed while loading; reading it again.")
+                    stat = self.index_path.stat()
+                    key = (stat.st_ino, stat.st_mtime_ns)
+                    self._read_index()
+                self._loaded_key = key
+            return self._snapshot
+
+    def _read_index(self):
+        with np.load(self.index_path) as index:
+            meta = [int(v) for v in index["meta"]]
+            if meta[0] != FORMAT_VERSION:
+                self._snapshot, self._hashes = empty_snapshot(generation=meta[1]), np.empty(0, dtype="S20")
+                return
+            _, generation, dim, dtype_code, mode_code = meta
+            ids = index["ids"]
+            hashes = index["hashes"]
+            course_ids = index["course_ids"]
+            difficulties = index["difficulties"]
+            scales = index["scales"] if len(index["scales"]) else None
+
+        dtype = DTYPES[DTYPE_CODES[dtype_code]]
+        if len(ids):
+            vectors = np.memmap(self._matrix_path(generation), dtype=dtype, mode="r", shape=(len(ids), dim))
+        else:
+            vectors = np.empty((0, dim), dtype=dtype)
+
+        self._snapshot = Snapshot(generation, ids, vectors, course_ids, difficulties, scales, MODEL_MODES[mode_code])
+        self._hashes = hashes
+
+    def _matrix_path(self, generation):
+        return self.directory / MATRIX_FILE.format(generation=generation)
+
+    # ========== Writing ==========
+
+    @contextmanager
+    def _write_lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with open(self.directory / LOCK_FILE, "w") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def sync(self, rows, encode):
+        """
+        Bring the store in line with ``rows``, an iterable of
+        ``(id, text, course_id, difficulty)``.
+
+        Only rows that are new or whose text hash changed are passed to
+        ``encode`` (a callable mapping a list of texts to a 2-D array),
+        ``chunk_size`` at a time; the rest are copied from the previous
+        generation. Rows missing from ``rows`` are dropped; a difficulty
+        change only rewrites the index. Returns the number of re-encoded
+        rows. The hashes include the model mode, so switching
+        ``AI_QUANTIZED_INFERENCE`` re-encodes every row.
+        """
+        # Rows are kept sorted by course so each course is one contiguous slice.
+        rows = sorted(rows, key=lambda row: (row[2] or 0, row[0]))
+        with self._write_lock():
+            # Another process may have written since we last looked.
+            self._loaded_key = None
+            old = self.load()
+            old_pos = {int(pk): i for i, pk in enumerate(old.ids)}
+
+            ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+            mode = self.model_mode
+            hashes = np.array([content_hash(row[1], mode) for row in rows], dtype="S20")
+            course_ids = np.fromiter((row[2] or 0 for row in rows), dtype=np.int64, count=len(rows))
+            difficulties = np.array([(row[3] or "").lower().encode() for row in rows], dtype="S10")
+
+            keep_new, keep_old, stale = [], [], []
+            for i, pk in enumerate(ids.tolist()):
+                j = old_pos.get(pk)
+                if j is not None and self._hashes[j] == hashes[i]:
+                    keep_new.append(i)
+                    keep_old.append(j)
+                else:
+                    stale.append(i)
+
+            dim = old.vectors.shape[1]
+            if not stale and np.array_equal(ids, old.ids) and old.vectors.dtype == self.dtype:
+                if np.array_equal(course_ids, old.course_ids) and np.array_equal(difficulties, old.difficulties):
+                    logger.debug("Embedding store is up to date (%d rows).", len(ids))
+                    return 0
+                # Same vectors in the same order: only the filter columns moved.
+                self._write_index(old.generation, dim, ids, hashes, course_ids, difficulties, old.scales, mode)
+                logger.info("Embedding store metadata updated (%d rows).", len(ids))
+                return 0
+
+            # Encode in chunks written straight into the new matrix so memory stays
+            # bounded by the chunk, not by the number of changed rows.
+            chunks = [stale[i:i + self.chunk_size] for i in range(0, len(stale), self.chunk_size)]
+            first = None
+            if chunks:
+                first = self._encode_chunk(encode, rows, chunks[0])
+                dim = first.shape[1]
+
+            generation = old.generation + 1
+            scales = np.ones(len(ids), dtype=np.float32) if self.dtype is np.int8 else None
+            if len(ids):
+                matrix = np.memmap(
+                    self._matrix_path(generation), dtype=self.dtype, mode="w+", shape=(len(ids), dim)
+                )
+                if keep_new:
+                    if old.vectors.dtype == self.dtype:
+                        matrix[keep_new] = old.vectors[keep_old]
+                        if scales is not None:
+                            scales[keep_new] = old.scales[keep_old]
+                    else:
+                        # AI_EMBEDDING_DTYPE changed: convert, no need to re-encode.
+                        old_scales = old.scales[keep_old] if old.scales is not None else None
+                        self._put(matrix, scales, keep_new, dequantize(old.vectors[keep_old], old_scales))
+                if chunks:
+                    self._put(matrix, scales, chunks[0], first)
+                    for chunk in chunks[1:]:
+                        self._put(matrix, scales, chunk, self._encode_chunk(encode, rows, chunk))
+                matrix.flush()
+                del matrix
+
+            self._write_index(generation, dim, ids, hashes, course_ids, difficulties, scales, mode)
+            self._remove_stale_generations({generation, old.generation})
+
+        logger.info("Embedding store synced: %d re-encoded, %d total.", len(stale), len(ids))
+        return len(stale)
+
+    @staticmethod
+    def _encode_chunk(encode, rows, chunk):
+        return normalize(np.array(encode([rows[i][1] for i in chunk]), dtype=np.float32))
+
+    def _put(self, matrix, scales, rows, vectors):
+        stored, row_scales = quantize(vectors, self.dtype)
+        matrix[rows] = stored
+        if scales is not None:
+            scales[rows] = row_scales
+
+    def _write_index(self, generation, dim, ids, hashes, course_ids, difficulties, scales, mode):
+        tmp_path = self.directory / f"{INDEX_FILE}.tmp"
+        dtype_code = DTYPE_CODES.index(np.dtype(self.dtype).name)
+        mode_code = MODEL_MODES.index(mode)
+        with open(tmp_path, "wb") as fh:
+            np.savez(
+                fh,
+                meta=np.array([FORMAT_VERSION, generation, dim, dtype_code, mode_code], dtype=np.int64),
+                ids=ids,
+                hashes=hashes,
+                course_ids=course_ids,
+                difficulties=difficulties,
+                scales=scales if scales is not None else np.empty(0, dtype=np.float32),
+            )
+        os.replace(tmp_path, self.index_path)
+
+    def _remove_stale_generations(self, keep):
+        # Readers that already map an old file keep their handle, but one that read
+        # the previous index just before the swap has yet to open its matrix, so
+        # the previous generation stays until the next sync.
+        names = {pattern.format(generation=g) for pattern in GENERATION_FILES for g in keep}
+        for pattern in GENERATION_FILES:
+            for path in self.directory.glob(pattern.format(generation="*")):
+                if path.name not in names:
+                    path.unlink(missing_ok=True)
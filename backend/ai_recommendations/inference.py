@@ -0,0 +1,30 @@
+# ai_recommendations/inference.py
+"""
+Embedding entry point for web workers.
+
+When ``AI_INFERENCE_WORKER_SOCKET`` is set, requests go to the out-of-process
+inference worker and this process never imports torch. Otherwise the model
+is loaded lazily in-process on the first call (local development, tests).
+"""
+from django.conf import settings
+
+from .inference_worker import InferenceClient
+
+_client = None
+
+
+def get_client():
+    global _client
+    address = settings.AI_INFERENCE_WORKER_SOCKET
+    if _client is None or _client.address != address:
+        _client = InferenceClient(address)
+    return _client
+
+
+def get_embeddings(texts):
+    """Embed ``texts`` as a float32 NumPy array of shape (len(texts), hidden_size)."""
+    if settings.AI_INFERENCE_WORKER_SOCKET:
+        return get_client().encode(texts)
+
+    from . import model
+    return model.encode(texts)
@@ -0,0 +1,130 @@
+# ai_recommendations/inference_worker.py
+"""
+Local inference worker.
+
+A single process owns the BERT model and serves embedding requests over a
+Unix socket, so web workers, management commands and tests never import
+torch or hold the model in memory. Start it with
+``python manage.py run_inference_worker`` and point
+``AI_INFERENCE_WORKER_SOCKET`` at the same path.
+"""
+import logging
+import os
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceWorkerError(Exception):
+    """The inference worker is unreachable or failed to encode a request."""
+
+
+def _authkey():
+    return settings.SECRET_KEY.encode('utf-8')
+
+
+# ========== Server ==========
+
+# One forward pass at a time: concurrent passes only fight over the same cores.
+_encode_lock = threading.Lock()
+
+
+def _handle(conn, encode):
+    with conn:
+        while True:
+            try:
+                op, payload = conn.recv()
+            except (EOFError, OSError):
+                return
+
+            try:
+                if op == 'encode':
+                    with _encode_lock:
+                        result = encode(payload)
+                    conn.send(('ok', result))
+                elif op == 'ping':
+                    conn.send(('ok', None))
+                else:
+                    conn.send(('error', f"Unknown operation: {op}"))
+            except Exception as e:
+                logger.exception("Inference worker failed to handle %r", op)
+                conn.send(('error', str(e)))
+
+
+def serve(address=None):
+    """Load the model and serve embedding requests on ``address`` forever."""
+    from . import model
+
+    address = address or settings.AI_INFERENCE_WORKER_SOCKET
+    model.load_model()
+
+    if os.path.exists(address):
+        os.unlink(address)
+
+    with Listener(address, family='AF_UNIX', authkey=_authkey()) as listener:
+        os.chmod(address, 0o600)
+        logger.info("Inference worker listening on %s", address)
+        while True:
+            try:
+                conn = listener.accept()
+            except AuthenticationError:
+                logger.warning("Rejected inference worker connection with a bad auth key")
+                continue
+            threading.Thread(target=_handle, args=(conn, model.encode), daemon=True).start()
+
+
+# ========== Client ==========
+
+class InferenceClient:
+    """
+    Thin client for the inference worker.
+
+    Keeps one connection per thread and reconnects once if the worker was
+    restarted in between calls.
+    """
+
+    def __init__(self, address):
+        self.address = address
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, family='AF_UNIX', authkey=_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _drop_connection(self):
+        conn = getattr(self._local, 'conn', None)
+        self._local.conn = None
+        if conn is not None:
+            try:
+                conn.close()
+            except OSError:
+                pass
+
+    def _call(self, op, payload=None):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send((op, payload))
+                status, result = conn.recv()
+                break
+            except (OSError, EOFError) as e:
+                self._drop_connection()
+                if attempt:
+                    raise InferenceWorkerError(f"Inference worker unavailable at {self.address}: {e}") from e
+
+        if status != 'ok':
+            raise InferenceWorkerError(result)
+        return result
+
+    def ping(self):
+        self._call('ping')
+
+    def encode(self, texts):
+        return self._call('encode', list(texts))
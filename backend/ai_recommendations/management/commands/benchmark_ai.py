@@ -0,0 +1,65 @@
+# ai_recommendations/management/commands/benchmark_ai.py
+import json
+import platform
+import subprocess
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ai_recommendations.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Run an ai_recommendations benchmark suite and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES))
+        parser.add_argument(
+            '--socket',
+            default='',
+            help="Inference worker socket to compare against (startup suite).",
+        )
+        parser.add_argument('--texts', type=int, help="Synthetic corpus / request count (encode, batching suites).")
+        parser.add_argument(
+            '--batch-sizes',
+            type=int,
+            nargs='+',
+            help="Batch sizes to compare (encode suite).",
+        )
+        parser.add_argument('--sizes', type=int, nargs='+', help="Catalog sizes (index suite).")
+        parser.add_argument('--dim', type=int, help="Vector dimension (index suite, default 768).")
+        parser.add_argument('--queries', type=int, help="Queries per measurement (index suite).")
+        parser.add_argument('--top-n', type=int, help="Results per query (index, quantization, endpoint suites).")
+        parser.add_argument('--concurrency', type=int, nargs='+', help="Client threads (batching suite).")
+        parser.add_argument('--window-ms', type=float, help="Batching window (batching suite).")
+        parser.add_argument('--max-batch', type=int, help="Maximum batch size (batching suite).")
+        parser.add_argument('--courses', type=int, help="Synthetic courses to seed (endpoint suite).")
+        parser.add_argument('--assignments', type=int, help="Synthetic assignments to seed (endpoint suite).")
+        parser.add_argument('--requests', type=int, help="Requests per cold/warm phase (endpoint suite).")
+        parser.add_argument(
+            '--output',
+            help="Also write the results to this JSON file, to compare runs between releases.",
+        )
+
+    def _git_revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        results = {
+            'suite': options['suite'],
+            'timestamp': timezone.now().isoformat(),
+            'git_revision': self._git_revision(),
+            'python': platform.python_version(),
+            'results': SUITES[options['suite']](options),
+        }
+        report = json.dumps(results, indent=2)
+        self.stdout.write(report)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,29 @@
+# ai_recommendations/management/commands/build_student_recommendations.py
+from django.core.management.base import BaseCommand
+
+from ai_recommendations.personalization import build_student_recommendations, stale_student_ids
+from ai_recommendations.vector_index import get_index
+from ai_recommendations.views import embedding_store
+
+
+class Command(BaseCommand):
+    help = "Precompute personalized assignment recommendations from each student's grades."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, nargs='+', help="Only rebuild these student ids.")
+        parser.add_argument(
+            '--stale', action='store_true',
+            help="Only rebuild students whose grades changed since their last build, or who have none.",
+        )
+        parser.add_argument('--top-k', type=int, default=None, help="Assignments stored per student.")
+
+    def handle(self, *args, **options):
+        students = options['students']
+        if options['stale']:
+            students = stale_student_ids()
+            if not students:
+                self.stdout.write("No stale recommendations.")
+                return
+        index = get_index(embedding_store)
+        updated = build_student_recommendations(index, students, k=options['top_k'])
+        self.stdout.write(self.style.SUCCESS(f"Stored recommendations for {updated} students."))
@@ -0,0 +1,22 @@
+# ai_recommendations/management/commands/run_inference_worker.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_recommendations.inference_worker import serve
+
+
+class Command(BaseCommand):
+    help = "Run the local BERT inference worker that serves embedding requests over a Unix socket."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--socket',
+            default=settings.AI_INFERENCE_WORKER_SOCKET,
+            help="Unix socket path to listen on (defaults to AI_INFERENCE_WORKER_SOCKET).",
+        )
+
+    def handle(self, *args, **options):
+        if not options['socket']:
+            raise CommandError("Set AI_INFERENCE_WORKER_SOCKET or pass --socket.")
+        self.stdout.write(f"Inference worker starting on {options['socket']}")
+        serve(options['socket'])
@@ -0,0 +1,17 @@
+# ai_recommendations/management/commands/sync_assignment_embeddings.py
+from django.core.management.base import BaseCommand
+
+from ai_recommendations.vector_index import get_index
+from ai_recommendations.views import embedding_store, refresh_embeddings
+
+
+class Command(BaseCommand):
+    help = "Bring the on-disk assignment embedding store up to date, re-encoding only changed descriptions."
+
+    def handle(self, *args, **options):
+        encoded = refresh_embeddings()
+        # Builds (and persists) the IVF lists up front when that backend is configured.
+        index = get_index(embedding_store)
+        self.stdout.write(self.style.SUCCESS(
+            f"Embedding store synced ({encoded} rows re-encoded, {len(index)} indexed with {type(index).__name__})."
+        ))
@@ -0,0 +1,52 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("student", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Recommendation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("course_name", models.CharField(max_length=255)),
+                ("difficulty", models.CharField(max_length=50)),
+                ("title", models.CharField(max_length=255)),
+                ("description", models.TextField()),
+                ("course_id", models.IntegerField()),
+                ("difficulty_level", models.CharField(max_length=50)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="StudentRecommendation",
+            fields=[
+                (
+                    "student",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="assignment_recommendations",
+                        serialize=False,
+                        to="student.student",
+                    ),
+                ),
+                ("assignment_ids", models.JSONField(default=list)),
+                ("scores", models.JSONField(default=list)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai_recommendations", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="studentrecommendation",
+            name="stale",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+    ]
@@ -0,0 +1,117 @@
+# ai_recommendations/model.py
+"""
+BERT model used to embed assignment descriptions and briefs.
+
+Importing this module pulls in torch and transformers; the model itself is
+loaded on first use. Web workers normally reach it through ``inference.py``
+(and, when configured, the out-of-process inference worker) instead.
+"""
+import logging
+import resource
+import threading
+
+import numpy as np
+import torch
+from django.conf import settings
+from transformers import BertModel, BertTokenizer
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = 'bert-base-uncased'
+
+# CPU only
+device = torch.device("cpu")
+
+_tokenizer = None
+_models = {}  # quantized flag -> model
+_load_lock = threading.Lock()
+
+
+def load_model(quantized=None):
+    """
+    Load (once per process) and return the tokenizer and model.
+
+    With ``quantized`` (default: ``AI_QUANTIZED_INFERENCE``) the model's
+    linear layers are dynamically quantized to int8, trading a little ranking
+    accuracy for lower CPU latency and memory (``benchmark_ai quantization``).
+    """
+    global _tokenizer
+    if quantized is None:
+        quantized = settings.AI_QUANTIZED_INFERENCE
+    if quantized not in _models:
+        with _load_lock:
+            if quantized not in _models:
+                logger.info("Loading %s%s", MODEL_NAME, " (int8 dynamic quantization)" if quantized else "")
+                if _tokenizer is None:
+                    _tokenizer = BertTokenizer.from_pretrained(MODEL_NAME)
+                model = BertModel.from_pretrained(MODEL_NAME).to(device)
+                model.eval()
+                if quantized:
+                    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+                _models[quantized] = model
+    return _tokenizer, _models[quantized]
+
+
+def _token_ids(tokenizer, texts, chunk_size):
+    """Tokenize without padding, keeping each row as a compact int32 array."""
+    ids = []
+    for start in range(0, len(texts), chunk_size):
+        batch = tokenizer(texts[start:start + chunk_size], truncation=True)['input_ids']
+        ids.extend(np.asarray(row, dtype=np.int32) for row in batch)
+    return ids
+
+
+def iter_encode(texts, batch_size=None, quantized=None):
+    """
+    Yield ``(indices, embeddings)`` one batch at a time.
+
+    Texts are sorted by token length and cut into buckets of ``batch_size``,
+    each padded only to its own longest row, so memory is bounded by the
+    batch rather than by the corpus times its longest description.
+    """
+    tokenizer, model = load_model(quantized)
+    batch_size = batch_size or settings.AI_EMBEDDING_BATCH_SIZE
+    token_ids = _token_ids(tokenizer, list(texts), chunk_size=batch_size * 8)
+    order = np.argsort([len(row) for row in token_ids], kind='stable')
+
+    for start in range(0, len(order), batch_size):
+        indices = order[start:start + batch_size]
+        rows = [token_ids[i] for i in indices]
+        width = max(len(row) for row in rows)
+
+        input_ids = torch.full((len(rows), width), tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(rows), width), dtype=torch.long)
+        for r, row in enumerate(rows):
+            input_ids[r, :len(row)] = torch.from_numpy(row)
+            attention_mask[r, :len(row)] = 1
+
+        with torch.no_grad():
+            hidden = model(input_ids=input_ids.to(device), attention_mask=attention_mask.to(device)).last_hidden_state
+        # Mean over real tokens only, so padding to the bucket width does not shift the result.
+        mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+        embeddings = (hidden * mask).sum(dim=1) / mask.sum(dim=1)
+        yield indices, embeddings.numpy()
+
+
+def encode(texts, batch_size=None, out=None, quantized=None):
+    """
+    Embed ``texts`` as a float32 array of shape (len(texts), hidden_size).
+
+    Batches are written straight into ``out`` (allocated here if not given,
+    may be a memmap), so no corpus-sized intermediate tensor is ever built.
+    """
+    texts = list(texts)
+    _, model = load_model(quantized)
+    if out is None:
+        out = np.empty((len(texts), model.config.hidden_size), dtype=np.float32)
+
+    batches = 0
+    for indices, embeddings in iter_encode(texts, batch_size=batch_size, quantized=quantized):
+        out[indices] = embeddings
+        batches += 1
+
+    logger.info(
+        "Encoded %d texts in %d batches; peak RSS %.1f MB",
+        len(texts), batches, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    )
+    return out
@@ -11,3 +11,25 @@ class Recommendation(models.Model):
 
     def __str__(self):
         return self.title
+
+
+class StudentRecommendation(models.Model):
+    """
+    Precomputed top-K assignments for one student, best first, built by
+    ``ai_recommendations.personalization`` from the student's graded work.
+    ``stale`` is set when a grade of the student changes and cleared by the
+    next build.
+    """
+    student = models.OneToOneField(
+        'student.Student',
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='assignment_recommendations',
+    )
+    assignment_ids = models.JSONField(default=list)
+    scores = models.JSONField(default=list)
+    stale = models.BooleanField(default=False, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Recommendations for student {self.student_id}"
@@ -0,0 +1,160 @@
+# ai_recommendations/personalization.py
+"""
+Per-student assignment recommendations.
+
+A student's profile is the score-weighted mean of the embeddings of the
+assignments they were graded on. Every student of a track is ranked against
+that track's assignments with one matrix product, graded assignments are
+masked out, and the top-K ids are stored in ``StudentRecommendation`` so the
+endpoint only reads one row. Grade changes mark a student's row stale
+(signals.py); ``stale_student_ids`` lists what the next build has to redo.
+"""
+import logging
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+
+from apps.assignments.models import Assignment
+from apps.grades.models import Grade
+from apps.student.models import Student
+
+from .embedding_store import normalize
+from .models import StudentRecommendation
+from .vector_index import top_k
+
+logger = logging.getLogger(__name__)
+
+
+def rows_for_ids(index, ids):
+    """Index rows of assignment ``ids``; -1 for ids missing from the store."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if not len(index):
+        return np.full(len(ids), -1, dtype=np.int64)
+    order = np.argsort(index.ids, kind='stable')
+    pos = np.minimum(np.searchsorted(index.ids[order], ids), len(order) - 1)
+    return np.where(index.ids[order[pos]] == ids, order[pos], -1)
+
+
+# Profiles scored per matrix product, bounding the (students x candidates) score block.
+PROFILE_CHUNK = 1024
+
+
+def build_profiles(index, student_ids, grades):
+    """
+    ``(profiles, seen)`` for ``student_ids``: one normalised profile vector per
+    student (zero when nothing they were graded on is embedded) and the graded
+    ``(student position, index row)`` pairs as two arrays.
+    ``grades`` is an iterable of ``(student_id, assignment_id, score)``.
+    """
+    student_pos = {pk: i for i, pk in enumerate(student_ids)}
+    grades = [g for g in grades if g[0] in student_pos]
+    students = np.fromiter((student_pos[g[0]] for g in grades), dtype=np.int64, count=len(grades))
+    rows = rows_for_ids(index, [g[1] for g in grades])
+    weights = np.fromiter((max(g[2] or 0, 0) for g in grades), dtype=np.float32, count=len(grades))
+
+    known = rows >= 0
+    students, rows, weights = students[known], rows[known], weights[known]
+
+    profiles = np.zeros((len(student_ids), index.snapshot.vectors.shape[1]), dtype=np.float32)
+    if len(rows):
+        order = np.argsort(rows, kind='stable')  # sequential reads from the memmap
+        vectors = index.rows_as_float(rows[order]) * weights[order, None]
+        np.add.at(profiles, students[order], vectors)
+    return normalize(profiles), (students, rows)
+
+
+def rank_candidates(index, profiles, seen, candidates, k):
+    """
+    Top-``k`` unseen ``candidates`` (index rows) for each profile, as a list
+    of ``(rows, scores)``. ``seen`` holds ``(profile position, row)`` pairs
+    to exclude. Profiles are scored ``PROFILE_CHUNK`` at a time with one
+    matrix product per chunk.
+    """
+    candidates = np.unique(np.asarray(candidates, dtype=np.int64))
+    if not len(candidates):
+        return [(candidates, np.empty(0, dtype=np.float32)) for _ in profiles]
+
+    candidate_vectors = index.rows_as_float(candidates)
+    seen_profiles, seen_rows = seen
+    pos = np.minimum(np.searchsorted(candidates, seen_rows), len(candidates) - 1)
+    hit = candidates[pos] == seen_rows
+    seen_profiles, pos = seen_profiles[hit], pos[hit]
+
+    results = []
+    for start in range(0, len(profiles), PROFILE_CHUNK):
+        scores = profiles[start:start + PROFILE_CHUNK] @ candidate_vectors.T
+        in_chunk = (seen_profiles >= start) & (seen_profiles < start + len(scores))
+        scores[seen_profiles[in_chunk] - start, pos[in_chunk]] = -np.inf
+        for row_scores in scores:
+            top = top_k(row_scores, k)
+            top = top[np.isfinite(row_scores[top])]
+            results.append((candidates[top], row_scores[top]))
+    return results
+
+
+def stale_student_ids():
+    """Students whose recommendations are stale or were never built."""
+    return list(Student.objects.exclude(assignment_recommendations__stale=False).values_list('id', flat=True))
+
+
+def build_student_recommendations(index, student_ids=None, k=None):
+    """
+    Recompute and store recommendations for ``student_ids`` (every student
+    when None). Students without a graded, embedded assignment get an empty
+    list. Returns the number of students updated.
+    """
+    k = k or settings.AI_STUDENT_RECOMMENDATIONS_TOP_K
+    students = Student.objects.all()
+    if student_ids is not None:
+        students = students.filter(id__in=student_ids)
+
+    by_track = defaultdict(list)
+    for student_id, track_id in students.values_list('id', 'track_id'):
+        by_track[track_id].append(student_id)
+    if not by_track:
+        return 0
+
+    all_students = [pk for pks in by_track.values() for pk in pks]
+    profiles, seen = build_profiles(
+        index,
+        all_students,
+        Grade.objects.filter(student_id__in=all_students).values_list('student_id', 'assignment_id', 'score'),
+    )
+    student_pos = {pk: i for i, pk in enumerate(all_students)}
+
+    track_assignments = defaultdict(list)
+    tracks = [track_id for track_id in by_track if track_id is not None]
+    for track_id, assignment_id in Assignment.objects.filter(track_id__in=tracks).values_list('track_id', 'id'):
+        track_assignments[track_id].append(assignment_id)
+
+    graded = np.bincount(seen[0], minlength=len(all_students)) > 0
+    records = []
+    for track_id, pks in by_track.items():
+        positions = np.array([student_pos[pk] for pk in pks], dtype=np.int64)
+        # Re-number the graded pairs of this track's students to 0..len(pks).
+        local = np.full(len(all_students), -1, dtype=np.int64)
+        local[positions] = np.arange(len(positions))
+        mine = local[seen[0]] >= 0
+        track_seen = (local[seen[0][mine]], seen[1][mine])
+
+        candidates = rows_for_ids(index, track_assignments.get(track_id, []))
+        ranked = rank_candidates(index, profiles[positions], track_seen, candidates[candidates >= 0], k)
+        for pk, position, (rows, scores) in zip(pks, positions, ranked):
+            if not graded[position]:
+                rows, scores = rows[:0], scores[:0]
+            records.append(StudentRecommendation(
+                student_id=pk,
+                assignment_ids=index.ids[rows].tolist(),
+                scores=[round(float(s), 4) for s in scores],
+                stale=False,
+            ))
+
+    StudentRecommendation.objects.bulk_create(
+        records,
+        update_conflicts=True,
+        unique_fields=['student'],
+        update_fields=['assignment_ids', 'scores', 'stale', 'updated_at'],
+    )
+    logger.info("Stored recommendations for %d students.", len(records))
+    return len(records)
@@ -0,0 +1,118 @@
+# ai_recommendations/query_cache.py
+"""
+Cache of brief-description embeddings.
+
+The frontend sends the same handful of briefs over and over, so each worker
+keeps a bounded LRU of normalised query text -> embedding with a TTL. It is
+shared by all threads of the worker and can optionally fall back to the
+Django cache so workers share each other's results. Keys include the model
+mode (float32 or int8, ``AI_QUANTIZED_INFERENCE``), so switching it never
+serves an embedding from the other model.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache as django_cache
+
+from .embedding_store import model_mode
+
+
+def normalize_query(text):
+    """Case- and whitespace-insensitive key; the model is uncased anyway."""
+    return " ".join(text.lower().split())
+
+
+def cache_key(text):
+    """The normalised query, prefixed with the model mode that encodes it."""
+    return f"{model_mode()}:{normalize_query(text)}"
+
+
+class QueryEmbeddingCache:
+    def __init__(self, max_size=None, ttl=None, shared=None, key_prefix='ai_query_embedding'):
+        self.max_size = max_size if max_size is not None else settings.AI_QUERY_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.AI_QUERY_CACHE_TTL
+        self.shared = shared if shared is not None else settings.AI_QUERY_CACHE_SHARED
+        self.key_prefix = key_prefix
+        self._entries = OrderedDict()  # query -> (expires_at, embedding)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _shared_key(self, query):
+        return f"{self.key_prefix}:{hashlib.sha1(query.encode('utf-8')).hexdigest()}"
+
+    def get(self, text):
+        query = cache_key(text)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(query)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(query)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[query]
+
+        if self.shared:
+            embedding = django_cache.get(self._shared_key(query))
+            if embedding is not None:
+                self._store(query, embedding)
+                with self._lock:
+                    self.shared_hits += 1
+                return embedding
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, text, embedding):
+        query = cache_key(text)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        self._store(query, embedding)
+        if self.shared:
+            django_cache.set(self._shared_key(query), embedding, self.ttl)
+        return embedding
+
+    def _store(self, query, embedding):
+        with self._lock:
+            self._entries[query] = (time.monotonic() + self.ttl, embedding)
+            self._entries.move_to_end(query)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, text, compute):
+        """
+        Cached embedding for ``text``, calling ``compute(text)`` on a miss.
+        The model runs outside the lock, so a miss never blocks other threads.
+        """
+        embedding = self.get(text)
+        if embedding is None:
+            embedding = self.set(text, compute(text))
+        return embedding
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'shared': self.shared,
+                'hits': self.hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+            }
@@ -0,0 +1,17 @@
+# ai_recommendations/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.grades.models import Grade
+
+from .models import StudentRecommendation
+
+
+@receiver(post_save, sender=Grade)
+@receiver(post_delete, sender=Grade)
+def mark_recommendations_stale(sender, instance, **kwargs):
+    """
+    A new or changed grade only marks that student's recommendations stale;
+    ``build_student_recommendations --stale`` rebuilds them off the request path.
+    """
+    StudentRecommendation.objects.filter(student_id=instance.student_id, stale=False).update(stale=True)
@@ -1,6 +1,26 @@
 # ai_recommendations/tests.py
-from django.test import TestCase
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+from django.db.models.signals import post_delete, post_save
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from rest_framework.test import APIClient
+
+from apps.branch_location.models import Branch
+from apps.grades.models import Grade
+from apps.staff_members.models import StaffMember
+from apps.student.models import Student
+from apps.tracks.models import Track
+
+from .batching import MicroBatcher, embed_unique
+from .embedding_store import EmbeddingStore, Snapshot
+from .models import StudentRecommendation
+from .personalization import build_profiles, rank_candidates, rows_for_ids, stale_student_ids
+from .query_cache import QueryEmbeddingCache
+from .vector_index import ExactIndex, IVFIndex, VectorIndex
 
 class RecommendationTestCase(TestCase):
     def test_get_recommendations_by_course_and_difficulty(self):
@@ -21,3 +41,328 @@ class RecommendationTestCase(TestCase):
         })
         self.assertEqual(response.status_code, 200)
         self.assertIn('recommendations', response.json())
+
+    def test_hybrid_recommendations_unknown_course(self):
+        url = reverse('get_recommendations')
+        response = self.client.get(url, {
+            'method_choice': '3',
+            'course_name': 'No Such Course',
+            'difficulty': 'Easy',
+            'brief_description': 'web app using django'
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+class StudentRecommendationAccessTestCase(TestCase):
+    def setUp(self):
+        branch = Branch.objects.create(name="Cairo", address="1 Nile St", city="Cairo", state="Cairo")
+        self.supervisor = StaffMember.objects.create_user(
+            email="sup@example.com", username="sup", password="pw", role=StaffMember.Role.SUPERVISOR, branch=branch
+        )
+        self.other_supervisor = StaffMember.objects.create_user(
+            email="other@example.com", username="other", password="pw", role=StaffMember.Role.SUPERVISOR, branch=branch
+        )
+        track = Track.objects.create(name="Python", description="Python track", supervisor=self.supervisor, branch=branch)
+        self.student = Student.objects.create(email="stu@example.com", first_name="Stu", last_name="Dent", track=track)
+        self.classmate = Student.objects.create(email="mate@example.com", first_name="Class", last_name="Mate", track=track)
+        StudentRecommendation.objects.create(student=self.student, assignment_ids=[], scores=[])
+        self.url = reverse('get_student_recommendations', args=[self.student.id])
+        self.client = APIClient()
+
+    def get(self, user, **params):
+        if user is not None:
+            self.client.force_authenticate(user)
+        return self.client.get(self.url, params)
+
+    def test_requires_authentication(self):
+        """Anonymous requests are refused"""
+        self.assertEqual(self.get(None).status_code, 401)
+
+    def test_student_and_their_supervisor_are_allowed(self):
+        """The student themself and the supervisor of their track can read the list"""
+        self.assertEqual(self.get(self.student).status_code, 200)
+        self.assertEqual(self.get(self.supervisor).status_code, 200)
+
+    def test_others_are_forbidden(self):
+        """Another student or a supervisor of another track cannot"""
+        self.assertEqual(self.get(self.classmate).status_code, 403)
+        self.assertEqual(self.get(self.other_supervisor).status_code, 403)
+
+    def test_invalid_top_n_is_a_bad_request(self):
+        """A top_n that is not a positive integer is a 400, not a 500"""
+        for top_n in ("abc", "0", "-3", "1.5"):
+            self.assertEqual(self.get(self.student, top_n=top_n).status_code, 400)
+
+    def test_unknown_student_is_not_found(self):
+        """A missing student is a 404 and builds nothing"""
+        self.client.force_authenticate(self.supervisor)
+        response = self.client.get(reverse('get_student_recommendations', args=[self.classmate.id + 100]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(StudentRecommendation.objects.count(), 1)
+
+    def test_student_without_a_row_is_not_built_on_request(self):
+        """A missing row is a 202 with an empty list; the build command makes it"""
+        self.client.force_authenticate(self.classmate)
+        response = self.client.get(reverse('get_student_recommendations', args=[self.classmate.id]))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['recommendations'], [])
+        self.assertEqual(StudentRecommendation.objects.count(), 1)
+        self.assertEqual(stale_student_ids(), [self.classmate.id])
+
+    def test_grade_change_marks_recommendations_stale(self):
+        """Saving or deleting a grade only flags the student's row"""
+        for signal in (post_save, post_delete):
+            StudentRecommendation.objects.filter(student=self.student).update(stale=False)
+            signal.send(sender=Grade, instance=Grade(student=self.student))
+            self.assertTrue(self.get(self.student).json()['stale'])
+        self.assertIn(self.student.id, stale_student_ids())
+
+
+class EmbeddingStoreTestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = EmbeddingStore(self.tmp.name)
+        self.encoded = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def encode(self, texts):
+        self.encoded.extend(texts)
+        return np.array([[len(t), 1.0] for t in texts], dtype=np.float32)
+
+    def test_only_changed_rows_are_reencoded(self):
+        """Unchanged descriptions are copied, not re-encoded"""
+        self.assertEqual(self.store.sync([(1, "a", 1, "Easy"), (2, "bb", 1, "Hard")], self.encode), 2)
+        self.assertEqual(
+            self.store.sync([(1, "a", 1, "Easy"), (2, "bbb", 1, "Hard"), (3, "c", 2, "Easy")], self.encode), 2
+        )
+        self.assertEqual(self.encoded, ["a", "bb", "bbb", "c"])
+
+        snapshot = EmbeddingStore(self.tmp.name).load()
+        self.assertEqual(snapshot.ids.tolist(), [1, 2, 3])
+        self.assertEqual(snapshot.course_ids.tolist(), [1, 1, 2])
+        self.assertAlmostEqual(float(snapshot.vectors[1, 0]), 3 / np.sqrt(10), places=5)
+
+    def test_deleted_rows_are_dropped(self):
+        """Rows missing from the sync are removed without encoding"""
+        self.store.sync([(1, "a", 1, "Easy"), (2, "bb", 1, "Easy")], self.encode)
+        self.assertEqual(self.store.sync([(2, "bb", 1, "Easy")], self.encode), 0)
+        snapshot = self.store.load()
+        self.assertEqual(snapshot.ids.tolist(), [2])
+        self.assertEqual(snapshot.vectors.shape, (1, 2))
+
+    def test_previous_generation_is_kept_until_the_next_sync(self):
+        """A reader that read the old index can still open its matrix"""
+        reader = EmbeddingStore(self.tmp.name)
+        for text in ("a", "bb", "ccc"):
+            self.store.sync([(1, text, 1, "Easy")], self.encode)
+        files = sorted(p.name for p in Path(self.tmp.name).glob("embeddings-*.vec"))
+        self.assertEqual(files, ["embeddings-2.vec", "embeddings-3.vec"])
+        self.assertEqual(reader.load().generation, 3)
+
+    def test_metadata_change_does_not_reencode(self):
+        """Moving an assignment to another course does not re-encode it"""
+        self.store.sync([(1, "a", 1, "Easy")], self.encode)
+        self.store.sync([(1, "a", 5, "Hard")], self.encode)
+        snapshot = self.store.load()
+        self.assertEqual(self.encoded, ["a"])
+        self.assertEqual(snapshot.course_ids.tolist(), [5])
+        self.assertEqual(snapshot.difficulties.tolist(), [b"hard"])
+
+    def test_reduced_precision_storage(self):
+        """float16 and int8 stores keep cosine scores close to float32"""
+        rows = [(i, "x" * i, 1, "Easy") for i in range(1, 20)]
+        query = np.array([1.0, 2.0], dtype=np.float32) / np.sqrt(5)
+        self.store.sync(rows, self.encode)
+        expected = ExactIndex(self.store.load()).score_rows(query)
+        for dtype in ("float16", "int8"):
+            store = EmbeddingStore(self.tmp.name, dtype=dtype)
+            # Switching dtype converts the stored rows without re-encoding them.
+            self.encoded.clear()
+            store.sync(rows, self.encode)
+            self.assertEqual(self.encoded, [])
+            snapshot = store.load()
+            self.assertEqual(snapshot.vectors.dtype, np.dtype(dtype))
+            scores = ExactIndex(snapshot).score_rows(query)
+            np.testing.assert_allclose(scores, expected, atol=1e-2)
+
+    def test_model_mode_switch_reencodes(self):
+        """Switching AI_QUANTIZED_INFERENCE re-encodes every row and is recorded in the header"""
+        rows = [(1, "a", 1, "Easy"), (2, "bb", 1, "Hard")]
+        with override_settings(AI_QUANTIZED_INFERENCE=False):
+            self.store.sync(rows, self.encode)
+            self.assertEqual(self.store.load().mode, "float32")
+        with override_settings(AI_QUANTIZED_INFERENCE=True):
+            self.assertEqual(self.store.sync(rows, self.encode), 2)
+            self.assertEqual(self.store.sync(rows, self.encode), 0)
+        self.assertEqual(EmbeddingStore(self.tmp.name).load().mode, "int8")
+        self.assertEqual(self.encoded, ["a", "bb", "a", "bb"])
+
+
+class VectorIndexTestCase(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        vectors = rng.normal(size=(500, 16)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.snapshot = Snapshot(
+            generation=1,
+            ids=np.arange(1000, 1500, dtype=np.int64),
+            vectors=vectors,
+            course_ids=np.arange(500, dtype=np.int64) % 5,
+            difficulties=np.array([b"easy", b"hard"] * 250, dtype="S10"),
+        )
+        self.query = rng.normal(size=16).astype(np.float32)
+
+    def test_exact_index_matches_full_sort(self):
+        """argpartition top-N equals a full argsort"""
+        rows, scores = ExactIndex(self.snapshot).search(self.query, 5)
+        expected = np.argsort(-(self.snapshot.vectors @ self.query))[:5]
+        self.assertEqual(rows.tolist(), expected.tolist())
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_base_class_is_abstract(self):
+        """An index without its own search() cannot be built"""
+        with self.assertRaises(TypeError):
+            VectorIndex(self.snapshot)
+
+    def test_prefilter_by_course_and_difficulty(self):
+        """Only rows of the requested course and difficulty are returned"""
+        for index in (ExactIndex(self.snapshot), IVFIndex(self.snapshot, n_lists=10, n_probe=2)):
+            rows, _ = index.search(self.query, 10, course_id=2, difficulty="Easy")
+            self.assertEqual(len(rows), 10)
+            self.assertTrue(np.all(self.snapshot.course_ids[rows] == 2))
+            self.assertTrue(np.all(self.snapshot.difficulties[rows] == b"easy"))
+
+    def test_course_partition_search(self):
+        """search_course scans one course slice and matches the filtered exact search"""
+        order = np.argsort(self.snapshot.course_ids, kind="stable")
+        snapshot = Snapshot(
+            generation=2,
+            ids=self.snapshot.ids[order],
+            vectors=self.snapshot.vectors[order],
+            course_ids=self.snapshot.course_ids[order],
+            difficulties=self.snapshot.difficulties[order],
+        )
+        index = ExactIndex(snapshot)
+        self.assertEqual(index.partitions[3], (300, 400))
+
+        rows, _ = index.search_course(self.query, 5, course_id=3, difficulty="Hard")
+        expected, _ = index.search(self.query, 5, course_id=3, difficulty="Hard")
+        self.assertEqual(rows.tolist(), expected.tolist())
+        self.assertEqual(len(index.search_course(self.query, 5, course_id=99)[0]), 0)
+
+    def test_ivf_probing_every_list_is_exact(self):
+        """With n_probe == n_lists the IVF index degenerates to an exact scan"""
+        exact, _ = ExactIndex(self.snapshot).search(self.query, 10)
+        approx, _ = IVFIndex(self.snapshot, n_lists=8, n_probe=8).search(self.query, 10)
+        self.assertEqual(approx.tolist(), exact.tolist())
+
+
+class PersonalizationTestCase(TestCase):
+    def setUp(self):
+        vectors = np.eye(4, dtype=np.float32)
+        vectors[3] = [0.9, 0.1, 0, 0]
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.index = ExactIndex(Snapshot(
+            generation=1,
+            ids=np.array([10, 20, 30, 40], dtype=np.int64),
+            vectors=vectors,
+            course_ids=np.zeros(4, dtype=np.int64),
+            difficulties=np.array([b"easy"] * 4, dtype="S10"),
+        ))
+
+    def test_rows_for_ids(self):
+        """Unknown assignment ids map to -1"""
+        self.assertEqual(rows_for_ids(self.index, [30, 99, 10]).tolist(), [2, -1, 0])
+
+    def test_graded_assignments_are_excluded_and_ranked_by_profile(self):
+        """The profile follows high-scored work and never recommends graded assignments"""
+        grades = [(1, 10, 90), (1, 20, 5), (2, 30, 80), (3, 99, 70)]
+        profiles, seen = build_profiles(self.index, [1, 2, 3], grades)
+        self.assertFalse(profiles[2].any())
+
+        ranked = rank_candidates(self.index, profiles, seen, [0, 1, 2, 3], k=2)
+        self.assertEqual(self.index.ids[ranked[0][0]].tolist(), [40, 30])
+        self.assertNotIn(30, self.index.ids[ranked[1][0]].tolist())
+        self.assertEqual(len(ranked[2][0]), 2)
+
+
+class QueryEmbeddingCacheTestCase(TestCase):
+    def test_normalized_queries_share_an_entry(self):
+        """Case and whitespace differences hit the same cached embedding"""
+        cache = QueryEmbeddingCache(max_size=4, ttl=60, shared=False)
+        calls = []
+        compute = lambda text: calls.append(text) or np.ones(3)
+        cache.get_or_compute("Web app using Django", compute)
+        cache.get_or_compute("  web app   using django ", compute)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """The bound is enforced by dropping the oldest unused query"""
+        cache = QueryEmbeddingCache(max_size=2, ttl=60, shared=False)
+        cache.set("a", np.zeros(2))
+        cache.set("b", np.zeros(2))
+        cache.get("a")
+        cache.set("c", np.zeros(2))
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_model_mode_is_part_of_the_key(self):
+        """An embedding from the float32 model is not served to the int8 model"""
+        cache = QueryEmbeddingCache(max_size=4, ttl=60, shared=False)
+        with override_settings(AI_QUANTIZED_INFERENCE=False):
+            cache.set("a", np.zeros(2))
+        with override_settings(AI_QUANTIZED_INFERENCE=True):
+            self.assertIsNone(cache.get("a"))
+
+    def test_expired_entries_are_misses(self):
+        """Entries older than the TTL are recomputed"""
+        cache = QueryEmbeddingCache(max_size=2, ttl=0, shared=False)
+        cache.set("a", np.zeros(2))
+        self.assertIsNone(cache.get("a"))
+
+
+class MicroBatcherTestCase(TestCase):
+    def test_concurrent_submissions_share_one_call(self):
+        """Items queued within the window are handled by a single fn call"""
+        calls = []
+        release = threading.Event()
+
+        def fn(items):
+            release.wait(1)
+            calls.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher(fn, max_batch=8, window_ms=200)
+        futures = [batcher.submit(i) for i in range(5)]
+        release.set()
+        self.assertEqual([f.result(timeout=2) for f in futures], [0, 2, 4, 6, 8])
+        self.assertEqual(calls, [[0, 1, 2, 3, 4]])
+
+    def test_max_batch_closes_the_window(self):
+        """A full batch is dispatched without waiting for the window"""
+        batcher = MicroBatcher(lambda items: items, max_batch=2, window_ms=10000)
+        futures = [batcher.submit(i) for i in range(4)]
+        self.assertEqual([f.result(timeout=2) for f in futures], [0, 1, 2, 3])
+        self.assertEqual(batcher.batches, 2)
+
+    def test_errors_propagate_to_every_caller(self):
+        """A failed batch fails each waiting future"""
+        def fail(items):
+            raise RuntimeError("boom")
+
+        future = MicroBatcher(fail, window_ms=1).submit("x")
+        with self.assertRaises(RuntimeError):
+            future.result(timeout=2)
+
+    def test_duplicate_texts_are_encoded_once(self):
+        """embed_unique collapses repeated texts within a batch"""
+        seen = []
+        embed = embed_unique(lambda texts: seen.extend(texts) or [len(t) for t in texts])
+        self.assertEqual(embed(["a", "bb", "a"]), [1, 2, 1])
+        self.assertEqual(seen, ["a", "bb"])
@@ -1,7 +1,9 @@
 # ai_recommendations/urls.py
 from django.urls import path
-from .views import get_recommendations
+from .views import get_recommendations, get_recommendation_stats, get_student_recommendations
 
 urlpatterns = [
     path('recommendations/', get_recommendations, name='get_recommendations'),
+    path('recommendations/student/<int:student_id>/', get_student_recommendations, name='get_student_recommendations'),
+    path('recommendations/stats/', get_recommendation_stats, name='get_recommendation_stats'),
 ]
@@ -0,0 +1,246 @@
+# ai_recommendations/vector_index.py
+"""
+Top-N similarity search over an :class:`EmbeddingStore` snapshot.
+
+``ExactIndex`` scores every candidate row with one matrix-vector product and
+selects the top-N with ``argpartition`` (O(N) instead of a full sort).
+``IVFIndex`` clusters the vectors into inverted lists and only scores the
+lists closest to the query, for catalogs where a full scan is too slow.
+Both pre-filter by course and difficulty using the store's metadata columns;
+``search_course`` scans only one course's contiguous slice of the matrix.
+"""
+import logging
+import os
+import threading
+from abc import ABC, abstractmethod
+from functools import cached_property
+
+import numpy as np
+from django.conf import settings
+
+from .embedding_store import dequantize, normalize
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix-vector product, so a scan never materialises a
+# full-catalog float32 copy of a memmapped matrix.
+SCAN_CHUNK = 65536
+
+
+def top_k(scores, k):
+    """Indices of the ``k`` highest ``scores``, best first."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+class VectorIndex(ABC):
+    """Base class: holds a snapshot and resolves course/difficulty filters to row masks."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    @property
+    def ids(self):
+        return self.snapshot.ids
+
+    def __len__(self):
+        return len(self.snapshot.ids)
+
+    def filter_mask(self, course_id=None, difficulty=None):
+        """Boolean mask of rows matching the filters, or None when unfiltered."""
+        mask = None
+        if course_id is not None:
+            mask = self.snapshot.course_ids == int(course_id)
+        if difficulty:
+            by_difficulty = self.snapshot.difficulties == difficulty.strip().lower().encode()
+            mask = by_difficulty if mask is None else mask & by_difficulty
+        return mask
+
+    def score_rows(self, query, rows=None):
+        """
+        Dot products of ``query`` with ``rows`` (all rows when None). float16
+        and int8 rows are upcast one chunk at a time; int8 scores are rescaled.
+        """
+        vectors, scales = self.snapshot.vectors, self.snapshot.scales
+        if rows is not None:
+            scores = (vectors[rows] @ query).astype(np.float32, copy=False)
+            return scores * scales[rows] if scales is not None else scores
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), SCAN_CHUNK):
+            scores[start:start + SCAN_CHUNK] = vectors[start:start + SCAN_CHUNK] @ query
+        return scores * scales if scales is not None else scores
+
+    def rows_as_float(self, rows):
+        scales = self.snapshot.scales
+        return dequantize(self.snapshot.vectors[rows], scales[rows] if scales is not None else None)
+
+    def exact_search(self, query, top_n, mask=None):
+        if mask is None:
+            scores = self.score_rows(query)
+            top = top_k(scores, top_n)
+            return top, scores[top]
+        rows = np.flatnonzero(mask)
+        scores = self.score_rows(query, rows)
+        top = top_k(scores, top_n)
+        return rows[top], scores[top]
+
+    @cached_property
+    def partitions(self):
+        """
+        course id -> ``(start, end)`` row slice, or None for a store written
+        before rows were kept sorted by course.
+        """
+        course_ids = self.snapshot.course_ids
+        if np.any(course_ids[1:] < course_ids[:-1]):
+            return None
+        courses, starts = np.unique(course_ids, return_index=True)
+        ends = np.append(starts[1:], len(course_ids))
+        return dict(zip(courses.tolist(), zip(starts.tolist(), ends.tolist())))
+
+    def search_course(self, query, top_n, course_id, difficulty=None):
+        """
+        Exact top-N within one course, touching only that course's slice of
+        the matrix instead of filtering the whole catalog.
+        """
+        query = self.prepare_query(query)
+        if self.partitions is None:
+            return self.exact_search(query, top_n, self.filter_mask(course_id, difficulty))
+
+        start, end = self.partitions.get(int(course_id), (0, 0))
+        rows = np.arange(start, end)
+        if difficulty:
+            rows = rows[self.snapshot.difficulties[start:end] == difficulty.strip().lower().encode()]
+        scores = self.score_rows(query, rows)
+        top = top_k(scores, top_n)
+        return rows[top], scores[top]
+
+    @abstractmethod
+    def search(self, query, top_n, course_id=None, difficulty=None):
+        """
+        Return ``(rows, scores)`` for the ``top_n`` rows most similar to
+        ``query``; map rows to assignment ids with ``index.ids[rows]``.
+        """
+
+    @staticmethod
+    def prepare_query(query):
+        return normalize(np.array(query, dtype=np.float32).reshape(1, -1))[0]
+
+
+class ExactIndex(VectorIndex):
+    """Brute-force inner product over the (pre-filtered) rows."""
+
+    def search(self, query, top_n, course_id=None, difficulty=None):
+        query = self.prepare_query(query)
+        return self.exact_search(query, top_n, self.filter_mask(course_id, difficulty))
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file index: spherical k-means centroids plus one list of rows per
+    centroid. A query scores the centroids, then only the rows in the
+    ``n_probe`` nearest lists. Lists are persisted next to the store matrix
+    (``ivf-<generation>.npz``) so each worker does not retrain them.
+    """
+
+    def __init__(self, snapshot, directory=None, n_lists=None, n_probe=None, iterations=10, seed=0):
+        super().__init__(snapshot)
+        n = len(snapshot.ids)
+        self.n_lists = max(1, min(n, n_lists or settings.AI_IVF_LISTS or int(np.sqrt(n)) or 1))
+        self.n_probe = n_probe or settings.AI_IVF_NPROBE
+        self.iterations = iterations
+        self.seed = seed
+        self.path = os.path.join(directory, f"ivf-{snapshot.generation}.npz") if directory else None
+        self.centroids, self.order, self.offsets = self._load() or self._build()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        with np.load(self.path) as lists:
+            if len(lists["order"]) != len(self) or len(lists["centroids"]) != self.n_lists:
+                return None
+            return lists["centroids"], lists["order"], lists["offsets"]
+
+    def _assign(self, centroids):
+        # A positive per-row scale does not change the argmax, so int8 rows need no rescaling.
+        vectors = self.snapshot.vectors
+        assignment = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), SCAN_CHUNK):
+            assignment[start:start + SCAN_CHUNK] = np.argmax(vectors[start:start + SCAN_CHUNK] @ centroids.T, axis=1)
+        return assignment
+
+    def _build(self):
+        vectors = self.snapshot.vectors
+        rng = np.random.default_rng(self.seed)
+        # Train on a sample; assignment of every row happens afterwards.
+        sample_size = min(len(vectors), max(self.n_lists * 64, 10000))
+        sample = self.rows_as_float(np.sort(rng.choice(len(vectors), sample_size, replace=False)))
+        centroids = sample[rng.choice(len(sample), self.n_lists, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=self.n_lists) == 0
+            # Re-seed empty lists from random sample rows.
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = normalize(sums)
+
+        assignment = self._assign(centroids)
+        order = np.argsort(assignment, kind='stable').astype(np.int64)
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=self.n_lists)))).astype(np.int64)
+
+        if self.path:
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as fh:
+                np.savez(fh, centroids=centroids, order=order, offsets=offsets)
+            os.replace(tmp_path, self.path)
+        logger.info("Built IVF index: %d rows in %d lists", len(vectors), self.n_lists)
+        return centroids, order, offsets
+
+    def search(self, query, top_n, course_id=None, difficulty=None):
+        query = self.prepare_query(query)
+        mask = self.filter_mask(course_id, difficulty)
+
+        probe = top_k(self.centroids @ query, self.n_probe)
+        rows = np.concatenate([self.order[self.offsets[i]:self.offsets[i + 1]] for i in probe])
+        if mask is not None:
+            rows = rows[mask[rows]]
+
+        if len(rows) < top_n:
+            # Filters left too few rows in the probed lists; a filtered set is
+            # small enough to scan exactly.
+            return self.exact_search(query, top_n, mask)
+
+        rows.sort()  # sequential reads from the memmap
+        scores = self.score_rows(query, rows)
+        top = top_k(scores, top_n)
+        return rows[top], scores[top]
+
+
+BACKENDS = {
+    'exact': ExactIndex,
+    'ivf': IVFIndex,
+}
+
+_cache_lock = threading.Lock()
+_cached = None
+
+
+def get_index(store):
+    """
+    Index over the store's current snapshot, rebuilt only when the snapshot
+    changes. The backend is chosen by ``AI_VECTOR_INDEX``.
+    """
+    global _cached
+    snapshot = store.load()
+    with _cache_lock:
+        if _cached is None or _cached.snapshot is not snapshot:
+            backend = BACKENDS[settings.AI_VECTOR_INDEX]
+            if backend is IVFIndex and len(snapshot.ids):
+                _cached = IVFIndex(snapshot, directory=store.directory)
+            else:
+                _cached = ExactIndex(snapshot)
+        return _cached
@@ -1,58 +1,54 @@
 # ai_recommendations/views.py
 
 from django.http import JsonResponse
-from django.core.cache import cache
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from apps.assignments.models import Assignment
 from apps.courses.models import Course
-from transformers import BertTokenizer, BertModel
-import torch
-from sklearn.metrics.pairwise import cosine_similarity
+from apps.custom_auth.claims import in_groups
+from apps.staff_members.models import StaffMember
+from apps.student.models import Student
+from django.conf import settings
+from .batching import MicroBatcher, embed_unique
+from .embedding_store import EmbeddingStore
+from .inference import get_embeddings
+from .models import StudentRecommendation
+from .query_cache import QueryEmbeddingCache
+from .vector_index import get_index
 import logging
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Load pre-trained BERT model and tokenizer (CPU only)
-tokenizer = BertTokenizer.from_pretrained('bert-base-uncased')
-device = torch.device("cpu")
-model = BertModel.from_pretrained('bert-base-uncased').to(device)
+# The BERT model lives in the inference worker (or is loaded lazily), never at import time.
+
+# Shared, memory-mapped assignment embeddings (see embedding_store.py)
+embedding_store = EmbeddingStore()
+
+# Brief text -> embedding, shared by the threads of this worker
+query_cache = QueryEmbeddingCache()
+
+# Concurrent cache misses are encoded together in one forward pass
+query_batcher = MicroBatcher(
+    embed_unique(get_embeddings),
+    max_batch=settings.AI_BATCH_MAX_SIZE,
+    window_ms=settings.AI_BATCH_WINDOW_MS,
+)
 
 # ========== Utilities ==========
 
-def get_embeddings(texts):
-    inputs = tokenizer(texts, padding=True, truncation=True, return_tensors="pt").to(device)
-    with torch.no_grad():
-        outputs = model(**inputs)
-    embeddings = outputs.last_hidden_state.mean(dim=1)
-    return embeddings
-
-def fetch_assignments_and_embeddings():
-    assignments = Assignment.objects.all()
-    if not assignments.exists():
-        return [], torch.empty(0)
-    
-    descriptions = [a.description for a in assignments]
-    embeddings = get_embeddings(descriptions)
-    return assignments, embeddings
+def embed_query(text):
+    """Embedding of a single brief, micro-batched with concurrent requests when enabled."""
+    if settings.AI_BATCH_WINDOW_MS <= 0:
+        return get_embeddings([text])[0]
+    return query_batcher.submit(text).result()
 
 def refresh_embeddings():
-    """Refresh the assignments queryset and their corresponding embeddings in cache."""
-    assignments_queryset, assignments_embeddings = fetch_assignments_and_embeddings()
-    cache.set('assignments_queryset', list(assignments_queryset))
-    cache.set('assignments_embeddings', assignments_embeddings)
-
-def get_cached_embeddings():
-    assignments_queryset = cache.get('assignments_queryset', [])
-    assignments_embeddings = cache.get('assignments_embeddings', None)
-    return assignments_queryset, assignments_embeddings
-
-# Fetch assignments and embeddings ONCE initially
-# try:
-#     from apps.assignments.models import Assignment
-#     if Assignment.objects.exists():
-#         refresh_embeddings()
-# except Exception as e:
-#     print(f"[WARNING] Couldn't refresh embeddings at startup: {e}")
+    """Re-encode only the assignments whose description changed since the last sync."""
+    rows = Assignment.objects.order_by('id').values_list('id', 'description', 'course_id', 'difficulty')
+    return embedding_store.sync(rows, get_embeddings)
 
 # ========== Recommendation Logic ==========
 
@@ -76,37 +72,60 @@ def recommend_using_course_and_difficulty(course_name, difficulty, top_n=3):
 
 def recommend_based_on_brief(brief_description, top_n=3):
     if not brief_description.strip():
-        return f"⚠️ Brief description is empty."
+        return "⚠️ Brief description is empty."
+
+    index = get_index(embedding_store)
+
+    if len(index) == 0:
+        logger.warning("No assignments available for recommendation.")
+        return "⚠️ No assignments available for recommendation."
+
+    brief_embedding = query_cache.get_or_compute(brief_description, embed_query)
+    top_rows, _ = index.search(brief_embedding, top_n)
+    return assignments_in_order(index.ids[top_rows].tolist())
+
+def recommend_hybrid(course_name, difficulty, brief_description, top_n=3):
+    """
+    Semantic ranking inside the requested course and difficulty. Only that
+    course's slice of the embedding matrix is scanned; when it holds fewer
+    than ``top_n`` matches, the rest come from the global index.
+    """
+    if not brief_description.strip():
+        return "⚠️ Brief description is empty."
 
-    assignments_queryset, assignments_embeddings = get_cached_embeddings()
+    try:
+        course = Course.objects.get(name__iexact=course_name.strip())
+    except Course.DoesNotExist:
+        logger.error(f"No course found with the name: {course_name}")
+        return f"❌ No course found with the name: {course_name}"
 
-    if assignments_embeddings is None or len(assignments_queryset) == 0:
+    index = get_index(embedding_store)
+    if len(index) == 0:
         logger.warning("No assignments available for recommendation.")
-        return f"⚠️ No assignments available for recommendation."
+        return "⚠️ No assignments available for recommendation."
+
+    brief_embedding = query_cache.get_or_compute(brief_description, embed_query)
+    top_rows, _ = index.search_course(brief_embedding, top_n, course.id, difficulty)
+    top_ids = index.ids[top_rows].tolist()
 
-    brief_embedding = get_embeddings([brief_description])
-    sim_scores = cosine_similarity(
-        brief_embedding.detach().numpy(),
-        assignments_embeddings.detach().numpy()
-    )[0]
+    if len(top_ids) < top_n:
+        extra_rows, _ = index.search(brief_embedding, top_n + len(top_ids), difficulty=difficulty)
+        extra_ids = [pk for pk in index.ids[extra_rows].tolist() if pk not in top_ids]
+        top_ids += extra_ids[:top_n - len(top_ids)]
 
-    top_indices = sim_scores.argsort()[-top_n:][::-1]
-    assignments_list = list(assignments_queryset)
-    recommended_assignments = [assignments_list[i] for i in top_indices]
+    return assignments_in_order(top_ids)
 
-    return recommended_assignments
+def assignments_in_order(ids):
+    """Assignments for ``ids`` in the given order, in one query."""
+    assignments_by_id = Assignment.objects.select_related('course').in_bulk(ids)
+    return [assignments_by_id[pk] for pk in ids if pk in assignments_by_id]
 
 # ========== API View ==========
 
 def get_recommendations(request):
-    method_choice = request.GET.get("method_choice", "1")  # "1" for Course+Difficulty, "2" for Brief Description
+    method_choice = request.GET.get("method_choice", "1")  # "1" Course+Difficulty, "2" Brief Description, "3" both (hybrid)
     top_n = int(request.GET.get("top_n", 4))
 
-    # Auto-refresh if assignments count changed
-    cached_assignments, _ = get_cached_embeddings()
-    # if Assignment.objects.count() != len(cached_assignments):
-    #     refresh_embeddings()
-
     if method_choice == "1":
         course_name = request.GET.get("course_name", "Java")
         difficulty = request.GET.get("difficulty", "Easy")
@@ -114,6 +133,11 @@ def get_recommendations(request):
     elif method_choice == "2":
         brief_description = request.GET.get("brief_description", "web app using django")
         recommendations = recommend_based_on_brief(brief_description, top_n=top_n)
+    elif method_choice == "3":
+        course_name = request.GET.get("course_name", "Java")
+        difficulty = request.GET.get("difficulty", "Easy")
+        brief_description = request.GET.get("brief_description", "web app using django")
+        recommendations = recommend_hybrid(course_name, difficulty, brief_description, top_n=top_n)
     else:
         logger.error("Invalid method choice.")
         return JsonResponse({"error": "Invalid method choice."}, status=400)
@@ -131,3 +155,80 @@ def get_recommendations(request):
         })
 
     return JsonResponse({"recommendations": recommended_list})
+
+
+def manages_student(request, student):
+    """
+    Whether the authenticated user may see ``student``'s recommendations: the
+    student themself, an admin, the supervisor of the student's track or the
+    branch manager of that track's branch.
+    """
+    user = request.user
+    if isinstance(user, Student):
+        return user.pk == student.pk
+    role = getattr(user, "role", None)
+    if user.is_superuser or role == StaffMember.Role.ADMIN or in_groups(request, [StaffMember.Role.ADMIN]):
+        return True
+    track = student.track
+    if track is None:
+        return False
+    if role == StaffMember.Role.SUPERVISOR:
+        return track.supervisor_id == user.pk
+    if role == StaffMember.Role.BRANCH_MANAGER:
+        return track.branch_id is not None and track.branch_id == user.branch_id
+    return False
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_student_recommendations(request, student_id):
+    """
+    Precomputed recommendations for one student (see personalization.py), for
+    the student themself or the staff who manage them. Nothing is computed
+    here: a row whose grades changed is served with ``stale`` set, and a
+    student who has no row yet gets an empty list with a 202 until
+    ``build_student_recommendations --stale`` runs.
+    """
+    top_n = request.GET.get("top_n", str(settings.AI_STUDENT_RECOMMENDATIONS_TOP_K))
+    if not top_n.isdigit() or int(top_n) < 1:
+        return Response({"error": "top_n must be a positive integer."}, status=status.HTTP_400_BAD_REQUEST)
+    top_n = int(top_n)
+
+    student = Student.objects.select_related('track').filter(id=student_id).first()
+    if student is None:
+        logger.error(f"No student found with id: {student_id}")
+        return Response({"error": f"❌ No student found with id: {student_id}"}, status=status.HTTP_404_NOT_FOUND)
+    if not manages_student(request, student):
+        return Response({"error": "Unauthorized access"}, status=status.HTTP_403_FORBIDDEN)
+
+    stored = StudentRecommendation.objects.filter(student_id=student_id).first()
+    if stored is None:
+        return Response({"recommendations": [], "updated_at": None, "stale": True}, status=status.HTTP_202_ACCEPTED)
+
+    scores = dict(zip(stored.assignment_ids, stored.scores))
+    recommended_list = []
+    for rec in assignments_in_order(stored.assignment_ids[:top_n]):
+        recommended_list.append({
+            "id": rec.id,
+            "title": rec.title,
+            "description": rec.description,
+            "course_name": rec.course.name,
+            "difficulty": rec.difficulty,
+            "score": scores[rec.id],
+        })
+
+    return Response({
+        "recommendations": recommended_list,
+        "updated_at": stored.updated_at.isoformat(),
+        "stale": stored.stale,
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_recommendation_stats(request):
+    """Per-worker query-embedding cache and micro-batching counters, used for sizing."""
+    return Response({
+        "query_cache": query_cache.stats(),
+        "micro_batcher": {"batches": query_batcher.batches, "items": query_batcher.items},
+    })
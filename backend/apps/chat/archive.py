@@ -0,0 +1,74 @@
+# File: apps/chat/archive.py
+"""
+Tiered retention for chat history.
+
+Reads almost always touch the last few days of a room, so ``Message`` only
+keeps the hot window: ``archive_messages`` moves anything older than
+``CHAT_HOT_RETENTION_DAYS`` into ``ArchivedMessage``, batch by batch, each
+batch copied and deleted in one transaction. Archived rows keep their ids,
+so message cursors stay valid. Run it from cron with
+``python manage.py archive_chat_messages``.
+
+Reads fall through to the archive only when they run past the hot window:
+room pagination (``MessageKeysetPagination``), the inbox preview of a room
+whose whole history is archived, and unread reconciliation. Full-text
+search covers the hot window only.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedMessage, Message
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_FIELDS = ('id', 'room_id', 'sender_content_type_id', 'sender_object_id', 'text', 'timestamp')
+
+
+def archive_cutoff(older_than=None):
+    if older_than is None:
+        older_than = timedelta(days=settings.CHAT_HOT_RETENTION_DAYS)
+    return timezone.now() - older_than
+
+
+def archivable_messages(older_than=None, room_ids=None):
+    messages = Message.objects.filter(timestamp__lt=archive_cutoff(older_than))
+    if room_ids is not None:
+        messages = messages.filter(room_id__in=room_ids)
+    return messages
+
+
+def archive_messages(older_than=None, batch_size=None, room_ids=None):
+    """
+    Move messages older than ``older_than`` (a timedelta; defaults to the
+    hot window) into the archive; returns how many were moved. Short
+    transactions keep locks on the hot table brief while live traffic
+    keeps writing to it.
+
+    A message whose id is already in the archive is left in the hot table
+    and logged rather than deleted, so neither copy is lost.
+    """
+    batch_size = batch_size or settings.CHAT_ARCHIVE_BATCH_SIZE
+    candidates = archivable_messages(older_than, room_ids).order_by('id').values(*ARCHIVED_FIELDS)
+    moved = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(candidates.filter(id__gt=last_id)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            ids = [row['id'] for row in batch]
+            conflicts = set(ArchivedMessage.objects.filter(id__in=ids).values_list('id', flat=True))
+            rows = [row for row in batch if row['id'] not in conflicts]
+            # A concurrent run archiving the same ids fails here and rolls the batch back
+            ArchivedMessage.objects.bulk_create([ArchivedMessage(**row) for row in rows])
+            Message.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        if conflicts:
+            logger.warning(f"Left {len(conflicts)} chat messages in place, already archived: {sorted(conflicts)}")
+        moved += len(rows)
+        logger.info(f"Archived {moved} chat messages so far")
+    return moved
@@ -0,0 +1,175 @@
+# File: apps/chat/benchmarks.py
+"""
+Benchmarks for the chat stack.
+
+Run them with ``python manage.py benchmark_chat <suite>``; every suite
+returns a JSON-serialisable dict. Benchmark rows are created under a
+``bench-chat`` prefix and deleted afterwards.
+"""
+import asyncio
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.contenttypes.models import ContentType
+from django.test import override_settings
+from django.urls import re_path
+
+from apps.staff_members.models import StaffMember
+
+from .consumers import ChatConsumer
+from .models import ChatParticipant, ChatRoom
+from .persistence import MessageWriter
+
+PREFIX = "bench-chat"
+
+
+def seed_rooms(rooms, members):
+    """``rooms`` rooms of ``members`` staff members each; returns [(room, [users])]."""
+    users = StaffMember.objects.bulk_create([
+        StaffMember(email=f"{PREFIX}-{i}@example.invalid", username=f"{PREFIX}-{i}")
+        for i in range(rooms * members)
+    ])
+    chat_rooms = ChatRoom.objects.bulk_create([ChatRoom(name=f"{PREFIX}_{i}") for i in range(rooms)])
+    ct = ContentType.objects.get_for_model(StaffMember)
+    seeded = []
+    for i, room in enumerate(chat_rooms):
+        room_users = users[i * members:(i + 1) * members]
+        ChatParticipant.objects.bulk_create([
+            ChatParticipant(room=room, content_type=ct, object_id=user.id) for user in room_users
+        ])
+        seeded.append((room, room_users))
+    return seeded
+
+
+def cleanup():
+    ChatRoom.objects.filter(name__startswith=f"{PREFIX}_").delete()
+    StaffMember.objects.filter(email__startswith=f"{PREFIX}-").delete()
+
+
+async def _fanout(application, seeded, messages):
+    communicators = []
+    for room, users in seeded:
+        room_communicators = []
+        for user in users:
+            communicator = WebsocketCommunicator(application, f"/ws/chat/{room.name}/")
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise RuntimeError(f"{user.username} could not join {room.name}")
+            room_communicators.append(communicator)
+        communicators.append(room_communicators)
+
+    async def drain(communicator):
+        for _ in range(messages):
+            await communicator.receive_json_from(timeout=30)
+
+    async def send(communicator):
+        for i in range(messages):
+            await communicator.send_json_to({'text': f"benchmark message {i}"})
+
+    start = time.perf_counter()
+    # Every room's first member sends; every member (sender included) receives.
+    await asyncio.gather(
+        *(send(room_communicators[0]) for room_communicators in communicators),
+        *(drain(c) for room_communicators in communicators for c in room_communicators),
+    )
+    elapsed = time.perf_counter() - start
+
+    for room_communicators in communicators:
+        for communicator in room_communicators:
+            await communicator.disconnect()
+    return elapsed
+
+
+def run_fanout(options):
+    """
+    Messages per second through ChatConsumer: each room's first member sends
+    ``--messages`` messages that are saved and delivered to every member.
+    Compared between one INSERT per message and bulk inserts of up to
+    ``--batch-sizes`` messages.
+    """
+    room_count = options.get('rooms') or 20
+    member_count = options.get('members') or 10
+    message_count = options.get('messages') or 100
+    batch_sizes = options.get('batch_sizes') or [100]
+    layers = options.get('channel_layers')
+    results = {'rooms': room_count, 'members': member_count, 'messages_per_room': message_count, 'runs': []}
+
+    modes = [('per_message', MessageWriter(max_batch=1, interval_ms=0))] + [
+        (f'batched_{size}', MessageWriter(max_batch=size)) for size in batch_sizes
+    ]
+    with override_settings(**({'CHANNEL_LAYERS': layers} if layers else {})):
+        channel_layers.backends.clear()
+        cleanup()
+        try:
+            seeded = seed_rooms(room_count, member_count)
+            for label, writer in modes:
+                consumer = type('BenchmarkChatConsumer', (ChatConsumer,), {'writer': writer})
+                application = URLRouter([re_path(r"ws/chat/(?P<room_name>[\w-]+)/$", consumer.as_asgi())])
+                elapsed = async_to_sync(_fanout)(application, seeded, message_count)
+                writer.flush()
+                sent = room_count * message_count
+                results['runs'].append({
+                    'mode': label,
+                    'seconds': round(elapsed, 3),
+                    'messages_per_s': round(sent / elapsed, 1),
+                    'deliveries_per_s': round(sent * member_count / elapsed, 1),
+                    'inserts': writer.flushes or sent,
+                })
+        finally:
+            cleanup()
+            channel_layers.backends.clear()
+    return results
+
+
+def run_inserts(options):
+    """
+    Message insert throughput without the WebSocket layer: one INSERT plus
+    its unread-counter UPDATE per message against ``MessageWriter`` bulk
+    inserts of up to ``--batch-sizes`` messages. All messages are submitted
+    at once, as concurrent senders would, and each one's wait until it is
+    saved is reported.
+    """
+    message_count = options.get('messages') or 5000
+    batch_sizes = options.get('batch_sizes') or [100, 500]
+    results = {'messages': message_count, 'runs': []}
+
+    cleanup()
+    try:
+        room, users = seed_rooms(1, 2)[0]
+        ct_id = ContentType.objects.get_for_model(StaffMember).id
+        sender = users[0]
+
+        for label, writer in [('per_message', MessageWriter(interval_ms=0))] + [
+            (f'batched_{size}', MessageWriter(max_batch=size)) for size in batch_sizes
+        ]:
+            start = time.perf_counter()
+            submitted = []
+            for i in range(message_count):
+                submitted.append((time.perf_counter(), writer.submit(room.id, ct_id, sender.id, f"benchmark {i}")))
+            waits = []
+            for submitted_at, future in submitted:
+                future.result()
+                waits.append(time.perf_counter() - submitted_at)
+            elapsed = time.perf_counter() - start
+            waits.sort()
+            results['runs'].append({
+                'mode': label,
+                'seconds': round(elapsed, 3),
+                'messages_per_s': round(message_count / elapsed, 1),
+                'inserts': writer.flushes or message_count,
+                'saved_p50_ms': round(waits[len(waits) // 2] * 1e3, 2),
+                'saved_p99_ms': round(waits[int(len(waits) * 0.99)] * 1e3, 2),
+            })
+    finally:
+        cleanup()
+    return results
+
+
+SUITES = {
+    'fanout': run_fanout,
+    'inserts': run_inserts,
+}
@@ -0,0 +1,143 @@
+# File: apps/chat/consumers.py
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from rest_framework import serializers
+
+from .models import ChatRoom
+from .persistence import message_writer
+from .presence import presence
+
+
+class ChatConsumer(AsyncJsonWebsocketConsumer):
+    """
+    ws/chat/<room_name>/?token=<access> — participants of the room join its
+    group (the token may also come as a subprotocol or the login cookie, see
+    custom_auth/websocket.py); every
+    message a client sends as ``{"text": ...}`` is saved and broadcast to the
+    group in the same shape as ``MessageSerializer``.
+
+    Clients also send ``{"type": "heartbeat"}`` to stay online and
+    ``{"type": "typing", "typing": true|false}``; the group receives
+    ``{"type": "presence", "user", "online"}`` and
+    ``{"type": "typing", "user", "typing"}`` events. Neither touches the
+    database (see presence.py).
+    """
+
+    group_name = None
+    writer = message_writer
+    presence = presence
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        if self.user is None or not self.user.is_authenticated:
+            await self.close(code=4401)
+            return
+
+        self.room = await self.get_room(self.scope['url_route']['kwargs']['room_name'])
+        if self.room is None:
+            # Unknown room, or the user is not one of its participants.
+            await self.close(code=4403)
+            return
+
+        self.sender = {
+            'id': self.user.id,
+            'username': self.user.username,
+            'email': self.user.email,
+            'role': getattr(self.user, 'role', None),
+        }
+        self.typing_sent_at = None
+        self.group_name = f"chat_{self.room.id}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        # Echo the subprotocol the token came in (custom_auth/websocket.py), if any
+        await self.accept(self.scope.get('auth_subprotocol'))
+
+        await sync_to_async(self.presence.join)(self.sender_ct_id, self.user.id)
+        await self.broadcast('chat.presence', online=True)
+
+    async def disconnect(self, code):
+        if self.group_name:
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+            # Still online while another of the user's sockets is open
+            if await sync_to_async(self.presence.leave)(self.sender_ct_id, self.user.id):
+                await self.broadcast('chat.presence', online=False)
+
+    async def receive_json(self, content, **kwargs):
+        kind = content.get('type') if isinstance(content, dict) else None
+        if kind == 'heartbeat':
+            await sync_to_async(self.presence.heartbeat)(self.sender_ct_id, self.user.id)
+            return
+        if kind == 'typing':
+            await self.typing(bool(content.get('typing')))
+            return
+
+        text = (content.get('text') or '').strip() if isinstance(content, dict) else ''
+        if not text:
+            await self.send_json({'error': 'Message text is required.'})
+            return
+
+        # Saved before it is broadcast, in one bulk insert with the messages other
+        # sockets send meanwhile (see persistence.py); waiting does not hold the database thread.
+        saved = await database_sync_to_async(self.writer.submit)(
+            self.room.id, self.sender_ct_id, self.user.id, text
+        )
+        message = await asyncio.wrap_future(saved)
+        self.typing_sent_at = None
+        await self.channel_layer.group_send(self.group_name, {
+            'type': 'chat.message',
+            'message': {
+                'id': message.id,
+                'room': self.room.id,
+                'sender': self.sender,
+                'text': message.text,
+                'timestamp': serializers.DateTimeField().to_representation(message.timestamp),
+            },
+        })
+
+    async def typing(self, is_typing):
+        # Keystrokes arrive far more often than others need to hear about them:
+        # "typing" is re-sent at most once per interval, "stopped" once.
+        now = time.monotonic()
+        if is_typing:
+            if self.typing_sent_at is not None and now - self.typing_sent_at < settings.CHAT_TYPING_INTERVAL:
+                return
+            self.typing_sent_at = now
+        elif self.typing_sent_at is None:
+            return
+        else:
+            self.typing_sent_at = None
+        await self.broadcast('chat.typing', typing=is_typing)
+
+    async def broadcast(self, event_type, **payload):
+        await self.channel_layer.group_send(self.group_name, {
+            'type': event_type,
+            'user': self.sender,
+            'sender_channel': self.channel_name,
+            **payload,
+        })
+
+    async def chat_message(self, event):
+        await self.send_json(event['message'])
+
+    async def chat_presence(self, event):
+        if event['sender_channel'] != self.channel_name:
+            await self.send_json({'type': 'presence', 'user': event['user'], 'online': event['online']})
+
+    async def chat_typing(self, event):
+        if event['sender_channel'] != self.channel_name:
+            await self.send_json({'type': 'typing', 'user': event['user'], 'typing': event['typing']})
+
+    @database_sync_to_async
+    def get_room(self, room_name):
+        ct = ContentType.objects.get_for_model(self.user)
+        self.sender_ct_id = ct.id
+        return ChatRoom.objects.filter(
+            name=room_name,
+            participants__content_type=ct,
+            participants__object_id=self.user.id,
+        ).first()
@@ -0,0 +1,105 @@
+# File: apps/chat/directory.py
+"""
+One directory over every user model that can take part in a chat.
+
+A search runs in up to two phases, each bounded by what is still missing
+from ``limit``:
+
+1. prefix matches (``istartswith``) on username, email and names;
+2. on PostgreSQL, for queries of ``TRIGRAM_MIN_LENGTH`` characters or
+   more, substring matches (``icontains``).
+
+Migration 0005 adds ``pg_trgm`` GIN indexes on exactly the expressions
+Django generates for those lookups (``UPPER(col::text)``), so both phases
+are index scans instead of full scans. Other backends only run the prefix
+phase. Every model gets the same per-phase limit and the candidates are
+merged, so a page full of staff never hides the students behind them.
+"""
+import operator
+from functools import reduce
+
+from django.apps import apps
+from django.db import connections
+from django.db.models import Q
+
+USER_TYPES = {'staff': 'staff_members.StaffMember', 'student': 'student.Student'}
+SEARCH_FIELDS = ('username', 'email', 'first_name', 'last_name')
+TRIGRAM_MIN_LENGTH = 3
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 50
+
+
+def user_model(kind):
+    """The model behind a directory ``type``, or None for an unknown one."""
+    label = USER_TYPES.get(kind)
+    return apps.get_model(label) if label else None
+
+
+def user_type(user):
+    """The directory ``type`` of a user instance."""
+    for kind, label in USER_TYPES.items():
+        if user._meta.label == label:
+            return kind
+    return None
+
+
+def room_handle(user):
+    """A user's part of a 1:1 room name; students are prefixed since usernames are only unique per model."""
+    if user_type(user) == 'student':
+        return f"student_{user.pk}"
+    return user.username
+
+
+def directory_entry(kind, user):
+    return {
+        'type': kind,
+        'id': user.pk,
+        'username': user.username,
+        'email': user.email,
+        'name': f"{user.first_name} {user.last_name}".strip(),
+        'role': user.role,
+    }
+
+
+def matching(lookup, query):
+    return reduce(operator.or_, (Q(**{f"{field}__{lookup}": query}) for field in SEARCH_FIELDS))
+
+
+def search_directory(query, limit=DEFAULT_LIMIT, exclude=None):
+    """
+    Up to ``limit`` active users matching ``query`` as ``directory_entry``
+    dicts, prefix matches first. ``exclude`` is a ``(type, id)`` to leave
+    out, normally the caller.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    limit = max(1, min(limit, MAX_LIMIT))
+
+    results = []
+    seen = {kind: [] for kind in USER_TYPES}
+    for lookup in ('istartswith', 'icontains'):
+        remaining = limit - len(results)
+        if remaining <= 0:
+            break
+        candidates = []
+        for kind in USER_TYPES:
+            users = user_model(kind)._default_manager.filter(is_active=True).exclude(pk__in=seen[kind])
+            if lookup == 'icontains' and (
+                len(query) < TRIGRAM_MIN_LENGTH or connections[users.db].vendor != 'postgresql'
+            ):
+                continue  # no trigram index to answer it
+            if exclude and exclude[0] == kind:
+                users = users.exclude(pk=exclude[1])
+            users = (
+                users.filter(matching(lookup, query))
+                .only('id', 'username', 'email', 'first_name', 'last_name', 'role')
+                .order_by('email', 'pk')[:remaining]
+            )
+            candidates += [(kind, user) for user in users]
+
+        candidates.sort(key=lambda pair: (pair[1].email.lower(), pair[0], pair[1].pk))
+        for kind, user in candidates[:remaining]:
+            seen[kind].append(user.pk)
+            results.append(directory_entry(kind, user))
+    return results
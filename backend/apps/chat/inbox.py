@@ -0,0 +1,106 @@
+# File: apps/chat/inbox.py
+"""
+Inbox queries: a user's rooms with their participants, last message and
+unread count in a constant number of queries, however many rooms there are.
+
+``inbox_rooms`` annotates the rooms with the id of their last message and
+the user's unread counter; ``attach_inbox`` then resolves the participants
+and last messages of a whole page of rooms at once.
+"""
+from collections import defaultdict
+
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedMessage, ChatParticipant, ChatRoom, Message
+
+
+def last_message_id():
+    """
+    Id of a room's newest message, for annotate(). The archive is only
+    consulted for rooms without a hot message (see archive.py).
+    """
+    def newest(model):
+        return Subquery(model.objects.filter(room=OuterRef('pk')).order_by('-timestamp', '-id').values('id')[:1])
+    return Coalesce(newest(Message), newest(ArchivedMessage))
+
+
+def inbox_rooms(user):
+    """The rooms ``user`` participates in, newest first, annotated for the inbox."""
+    ct = ContentType.objects.get_for_model(user)
+    mine = ChatParticipant.objects.filter(room=OuterRef('pk'), content_type=ct, object_id=user.id)
+    return (
+        ChatRoom.objects.filter(participants__content_type=ct, participants__object_id=user.id)
+        .annotate(
+            last_message_id=last_message_id(),
+            # maintained on write, see unread.py
+            unread_count=Subquery(mine.values('unread_count')[:1]),
+        )
+        .order_by('-created_at')
+    )
+
+
+def resolve_users(pairs):
+    """``{(content_type_id, object_id): user}`` with one query per content type."""
+    by_type = defaultdict(set)
+    for ct_id, object_id in pairs:
+        by_type[ct_id].add(object_id)
+
+    users = {}
+    for ct_id, object_ids in by_type.items():
+        model = ContentType.objects.get_for_id(ct_id).model_class()
+        for pk, user in model._default_manager.in_bulk(object_ids).items():
+            users[(ct_id, pk)] = user
+    return users
+
+
+def sender_models():
+    """Querysets of every model that currently sends messages, for GenericPrefetch."""
+    from apps.staff_members.models import StaffMember
+    from apps.student.models import Student
+
+    return [StaffMember.objects.all(), Student.objects.all()]
+
+
+def attach_inbox(rooms):
+    """
+    Set ``inbox_participants`` (users) and ``inbox_last_message`` on each of
+    ``rooms``. Rooms without a ``last_message_id`` annotation get it here.
+    """
+    rooms = list(rooms)
+    room_ids = [room.id for room in rooms]
+
+    participants = defaultdict(list)
+    for room_id, ct_id, object_id in (
+        ChatParticipant.objects.filter(room_id__in=room_ids)
+        .order_by('id')
+        .values_list('room_id', 'content_type_id', 'object_id')
+    ):
+        participants[room_id].append((ct_id, object_id))
+    users = resolve_users(pair for pairs in participants.values() for pair in pairs)
+
+    if any(not hasattr(room, 'last_message_id') for room in rooms):
+        last_ids = dict(
+            ChatRoom.objects.filter(id__in=room_ids)
+            .annotate(last_id=last_message_id())
+            .values_list('id', 'last_id')
+        )
+        for room in rooms:
+            room.last_message_id = last_ids.get(room.id)
+
+    last_ids = [room.last_message_id for room in rooms if room.last_message_id]
+    messages = Message.objects.prefetch_related(
+        GenericPrefetch('sender', sender_models())
+    ).in_bulk(last_ids)
+    archived = [pk for pk in last_ids if pk not in messages]
+    if archived:
+        messages.update(ArchivedMessage.objects.prefetch_related(
+            GenericPrefetch('sender', sender_models())
+        ).in_bulk(archived))
+
+    for room in rooms:
+        room.inbox_participants = [users[pair] for pair in participants[room.id] if pair in users]
+        room.inbox_last_message = messages.get(room.last_message_id)
+    return rooms
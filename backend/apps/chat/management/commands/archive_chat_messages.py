@@ -0,0 +1,34 @@
+# File: apps/chat/management/commands/archive_chat_messages.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from apps.chat.archive import archivable_messages, archive_messages
+
+
+class Command(BaseCommand):
+    help = (
+        "Move chat messages older than the hot window into the archive table. "
+        "Meant to run periodically, e.g. nightly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.CHAT_HOT_RETENTION_DAYS,
+            help="Archive messages older than this many days.",
+        )
+        parser.add_argument('--batch-size', type=int, help="Messages moved per transaction.")
+        parser.add_argument('--rooms', type=int, nargs='+', help="Only archive these room ids.")
+        parser.add_argument('--dry-run', action='store_true', help="Only report how many would be moved.")
+
+    def handle(self, *args, **options):
+        older_than = timedelta(days=options['days'])
+        if options['dry_run']:
+            count = archivable_messages(older_than, options['rooms']).count()
+            self.stdout.write(f"{count} messages older than {options['days']} days would be archived.")
+            return
+        moved = archive_messages(older_than, options['batch_size'], options['rooms'])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} messages older than {options['days']} days."))
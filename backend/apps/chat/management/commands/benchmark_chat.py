@@ -0,0 +1,59 @@
+# File: apps/chat/management/commands/benchmark_chat.py
+import json
+import platform
+import subprocess
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.chat.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Run a chat benchmark suite and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES))
+        parser.add_argument('--rooms', type=int, help="Synthetic rooms to seed.")
+        parser.add_argument('--members', type=int, help="Connected participants per room.")
+        parser.add_argument('--messages', type=int, help="Messages sent per room (fanout) or in total (inserts).")
+        parser.add_argument(
+            '--batch-sizes',
+            type=int,
+            nargs='+',
+            help="Messages per bulk insert to compare against one INSERT per message.",
+        )
+        parser.add_argument(
+            '--in-memory',
+            action='store_true',
+            help="Use the in-memory channel layer instead of the configured one.",
+        )
+        parser.add_argument(
+            '--output',
+            help="Also write the results to this JSON file, to compare runs between releases.",
+        )
+
+    def _git_revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        if options['in_memory']:
+            options['channel_layers'] = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        results = {
+            'suite': options['suite'],
+            'timestamp': timezone.now().isoformat(),
+            'git_revision': self._git_revision(),
+            'python': platform.python_version(),
+            'results': SUITES[options['suite']](options),
+        }
+        report = json.dumps(results, indent=2)
+        self.stdout.write(report)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,18 @@
+# File: apps/chat/management/commands/reconcile_unread_counts.py
+from django.core.management.base import BaseCommand
+
+from apps.chat.unread import reconcile_unread_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute ChatParticipant.unread_count from Message and fix any drift. "
+        "Meant to run periodically, e.g. nightly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, nargs='+', help="Only reconcile these room ids.")
+
+    def handle(self, *args, **options):
+        fixed = reconcile_unread_counts(options['rooms'])
+        self.stdout.write(self.style.SUCCESS(f"Reconciled unread counters ({fixed} corrected)."))
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="chatparticipant",
+            name="unread_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="Messages from others since last_read; see apps/chat/unread.py.",
+            ),
+        ),
+    ]
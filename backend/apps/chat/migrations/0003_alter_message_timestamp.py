@@ -0,0 +1,20 @@
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0002_chatparticipant_unread_count"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="message",
+            name="timestamp",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now,
+                help_text="Timestamp when the message was sent.",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+# Trigram indexes for apps/chat/directory.py, on the same expression Django
+# generates for istartswith/icontains on PostgreSQL: UPPER("col"::text).
+# Nothing to do on other databases; the directory only prefix-matches there.
+DIRECTORY_TABLES = ("staff_member", "students")
+DIRECTORY_FIELDS = ("username", "email", "first_name", "last_name")
+
+
+def index_name(table, field):
+    return f"{table}_{field}_trgm_idx"
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table in DIRECTORY_TABLES:
+        for field in DIRECTORY_FIELDS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {index_name(table, field)} '
+                f'ON {table} USING GIN (UPPER("{field}"::text) gin_trgm_ops)'
+            )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for table in DIRECTORY_TABLES:
+        for field in DIRECTORY_FIELDS:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {index_name(table, field)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chat", "0004_message_search"),
+        ("staff_members", "0001_initial"),
+        ("student", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,64 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("chat", "0005_directory_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedMessage",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                (
+                    "sender_object_id",
+                    models.PositiveIntegerField(help_text="Primary key of the sender."),
+                ),
+                ("text", models.TextField(help_text="Message text content.")),
+                (
+                    "timestamp",
+                    models.DateTimeField(help_text="Timestamp when the message was sent."),
+                ),
+                (
+                    "archived_at",
+                    models.DateTimeField(
+                        auto_now_add=True,
+                        help_text="When the message was moved out of the hot table.",
+                    ),
+                ),
+                (
+                    "room",
+                    models.ForeignKey(
+                        help_text="The chat room this message is part of.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_messages",
+                        to="chat.chatroom",
+                    ),
+                ),
+                (
+                    "sender_content_type",
+                    models.ForeignKey(
+                        help_text="Content type of the sender model.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="archived_sent_messages",
+                        to="contenttypes.contenttype",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived Message",
+                "verbose_name_plural": "Archived Messages",
+                "ordering": ["timestamp"],
+                "indexes": [
+                    models.Index(
+                        fields=["room", "timestamp"],
+                        name="chat_archiv_room_id_f379a6_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
@@ -55,6 +56,10 @@ class ChatParticipant(models.Model):
     )
     user = GenericForeignKey('content_type', 'object_id')
     last_read = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Messages from others since last_read; see apps/chat/unread.py.'
+    )
     class Meta:
         unique_together = ('room', 'content_type', 'object_id')
         verbose_name = 'Chat Participant'
@@ -90,7 +95,7 @@ class Message(models.Model):
         help_text='Message text content.'
     )
     timestamp = models.DateTimeField(
-        auto_now_add=True,
+        default=timezone.now,
         help_text='Timestamp when the message was sent.'
     )
 
@@ -105,3 +110,51 @@ class Message(models.Model):
     def __str__(self):
         short = (self.text[:20] + '...') if len(self.text) > 23 else self.text
         return f"[{self.timestamp:%Y-%m-%d %H:%M}] {self.sender}: {short}"
+
+
+class ArchivedMessage(models.Model):
+    """
+    A message moved out of ``Message`` once it is older than the hot window
+    (see apps/chat/archive.py). Keeps its original id, so cursors and
+    references stay valid.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    room = models.ForeignKey(
+        ChatRoom,
+        on_delete=models.CASCADE,
+        related_name='archived_messages',
+        help_text='The chat room this message is part of.'
+    )
+    sender_content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        related_name='archived_sent_messages',
+        help_text='Content type of the sender model.'
+    )
+    sender_object_id = models.PositiveIntegerField(
+        help_text='Primary key of the sender.'
+    )
+    sender = GenericForeignKey('sender_content_type', 'sender_object_id')
+
+    text = models.TextField(
+        help_text='Message text content.'
+    )
+    timestamp = models.DateTimeField(
+        help_text='Timestamp when the message was sent.'
+    )
+    archived_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text='When the message was moved out of the hot table.'
+    )
+
+    class Meta:
+        ordering = ['timestamp']
+        verbose_name = 'Archived Message'
+        verbose_name_plural = 'Archived Messages'
+        indexes = [
+            models.Index(fields=['room', 'timestamp']),
+        ]
+
+    def __str__(self):
+        short = (self.text[:20] + '...') if len(self.text) > 23 else self.text
+        return f"[{self.timestamp:%Y-%m-%d %H:%M}] {self.sender}: {short}"
@@ -0,0 +1,168 @@
+# File: apps/chat/pagination.py
+import base64
+import binascii
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset pagination over a room's messages on ``(timestamp, id)``.
+
+    Without a cursor the latest page is returned. ``?before=<message id>``
+    returns the page of older messages and ``?after=<message id>`` the page
+    of newer ones. Each page is one range scan on the ``(room, timestamp)``
+    index, however deep into the history it is. Results are always oldest
+    first; ``previous``/``next`` link to the older/newer page. Pages older
+    than the hot window are read from the archive (see ``get_sources``).
+    """
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: "Must be an integer."})
+        return max(1, min(size, self.max_page_size))
+
+    def get_sources(self, queryset, view):
+        """
+        The hot queryset, then the room's archive when the view has one. Every
+        archived message is older than every hot one (see archive.py), so a
+        page can run from one into the other without merging.
+        """
+        get_archive_queryset = getattr(view, 'get_archive_queryset', None)
+        return [queryset, get_archive_queryset()] if get_archive_queryset else [queryset]
+
+    def get_cursor(self, sources, request, param):
+        value = request.query_params.get(param)
+        if value is None:
+            return None
+        if not value.isdigit():
+            raise ValidationError({param: "Must be a message id."})
+        for depth, source in enumerate(sources):
+            position = source.filter(pk=int(value)).values_list('timestamp', 'id').first()
+            if position is not None:
+                # depth: the source holding the cursor; pages next to it start there
+                return (*position, depth)
+        raise NotFound(f"Message {value} is not in this room.")
+
+    def read(self, sources, condition, ordering, limit):
+        # The archive is only queried once the hot table runs out of rows.
+        rows = []
+        for source in sources if ordering[0].startswith('-') else sources[::-1]:
+            rows += list(source.filter(condition).order_by(*ordering)[:limit - len(rows)])
+            if len(rows) >= limit:
+                break
+        return rows
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        sources = self.get_sources(queryset, view)
+        before = self.get_cursor(sources, request, 'before')
+        after = self.get_cursor(sources, request, 'after')
+
+        if after is not None:
+            timestamp, pk, depth = after
+            newer = Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, id__gt=pk)
+            rows = self.read(sources[:depth + 1], newer, ('timestamp', 'id'), size + 1)
+            self.has_newer, self.has_older = len(rows) > size, True
+            rows = rows[:size]
+        else:
+            older = Q()
+            if before is not None:
+                timestamp, pk, depth = before
+                older = Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+                sources = sources[depth:]
+            rows = self.read(sources, older, ('-timestamp', '-id'), size + 1)
+            self.has_older, self.has_newer = len(rows) > size, before is not None
+            rows = rows[:size][::-1]
+
+        self.page = rows
+        return rows
+
+    def get_link(self, param, message):
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'after' if param == 'before' else 'before')
+        return replace_query_param(url, param, message.id)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link('after', self.page[-1]) if self.page and self.has_newer else None,
+            'previous': self.get_link('before', self.page[0]) if self.page and self.has_older else None,
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SearchKeysetPagination(MessageKeysetPagination):
+    """
+    Keyset pagination over ranked search results on ``(rank, id)``, best
+    match first. ``next`` carries an opaque ``?cursor=`` holding the last
+    row's rank and id, so a page never re-scores or skips the rows before it.
+    """
+    page_size = 20
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+
+    @staticmethod
+    def encode_cursor(rank, pk):
+        return base64.urlsafe_b64encode(f"{rank!r}:{pk}".encode()).decode()
+
+    def decode_cursor(self, request):
+        value = request.query_params.get(self.cursor_query_param)
+        if value is None:
+            return None
+        try:
+            rank, pk = base64.urlsafe_b64decode(value.encode()).decode().split(':')
+            return float(rank), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise ValidationError({self.cursor_query_param: "Invalid cursor."})
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            rank, pk = cursor
+            queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=pk))
+        rows = list(queryset.order_by('-rank', '-id')[:size + 1])
+        self.has_next = len(rows) > size
+        self.page = rows[:size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        next_link = None
+        if self.has_next:
+            last = self.page[-1]
+            next_link = replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, self.encode_cursor(last.rank, last.id)
+            )
+        return Response({'next': next_link, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,174 @@
+# File: apps/chat/persistence.py
+"""
+Chat message persistence.
+
+``MessageWriter`` group-commits messages: callers queue a message and a
+background thread writes everything queued with one ``bulk_create`` once
+``max_batch`` messages are pending or every ``interval_ms``, whichever
+comes first. The batch's unread counters are incremented in the same
+transaction (``count_new_messages``). A caller gets its message back, with
+its id and timestamp, only once the batch has committed, so nothing is
+answered or broadcast that could still be lost; when a flush fails, every
+caller in the batch gets the error.
+
+Rows commit in id order across workers: each insert takes a lock
+(``pg_advisory_xact_lock`` on PostgreSQL) before it draws ids and
+timestamps and holds it until it commits, so a keyset cursor never passes a
+message that commits later with a smaller id.
+
+``submit()`` returns a future without blocking, for ``ChatConsumer``,
+whose database thread is shared by every socket of the process; ``add()``
+waits for it. Messages written inside a transaction (an atomic request,
+tests) or with an ``interval_ms`` of 0 are inserted at once, as part of the
+caller's transaction. Queued messages are also flushed at interpreter exit.
+"""
+import atexit
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Message
+from .unread import count_new_messages
+
+logger = logging.getLogger(__name__)
+
+# pg_advisory_xact_lock() key that orders message inserts across workers
+INSERT_LOCK = 0x63686174
+
+# Every writer in this process, for the single exit hook below
+_writers = weakref.WeakSet()
+
+
+def insert_messages(messages):
+    """Insert ``messages`` in order and count them unread, in one transaction; returns them saved."""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [INSERT_LOCK])
+        now = timezone.now()
+        for message in messages:
+            message.timestamp = now
+        Message.objects.bulk_create(messages)
+        count_new_messages(messages)
+    return messages
+
+
+class MessageWriter:
+    def __init__(self, max_batch=None, interval_ms=None):
+        """An ``interval_ms`` of 0 inserts every message as soon as it is submitted."""
+        self.max_batch = max_batch or settings.CHAT_MESSAGE_BATCH_SIZE
+        interval_ms = interval_ms if interval_ms is not None else settings.CHAT_MESSAGE_FLUSH_INTERVAL_MS
+        self.interval = interval_ms / 1000
+        self._pending = []  # (message, future) in submission order
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.flushes = 0
+        self.messages = 0
+        self.failures = 0
+        _writers.add(self)
+
+    def add(self, room_id, sender_content_type_id, sender_object_id, text):
+        """Write a message and return it saved."""
+        return self.submit(room_id, sender_content_type_id, sender_object_id, text).result()
+
+    def submit(self, room_id, sender_content_type_id, sender_object_id, text):
+        """Queue a message; the returned future resolves to it once saved."""
+        message = Message(
+            room_id=room_id,
+            sender_content_type_id=sender_content_type_id,
+            sender_object_id=sender_object_id,
+            text=text,
+        )
+        future = Future()
+        if self.interval <= 0 or self._in_transaction():
+            insert_messages([message])
+            self.messages += 1
+            future.set_result(message)
+            return future
+
+        self._ensure_thread()
+        with self._lock:
+            self._pending.append((message, future))
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wake.set()
+        return future
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self):
+        """Insert every queued message with one ``bulk_create``; returns how many."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                insert_messages([message for message, _ in batch])
+            except Exception as e:
+                self.failures += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                raise
+            for message, future in batch:
+                future.set_result(message)
+            self.flushes += 1
+            self.messages += len(batch)
+            return len(batch)
+
+    @staticmethod
+    def _in_transaction():
+        # The caller's rows (and the room) may not be visible to the flush thread's connection.
+        return transaction.get_connection().in_atomic_block
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked child where the thread did not survive.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                if self._pid is not None:
+                    # Messages inherited from the parent are the parent's to write.
+                    self._pending = []
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='chat-message-writer', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Chat message flush failed; its senders were told")
+            finally:
+                close_old_connections()
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("Could not write the queued chat messages at exit")
+
+
+@atexit.register
+def _flush_writers_at_exit():
+    for writer in list(_writers):
+        writer._flush_at_exit()
+
+
+# Shared by the chat views and every ChatConsumer in this process
+message_writer = MessageWriter()
@@ -0,0 +1,121 @@
+# File: apps/chat/presence.py
+"""
+Online presence without database writes.
+
+A connected user is online while their key in the ``CHAT_PRESENCE_CACHE``
+cache is alive; every WebSocket heartbeat extends it by
+``CHAT_PRESENCE_TTL`` seconds. Heartbeats are coalesced: each process
+remembers when it last wrote a user's key and skips the write if that was
+less than ``CHAT_PRESENCE_HEARTBEAT_INTERVAL`` seconds ago, and a key
+another process refreshed just as recently is not written again either. So
+the cache sees at most one write per user per interval, however many tabs
+and workers they have.
+
+A user may have several sockets open (tabs, devices, workers), so ``join``
+and ``leave`` keep a shared per-user connection count next to the key and
+only the last ``leave`` takes the user offline. Heartbeats do not touch the
+count, so it has no expiry; a count left behind by a worker that died
+without ``leave`` only delays going offline until the key expires, and is
+reset by the next ``join`` that finds the user offline.
+
+Typing indicators are not stored at all; they only travel as channel-layer
+events to the room group (see ``ChatConsumer``).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def presence_key(content_type_id, user_id):
+    return f"chat:presence:{content_type_id}:{user_id}"
+
+
+def connections_key(content_type_id, user_id):
+    return f"chat:presence:connections:{content_type_id}:{user_id}"
+
+
+class PresenceTracker:
+    def __init__(self, alias=None, ttl=None, interval=None):
+        self.alias = alias or settings.CHAT_PRESENCE_CACHE
+        self.ttl = ttl or settings.CHAT_PRESENCE_TTL
+        self.interval = interval or settings.CHAT_PRESENCE_HEARTBEAT_INTERVAL
+        self._last_write = {}  # key -> monotonic time of this process's last write
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.skipped = 0
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def heartbeat(self, content_type_id, user_id, force=False):
+        """
+        Mark the user online; returns True when the cache was written. Pass
+        ``force`` on connect so a user who just went offline reappears at once.
+        """
+        key = presence_key(content_type_id, user_id)
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_write.get(key, float('-inf')) < self.interval:
+                self.skipped += 1
+                return False
+            self._last_write[key] = now
+
+        if not force:
+            last_seen = self.cache.get(key)
+            if last_seen is not None and time.time() - last_seen < self.interval:
+                # Another process refreshed this user within the interval.
+                with self._lock:
+                    self.skipped += 1
+                return False
+
+        self.cache.set(key, time.time(), self.ttl)
+        with self._lock:
+            self.writes += 1
+        return True
+
+    def join(self, content_type_id, user_id):
+        """Count a new connection of the user and mark them online at once."""
+        count_key = connections_key(content_type_id, user_id)
+        if self.cache.get(presence_key(content_type_id, user_id)) is None:
+            # Offline: whatever count is left belongs to sockets that died without leave().
+            self.cache.set(count_key, 1, None)
+        else:
+            self.cache.add(count_key, 0, None)
+            try:
+                self.cache.incr(count_key)
+            except ValueError:
+                # Deleted by a leave() between add() and incr()
+                self.cache.set(count_key, 1, None)
+        self.heartbeat(content_type_id, user_id, force=True)
+
+    def leave(self, content_type_id, user_id):
+        """
+        Drop one connection of the user; returns True when it was their last
+        and they went offline.
+        """
+        count_key = connections_key(content_type_id, user_id)
+        try:
+            remaining = self.cache.decr(count_key)
+        except ValueError:
+            remaining = 0  # never joined, or the count expired
+        if remaining > 0:
+            return False
+
+        key = presence_key(content_type_id, user_id)
+        with self._lock:
+            self._last_write.pop(key, None)
+        self.cache.delete_many([key, count_key])
+        return True
+
+    def lookup(self, content_type_id, user_ids):
+        """``{user_id: last_seen epoch seconds or None}`` in one cache round trip."""
+        keys = {presence_key(content_type_id, pk): pk for pk in user_ids}
+        found = self.cache.get_many(list(keys))
+        return {pk: found.get(key) for key, pk in keys.items()}
+
+
+# Shared by every ChatConsumer and the presence endpoint in this process
+presence = PresenceTracker()
@@ -0,0 +1,188 @@
+# File: apps/chat/receipts.py
+"""
+Debounced read receipts.
+
+Fetching a room's messages used to UPDATE the reader's ``ChatParticipant``
+on every request, polling included. ``ReadReceiptBuffer.record()`` only
+remembers the newest ``read_at`` per participant in memory; a background
+thread writes the buffer every ``CHAT_READ_RECEIPT_INTERVAL`` seconds with
+a fixed number of queries per batch (``apply_receipts``).
+
+Each flush also leaves a mark per participant in the shared
+``CHAT_PRESENCE_CACHE`` cache for one interval, and a participant another
+process already wrote within the interval stays queued for the next flush.
+So a participant's row is written at most once per interval across all
+workers, and the newest receipt always lands eventually.
+
+``last_read`` only ever moves forward, and ``unread_count`` is reset to the
+messages newer than it, a range scan of the ``(room, timestamp)`` index that
+is usually empty, so a receipt flushed late never hides messages that
+arrived in between.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+
+from .models import ChatParticipant
+from .unread import expected_unread_count
+
+logger = logging.getLogger(__name__)
+
+# Every buffer in this process, for the single exit hook below
+_buffers = weakref.WeakSet()
+
+
+def receipt_key(room_id, content_type_id, user_id):
+    return f"chat:read:{room_id}:{content_type_id}:{user_id}"
+
+
+def apply_receipts(receipts):
+    """
+    Move ``last_read`` forward for ``{(room_id, content_type_id, user_id): read_at}``
+    and recompute those participants' unread counters; returns how many rows
+    moved. Three queries, however many receipts.
+    """
+    if not receipts:
+        return 0
+    match = Q()
+    for room_id, ct_id, user_id in receipts:
+        match |= Q(room_id=room_id, content_type_id=ct_id, object_id=user_id)
+
+    with transaction.atomic():
+        participants = []
+        for participant in ChatParticipant.objects.filter(match).only(
+            'id', 'room_id', 'content_type_id', 'object_id', 'last_read'
+        ).select_for_update():
+            read_at = receipts[(participant.room_id, participant.content_type_id, participant.object_id)]
+            if participant.last_read is None or participant.last_read < read_at:
+                participant.last_read = read_at
+                participants.append(participant)
+        if participants:
+            ChatParticipant.objects.bulk_update(participants, ['last_read'])
+            # Reset to what arrived after the receipt. A separate UPDATE: within one,
+            # the subquery would still see the old last_read.
+            ChatParticipant.objects.filter(id__in=[p.id for p in participants]).update(
+                unread_count=expected_unread_count()
+            )
+    return len(participants)
+
+
+class ReadReceiptBuffer:
+    def __init__(self, interval=None, alias=None):
+        """An ``interval`` of 0 writes every receipt as soon as it is recorded."""
+        self.interval = interval if interval is not None else settings.CHAT_READ_RECEIPT_INTERVAL
+        self.alias = alias or settings.CHAT_PRESENCE_CACHE
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self.recorded = 0
+        self.written = 0
+        _buffers.add(self)
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def record(self, room_id, content_type_id, user_id, read_at):
+        key = (room_id, content_type_id, user_id)
+        if self.interval > 0:
+            self._ensure_thread()
+        with self._lock:
+            if key not in self._pending or self._pending[key] < read_at:
+                self._pending[key] = read_at
+            self.recorded += 1
+        if self.interval <= 0:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def clear(self):
+        """Drop every queued receipt without writing it."""
+        with self._lock:
+            self._pending = {}
+
+    def flush(self, force=False):
+        """
+        Write every receipt that is due (all of them with ``force``); returns
+        the number of rows updated.
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            due, deferred = batch, {}
+            if self.interval > 0 and not force:
+                recent = self.cache.get_many([receipt_key(*key) for key in batch])
+                due = {key: read_at for key, read_at in batch.items() if receipt_key(*key) not in recent}
+                deferred = {key: read_at for key, read_at in batch.items() if key not in due}
+
+            try:
+                written = apply_receipts(due)
+            except Exception:
+                self._requeue(batch)
+                raise
+            if deferred:
+                self._requeue(deferred)
+            if due and self.interval > 0:
+                self.cache.set_many({receipt_key(*key): 1 for key in due}, self.interval)
+            self.written += written
+            return written
+
+    def _requeue(self, receipts):
+        with self._lock:
+            for key, read_at in receipts.items():
+                if key not in self._pending or self._pending[key] < read_at:
+                    self._pending[key] = read_at
+
+    def _ensure_thread(self):
+        # Started lazily, and again in a forked child where the thread did not survive.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                if self._pid is not None:
+                    self._pending = {}
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name='chat-read-receipts', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Read receipt flush failed; retrying on the next interval")
+            finally:
+                close_old_connections()
+
+    def _flush_at_exit(self):
+        try:
+            self.flush(force=True)
+        except Exception:
+            logger.exception(f"Could not flush {self.pending()} read receipts at exit")
+
+
+@atexit.register
+def _flush_buffers_at_exit():
+    for buffer in list(_buffers):
+        buffer._flush_at_exit()
+
+
+# Shared by the chat views in this process
+read_receipts = ReadReceiptBuffer()
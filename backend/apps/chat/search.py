@@ -0,0 +1,77 @@
+# File: apps/chat/search.py
+"""
+Full-text search over the messages of the rooms a user participates in.
+
+The index lives outside the ``Message`` model (migration 0004):
+
+* PostgreSQL: ``chat_message.search_vector``, a ``tsvector`` column
+  generated from ``text`` by the database and indexed with GIN, so a
+  message is searchable as soon as its insert commits, whatever wrote it.
+* SQLite: the ``chat_message_fts`` FTS5 table, kept in sync by triggers.
+  It is meant for local databases only; Django rebuilds SQLite tables on
+  some ``AlterField`` migrations and the triggers go with them, so rerun
+  ``INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')``
+  after such a migration.
+
+Other backends fall back to an unranked ``icontains`` scan.
+
+Only the hot ``Message`` table is indexed: messages moved to
+``ArchivedMessage`` after ``CHAT_HOT_RETENTION_DAYS`` (archive.py) are no
+longer found.
+"""
+import re
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import ChatParticipant, Message
+
+SEARCH_CONFIG = 'english'  # must match the generated column in migration 0004
+TABLE = Message._meta.db_table
+
+
+def fts5_query(query):
+    """Every word of ``query`` as a quoted FTS5 term, so user input is never parsed as syntax."""
+    return ' '.join(f'"{word}"' for word in re.findall(r'\w+', query))
+
+
+def search_messages(user, query, room_id=None):
+    """
+    Messages matching ``query`` in ``user``'s rooms, annotated with ``rank``
+    (higher is better) and unordered; callers order by ``-rank, -id``.
+    """
+    ct = ContentType.objects.get_for_model(user)
+    rooms = ChatParticipant.objects.filter(content_type=ct, object_id=user.id).values('room_id')
+    messages = Message.objects.filter(room_id__in=rooms)
+    if room_id is not None:
+        messages = messages.filter(room_id=room_id)
+
+    vendor = connections[messages.db].vendor
+    if vendor == 'postgresql':
+        tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        return messages.filter(
+            RawSQL(f"{TABLE}.search_vector @@ {tsquery}", [query], output_field=BooleanField())
+        ).annotate(
+            # ts_rank() is a real; as a double it compares exactly with the float cursor
+            rank=RawSQL(f"ts_rank({TABLE}.search_vector, {tsquery})::float8", [query], output_field=FloatField())
+        )
+
+    if vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return messages.none()
+        fts = f"{TABLE}_fts"
+        return messages.filter(
+            id__in=RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", [match])
+        ).annotate(
+            # bm25() is lower for better matches
+            rank=RawSQL(
+                f"SELECT -bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND {fts}.rowid = {TABLE}.id",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    return messages.filter(text__icontains=query).annotate(rank=Value(0.0, output_field=FloatField()))
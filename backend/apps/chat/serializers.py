@@ -3,8 +3,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
-from django.utils import timezone
 
+from .inbox import attach_inbox
 from .models import ChatRoom, ChatParticipant, Message
 
 User = get_user_model()
@@ -25,6 +25,20 @@ class MessageSerializer(serializers.ModelSerializer):
         read_only_fields = ["timestamp", "sender", "room"]
 
 
+class MessageSearchResultSerializer(MessageSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ["rank"]
+
+
+class ChatRoomListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Resolve participants and last messages for the whole page at once.
+        rooms = attach_inbox(data.all() if hasattr(data, 'all') else data)
+        return super().to_representation(rooms)
+
+
 class ChatRoomSerializer(serializers.ModelSerializer):
     participants   = serializers.SerializerMethodField()
     last_message   = serializers.SerializerMethodField()
@@ -32,6 +46,7 @@ class ChatRoomSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ChatRoom
+        list_serializer_class = ChatRoomListSerializer
         fields = [
             "id",
             "name",
@@ -43,43 +58,27 @@ class ChatRoomSerializer(serializers.ModelSerializer):
         read_only_fields = ["created_at", "name"]
 
     def get_participants(self, room):
-        parts = ChatParticipant.objects.filter(room=room)
-        users = []
-        for part in parts:
-            try:
-                user = User.objects.get(pk=part.object_id)
-            except User.DoesNotExist:
-                continue
-            users.append(UserSerializer(user).data)
-        return users
+        if not hasattr(room, "inbox_participants"):
+            attach_inbox([room])
+        return [UserSerializer(user).data for user in room.inbox_participants]
 
     def get_last_message(self, room):
-        msg = (
-            Message.objects.filter(room=room)
-                           .order_by("-timestamp")
-                           .first()
-        )
+        if not hasattr(room, "inbox_last_message"):
+            attach_inbox([room])
+        msg = room.inbox_last_message
         return MessageSerializer(msg).data if msg else None
 
     def get_unread_count(self, room):
+        # Annotated by inbox_rooms(); read from the participant for a room loaded on its own.
+        if hasattr(room, "unread_count"):
+            return room.unread_count
+
         request = self.context.get("request", None)
         if not (request and request.user.is_authenticated):
             return 0
 
         user = request.user
         ct = ContentType.objects.get_for_model(user)
-        try:
-            part = ChatParticipant.objects.get(
-                room=room, content_type=ct, object_id=user.id
-            )
-            last_read = part.last_read or timezone.make_aware(timezone.datetime.min)
-        except ChatParticipant.DoesNotExist:
-            last_read = timezone.make_aware(timezone.datetime.min)
-
-        # count only messages newer than last_read AND NOT sent by this user
-        return Message.objects.filter(
-            room=room,
-            timestamp__gt=last_read
-        ).exclude(
-            sender_object_id=user.id
-        ).count()
+        return ChatParticipant.objects.filter(
+            room=room, content_type=ct, object_id=user.id
+        ).values_list("unread_count", flat=True).first() or 0
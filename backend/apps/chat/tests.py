@@ -0,0 +1,628 @@
+from datetime import timedelta
+from unittest import mock
+
+from channels.layers import channel_layers
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.staff_members.models import StaffMember
+from apps.student.models import Student
+
+from . import persistence
+from .archive import archive_messages
+from .inbox import attach_inbox, inbox_rooms
+from .models import ArchivedMessage, ChatParticipant, ChatRoom, Message
+from .persistence import MessageWriter, message_writer
+from .presence import PresenceTracker, presence, presence_key
+from .receipts import ReadReceiptBuffer, apply_receipts, read_receipts
+from .routing import websocket_urlpatterns
+from .unread import count_new_messages, reconcile_unread_counts
+
+# Consumers broadcast through this layer instead of Redis in tests.
+IN_MEMORY_CHANNEL_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+# Presence is kept in process memory instead of Redis in tests.
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'presence': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'presence'},
+}
+
+application = URLRouter(websocket_urlpatterns)
+
+
+def make_room(name, *users):
+    room = ChatRoom.objects.create(name=name)
+    ChatParticipant.objects.bulk_create([
+        ChatParticipant(room=room, content_type=ContentType.objects.get_for_model(user), object_id=user.id)
+        for user in users
+    ])
+    return room
+
+
+def isolate_read_receipts(testcase):
+    """
+    Swap the views' shared receipt buffer for one without a flush thread,
+    emptied after the test so nothing is left for the exit hook.
+    """
+    buffer = ReadReceiptBuffer(interval=60)
+    for patcher in (mock.patch.object(buffer, '_ensure_thread'),
+                    mock.patch('apps.chat.views.read_receipts', buffer)):
+        patcher.start()
+        testcase.addCleanup(patcher.stop)
+    testcase.addCleanup(buffer.clear)
+    return buffer
+
+
+@override_settings(CHANNEL_LAYERS=IN_MEMORY_CHANNEL_LAYERS, CACHES=LOCMEM_CACHES)
+class ChatConsumerTestCase(TransactionTestCase):
+    def setUp(self):
+        channel_layers.backends.clear()
+        self.alice = StaffMember.objects.create_user(email="alice@example.com", username="alice", password="pw")
+        self.bob = StaffMember.objects.create_user(email="bob@example.com", username="bob", password="pw")
+        self.eve = StaffMember.objects.create_user(email="eve@example.com", username="eve", password="pw")
+        self.room = make_room("chat_alice_bob", self.alice, self.bob)
+
+    def communicator(self, user):
+        communicator = WebsocketCommunicator(application, f"/ws/chat/{self.room.name}/")
+        communicator.scope['user'] = user
+        return communicator
+
+    async def test_message_is_saved_and_broadcast_to_the_room(self):
+        """Both participants receive the saved message"""
+        alice, bob = self.communicator(self.alice), self.communicator(self.bob)
+        self.assertTrue((await alice.connect())[0])
+        self.assertTrue((await bob.connect())[0])
+        online = await alice.receive_json_from()
+        self.assertEqual((online['type'], online['user']['id'], online['online']), ('presence', self.bob.id, True))
+
+        await alice.send_json_to({'text': 'hello bob'})
+        for communicator in (alice, bob):
+            message = await communicator.receive_json_from()
+            self.assertEqual(message['text'], 'hello bob')
+            self.assertEqual(message['sender']['id'], self.alice.id)
+            self.assertEqual(message['room'], self.room.id)
+
+        saved = await Message.objects.aget(pk=message['id'])
+        self.assertEqual(saved.sender_object_id, self.alice.id)
+        bob_participant = await ChatParticipant.objects.aget(room=self.room, object_id=self.bob.id)
+        self.assertEqual(bob_participant.unread_count, 1)
+        await alice.disconnect()
+        await bob.disconnect()
+
+    async def test_typing_is_coalesced_and_not_echoed(self):
+        """Repeated typing events reach the others once; the typist hears nothing back"""
+        alice, bob = self.communicator(self.alice), self.communicator(self.bob)
+        await bob.connect()
+        await alice.connect()
+        await bob.receive_json_from()  # alice is online
+
+        for _ in range(5):
+            await alice.send_json_to({'type': 'typing', 'typing': True})
+        await alice.send_json_to({'type': 'typing', 'typing': False})
+        self.assertEqual((await bob.receive_json_from())['typing'], True)
+        self.assertEqual((await bob.receive_json_from())['typing'], False)
+        self.assertTrue(await bob.receive_nothing())
+        self.assertTrue(await alice.receive_nothing())
+        await alice.disconnect()
+        offline = await bob.receive_json_from()
+        self.assertEqual((offline['type'], offline['user']['id'], offline['online']), ('presence', self.alice.id, False))
+        await bob.disconnect()
+
+    async def test_non_participant_is_rejected(self):
+        """Users outside the room cannot join its group"""
+        connected, code = await self.communicator(self.eve).connect()
+        self.assertFalse(connected)
+        self.assertEqual(code, 4403)
+
+
+class InboxTestCase(TestCase):
+    def setUp(self):
+        self.me = StaffMember.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.me_ct = ContentType.objects.get_for_model(self.me)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.rooms = 0
+
+    def add_rooms(self, count):
+        for _ in range(count):
+            self.rooms += 1
+            other = StaffMember.objects.create_user(
+                email=f"other{self.rooms}@example.com", username=f"other{self.rooms}", password="pw"
+            )
+            room = make_room(f"room_{self.rooms}", self.me, other)
+            count_new_messages([
+                Message.objects.create(room=room, sender_content_type=self.me_ct, sender_object_id=other.id, text="hi"),
+                Message.objects.create(room=room, sender_content_type=self.me_ct, sender_object_id=other.id, text="last"),
+            ])
+
+    def fetch_inbox(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('chat:my_chat_rooms'))
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], len(queries)
+
+    def test_query_count_does_not_grow_with_rooms(self):
+        """The inbox costs the same number of queries for 2 rooms as for 8"""
+        self.add_rooms(2)
+        self.fetch_inbox()  # fills the ContentType cache
+        rooms, few = self.fetch_inbox()
+        self.assertEqual(len(rooms), 2)
+
+        self.add_rooms(6)
+        rooms, many = self.fetch_inbox()
+        self.assertEqual(len(rooms), 8)
+        self.assertEqual(few, many)
+
+    def test_inbox_contents(self):
+        """Participants, last message and unread count are filled in"""
+        self.add_rooms(1)
+        room = self.fetch_inbox()[0][0]
+        self.assertEqual({p['username'] for p in room['participants']}, {"me", "other1"})
+        self.assertEqual(room['last_message']['text'], "last")
+        self.assertEqual(room['last_message']['sender']['username'], "other1")
+        self.assertEqual(room['unread_count'], 2)
+
+
+class MessagePaginationTestCase(TestCase):
+    def setUp(self):
+        self.me = StaffMember.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.other = StaffMember.objects.create_user(email="other@example.com", username="other", password="pw")
+        self.room = make_room("chat_me_other", self.me, self.other)
+        ct = ContentType.objects.get_for_model(self.me)
+        self.messages = Message.objects.bulk_create([
+            Message(room=self.room, sender_content_type=ct,
+                    sender_object_id=(self.me if i % 2 else self.other).id, text=f"message {i}")
+            for i in range(25)
+        ])
+        isolate_read_receipts(self)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.url = reverse('chat:chat_room_messages', args=[self.room.id])
+
+    def fetch(self, **params):
+        response = self.client.get(self.url, dict(page_size=10, **params))
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_walk_backwards_and_forwards(self):
+        """before/after cursors return adjacent pages, oldest first"""
+        latest = self.fetch()
+        self.assertEqual([m['text'] for m in latest['results']], [f"message {i}" for i in range(15, 25)])
+        self.assertIsNone(latest['next'])
+
+        older = self.fetch(before=latest['results'][0]['id'])
+        self.assertEqual([m['text'] for m in older['results']], [f"message {i}" for i in range(5, 15)])
+
+        oldest = self.fetch(before=older['results'][0]['id'])
+        self.assertEqual(len(oldest['results']), 5)
+        self.assertIsNone(oldest['previous'])
+
+        newer = self.fetch(after=oldest['results'][-1]['id'])
+        self.assertEqual(newer['results'], older['results'])
+        self.assertEqual(newer['results'][0]['sender']['username'], "me")  # message 5
+
+    def test_page_cost_does_not_depend_on_depth(self):
+        """A deep page costs the same queries as the latest one"""
+        self.fetch()  # fills the ContentType cache
+        with CaptureQueriesContext(connection) as latest:
+            self.fetch()
+        with CaptureQueriesContext(connection) as deep:
+            self.fetch(before=self.messages[12].id)
+        # the cursor costs one primary-key lookup
+        self.assertEqual(len(deep), len(latest) + 1)
+
+
+class ArchiveTestCase(TestCase):
+    def setUp(self):
+        self.me = StaffMember.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.other = StaffMember.objects.create_user(email="other@example.com", username="other", password="pw")
+        self.room = make_room("chat_me_other", self.me, self.other)
+        ct = ContentType.objects.get_for_model(self.me)
+        now = timezone.now()
+        # 12 messages from last year, 13 from the last hour
+        ages = [timedelta(days=400 - i) for i in range(12)] + [timedelta(minutes=60 - i) for i in range(13)]
+        self.messages = Message.objects.bulk_create([
+            Message(room=self.room, sender_content_type=ct, sender_object_id=self.other.id,
+                    text=f"message {i}", timestamp=now - age)
+            for i, age in enumerate(ages)
+        ])
+        isolate_read_receipts(self)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.url = reverse('chat:chat_room_messages', args=[self.room.id])
+
+    def fetch(self, **params):
+        response = self.client.get(self.url, dict(page_size=10, **params))
+        self.assertEqual(response.status_code, 200)
+        return [m['text'] for m in response.json()['results']]
+
+    def test_moves_only_messages_past_the_window(self):
+        """Old messages leave the hot table with their ids"""
+        self.assertEqual(archive_messages(timedelta(days=30), batch_size=5), 12)
+        self.assertEqual(Message.objects.count(), 13)
+        self.assertEqual(
+            sorted(ArchivedMessage.objects.values_list('id', flat=True)),
+            [m.id for m in self.messages[:12]],
+        )
+        self.assertEqual(archive_messages(timedelta(days=30)), 0)
+
+    def test_already_archived_ids_are_kept(self):
+        """A message whose id is already archived stays in the hot table and is logged"""
+        taken = self.messages[3]
+        ArchivedMessage.objects.create(
+            id=taken.id, room=self.room, sender_content_type=taken.sender_content_type,
+            sender_object_id=taken.sender_object_id, text="restored", timestamp=taken.timestamp,
+        )
+        with self.assertLogs('apps.chat.archive', 'WARNING'):
+            self.assertEqual(archive_messages(timedelta(days=30), batch_size=5), 11)
+        self.assertTrue(Message.objects.filter(id=taken.id).exists())
+        self.assertEqual(ArchivedMessage.objects.get(id=taken.id).text, "restored")
+        self.assertEqual(ArchivedMessage.objects.count(), 12)
+
+    def test_pages_run_into_the_archive(self):
+        """Paging past the hot window reads archived messages, in order"""
+        archive_messages(timedelta(days=30))
+        self.assertEqual(self.fetch(), [f"message {i}" for i in range(15, 25)])
+        older = self.fetch(before=self.messages[15].id)
+        self.assertEqual(older, [f"message {i}" for i in range(5, 15)])
+        self.assertEqual(self.fetch(before=self.messages[5].id), [f"message {i}" for i in range(5)])
+        self.assertEqual(self.fetch(after=self.messages[4].id), older)
+
+    def test_latest_page_skips_the_archive(self):
+        """A page the hot table can fill never queries the archive"""
+        archive_messages(timedelta(days=30))
+        self.fetch()  # fills the ContentType cache
+        with CaptureQueriesContext(connection) as queries:
+            self.fetch()
+        self.assertFalse(any(ArchivedMessage._meta.db_table in q['sql'] for q in queries.captured_queries))
+
+    def test_dormant_room_keeps_its_preview(self):
+        """A room with only archived messages still shows its last one"""
+        archive_messages(timedelta(minutes=0))
+        room = attach_inbox(inbox_rooms(self.me))[0]
+        self.assertEqual(room.inbox_last_message.text, "message 24")
+
+
+class MessageSearchTestCase(TestCase):
+    def setUp(self):
+        self.me = StaffMember.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.other = StaffMember.objects.create_user(email="other@example.com", username="other", password="pw")
+        self.room = make_room("chat_me_other", self.me, self.other)
+        self.private = make_room("chat_other_only", self.other)
+        ct = ContentType.objects.get_for_model(self.me)
+        texts = ["deploy the release", "deploy deploy deploy now", "lunch?", "release notes for the deploy"]
+        Message.objects.bulk_create([
+            Message(room=self.room, sender_content_type=ct, sender_object_id=self.me.id, text=text)
+            for text in texts
+        ] + [Message(room=self.private, sender_content_type=ct, sender_object_id=self.other.id, text="deploy secrets")])
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.url = reverse('chat:search_messages')
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_only_participant_rooms_ranked(self):
+        """Matches come from the caller's rooms only, best match first"""
+        results = self.search(q="deploy")['results']
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['text'], "deploy deploy deploy now")
+        self.assertNotIn("deploy secrets", [m['text'] for m in results])
+        self.assertEqual(results[0]['sender']['username'], "me")
+        self.assertEqual([m['rank'] for m in results], sorted((m['rank'] for m in results), reverse=True))
+
+    def test_cursor_walks_every_match_once(self):
+        """Following next visits each match exactly once, ties included, in ranked order"""
+        ct = ContentType.objects.get_for_model(self.me)
+        Message.objects.bulk_create([
+            Message(room=self.room, sender_content_type=ct, sender_object_id=self.me.id, text="deploy the release")
+            for _ in range(2)
+        ])
+        page = self.search(q="deploy", page_size=1)
+        seen = [m['id'] for m in page['results']]
+        while page['next']:
+            response = self.client.get(page['next'])
+            self.assertEqual(response.status_code, 200)
+            page = response.json()
+            seen += [m['id'] for m in page['results']]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        self.assertEqual(seen, [m['id'] for m in self.search(q="deploy", page_size=100)['results']])
+
+    def test_new_messages_are_indexed(self):
+        """The index follows inserts and edits without application code"""
+        message = Message.objects.get(text="lunch?")
+        self.assertEqual(self.search(q="pizza")['results'], [])
+        message.text = "pizza for lunch"
+        message.save()
+        self.assertEqual([m['id'] for m in self.search(q="pizza")['results']], [message.id])
+
+    def test_bad_cursor(self):
+        """A tampered cursor is a 400, not a 500"""
+        response = self.client.get(self.url, {'q': "deploy", 'cursor': "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+
+class DirectoryTestCase(TestCase):
+    def setUp(self):
+        self.me = StaffMember.objects.create_user(email="mona@example.com", username="mona", password="pw")
+        self.colleague = StaffMember.objects.create_user(email="morad@example.com", username="morad", password="pw")
+        self.students = [
+            Student.objects.create(email=f"mostafa{i}@example.com", first_name="Mostafa", last_name=f"S{i}")
+            for i in range(3)
+        ]
+        Student.objects.create(email="gone@example.com", first_name="Mo", last_name="Gone", is_active=False)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.url = reverse('chat:search_users')
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [(entry['type'], entry['id']) for entry in response.json()['results']]
+
+    def test_searches_staff_and_students(self):
+        """Both user models are searched; the caller and inactive users are left out"""
+        found = self.search(q="mo")
+        self.assertEqual(sorted(found), sorted(
+            [('staff', self.colleague.id)] + [('student', s.id) for s in self.students]
+        ))
+
+    def test_limit_caps_the_merged_results(self):
+        """Every model is asked for at most limit rows and the merge keeps limit"""
+        with CaptureQueriesContext(connection) as queries:
+            found = self.search(q="mo", limit=2)
+        self.assertEqual(len(found), 2)
+        self.assertTrue(all('LIMIT 2' in q['sql'] for q in queries.captured_queries if 'LIKE' in q['sql']))
+
+    def test_result_starts_a_chat(self):
+        """A tagged result can be posted as is to create the room"""
+        kind, pk = self.search(q="mostafa0")[0]
+        response = self.client.post(reverse('chat:chat_rooms'), {'other_user_type': kind, 'other_user_id': pk})
+        self.assertEqual(response.status_code, 201)
+        room = ChatRoom.objects.get(pk=response.json()['id'])
+        student_ct = ContentType.objects.get_for_model(Student)
+        self.assertTrue(room.participants.filter(content_type=student_ct, object_id=pk).exists())
+
+
+class UnreadCounterTestCase(TestCase):
+    def setUp(self):
+        # Messages and receipts are written at once, in the request's own transaction.
+        for patcher in (mock.patch.object(message_writer, 'interval', 0),
+                        mock.patch.object(read_receipts, 'interval', 0)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.me = StaffMember.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.other = StaffMember.objects.create_user(email="other@example.com", username="other", password="pw")
+        self.room = make_room("chat_me_other", self.me, self.other)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.url = reverse('chat:chat_room_messages', args=[self.room.id])
+
+    def counter(self, user):
+        return ChatParticipant.objects.get(room=self.room, object_id=user.id).unread_count
+
+    def test_sending_increments_others_and_reading_resets(self):
+        """Only the other participants' counters move; reading the room clears mine"""
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        for text in ("one", "two"):
+            self.assertEqual(other_client.post(self.url, {'text': text}).status_code, 201)
+        self.assertEqual(self.counter(self.me), 2)
+        self.assertEqual(self.counter(self.other), 0)
+
+        self.client.get(self.url)
+        self.assertEqual(self.counter(self.me), 0)
+
+    def test_reconciliation_repairs_drift(self):
+        """Counters are recomputed from Message"""
+        ct = ContentType.objects.get_for_model(self.other)
+        Message.objects.create(room=self.room, sender_content_type=ct, sender_object_id=self.other.id, text="lost")
+        ChatParticipant.objects.filter(room=self.room).update(unread_count=7)
+
+        self.assertEqual(reconcile_unread_counts(), 2)
+        self.assertEqual(self.counter(self.me), 1)
+        self.assertEqual(self.counter(self.other), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ReadReceiptTestCase(TestCase):
+    def setUp(self):
+        self.me = StaffMember.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.other = StaffMember.objects.create_user(email="other@example.com", username="other", password="pw")
+        self.room = make_room("chat_me_other", self.me, self.other)
+        ct = ContentType.objects.get_for_model(self.me)
+        now = timezone.now()
+        self.messages = Message.objects.bulk_create([
+            Message(room=self.room, sender_content_type=ct, sender_object_id=self.other.id,
+                    text=f"message {i}", timestamp=now - timedelta(minutes=3 - i))
+            for i in range(3)
+        ])
+        ChatParticipant.objects.filter(room=self.room, object_id=self.me.id).update(unread_count=3)
+        # receipts written by earlier tests would defer this test's flushes
+        caches['presence'].clear()
+        # no background thread: the test flushes by hand
+        self.buffer = isolate_read_receipts(self)
+        self.client = APIClient()
+        self.client.force_authenticate(self.me)
+        self.url = reverse('chat:chat_room_messages', args=[self.room.id])
+        self.read_url = reverse('chat:chat_room_read', args=[self.room.id])
+
+    def participant(self):
+        return ChatParticipant.objects.get(room=self.room, object_id=self.me.id)
+
+    def test_polling_is_buffered(self):
+        """Repeated fetches write nothing until the buffer flushes, then once"""
+        for _ in range(5):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertIsNone(self.participant().last_read)
+        self.assertEqual(self.buffer.pending(), 1)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(self.participant().unread_count, 0)
+
+    def test_one_write_per_interval_across_workers(self):
+        """A receipt another worker wrote within the interval waits for the next flush"""
+        ct_id = ContentType.objects.get_for_model(self.me).id
+        other_worker = ReadReceiptBuffer(interval=60)
+        self.addCleanup(other_worker.clear)
+        with mock.patch.object(other_worker, '_ensure_thread'):
+            self.buffer.record(self.room.id, ct_id, self.me.id, timezone.now())
+            self.buffer.flush()
+            other_worker.record(self.room.id, ct_id, self.me.id, timezone.now())
+            self.assertEqual(other_worker.flush(), 0)
+            self.assertEqual(other_worker.pending(), 1)
+
+    def test_mark_read_up_to_message(self):
+        """An explicit receipt is exact, immediate and never moves back"""
+        self.client.get(self.url, {'mark_read': 'false'})
+        self.assertEqual(self.buffer.pending(), 0)
+
+        response = self.client.post(self.read_url, {'message_id': self.messages[1].id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['unread_count'], 1)
+        self.assertEqual(self.participant().last_read, self.messages[1].timestamp)
+
+        response = self.client.post(self.read_url, {'message_id': self.messages[0].id})
+        self.assertEqual(response.json()['unread_count'], 1)
+        self.assertEqual(self.client.post(self.read_url, {'message_id': 999999}).status_code, 404)
+
+
+class MessageWriterTestCase(TestCase):
+    def setUp(self):
+        self.me = StaffMember.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.other = StaffMember.objects.create_user(email="other@example.com", username="other", password="pw")
+        self.room = make_room("chat_me_other", self.me, self.other)
+        self.ct = ContentType.objects.get_for_model(self.me)
+        # Neither threshold is reached during a test; every flush below is explicit.
+        self.writer = MessageWriter(max_batch=1000, interval_ms=60000)
+        for patcher in (mock.patch.object(self.writer, '_ensure_thread'),
+                        mock.patch.object(self.writer, '_in_transaction', return_value=False)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def submit(self, count):
+        return [self.writer.submit(self.room.id, self.ct.id, self.me.id, f"message {i}") for i in range(count)]
+
+    def counter(self, user):
+        return ChatParticipant.objects.get(room=self.room, object_id=user.id).unread_count
+
+    def test_queued_messages_are_saved_by_one_insert(self):
+        """A flush inserts the batch in order with one INSERT and counts it unread"""
+        futures = self.submit(10)
+        self.assertFalse(any(future.done() for future in futures))
+        self.assertFalse(Message.objects.filter(room=self.room).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.writer.flush(), 10)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT')]), 1)
+
+        saved = [future.result() for future in futures]
+        self.assertEqual([m.text for m in saved], [f"message {i}" for i in range(10)])
+        self.assertEqual([m.id for m in saved], sorted(m.id for m in saved))
+        self.assertEqual(
+            list(Message.objects.filter(room=self.room).order_by('id').values_list('id', flat=True)),
+            [m.id for m in saved],
+        )
+        self.assertEqual(self.counter(self.other), 10)
+        self.assertEqual(self.counter(self.me), 0)
+
+    def test_failed_flush_fails_every_sender(self):
+        """Nothing of a failed batch is saved and each sender gets the error"""
+        futures = self.submit(3)
+        with mock.patch('apps.chat.persistence.count_new_messages', side_effect=OperationalError("down")):
+            with self.assertRaises(OperationalError):
+                self.writer.flush()
+        for future in futures:
+            self.assertIsInstance(future.exception(), OperationalError)
+        self.assertFalse(Message.objects.filter(room=self.room).exists())
+        self.assertEqual(self.counter(self.other), 0)
+        self.assertEqual(self.writer.pending(), 0)
+
+    def test_messages_inside_a_transaction_are_inserted_at_once(self):
+        """A caller in an atomic block gets its row without waiting for a flush"""
+        self.writer._in_transaction.return_value = True
+        message = self.writer.add(self.room.id, self.ct.id, self.me.id, "hello")
+        self.assertTrue(Message.objects.filter(id=message.id).exists())
+        self.assertEqual(self.writer.pending(), 0)
+        self.assertEqual(self.counter(self.other), 1)
+
+    def test_pending_messages_are_flushed_at_exit(self):
+        """One exit hook per process flushes every writer"""
+        futures = self.submit(5)
+        persistence._flush_writers_at_exit()
+        self.assertEqual(self.writer.pending(), 0)
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(self.counter(self.other), 5)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PresenceTestCase(TestCase):
+    def setUp(self):
+        caches['presence'].clear()
+        self.me = StaffMember.objects.create_user(email="me@example.com", username="me", password="pw")
+        self.ct = ContentType.objects.get_for_model(self.me)
+
+    def test_heartbeats_are_coalesced_per_interval(self):
+        """Only the first heartbeat in an interval writes, across processes too"""
+        worker_a = PresenceTracker(ttl=60, interval=20)
+        worker_b = PresenceTracker(ttl=60, interval=20)  # another process, same cache
+        self.assertTrue(worker_a.heartbeat(self.ct.id, self.me.id))
+        self.assertFalse(worker_a.heartbeat(self.ct.id, self.me.id))
+        self.assertFalse(worker_b.heartbeat(self.ct.id, self.me.id))
+        self.assertEqual(worker_a.writes + worker_b.writes, 1)
+
+        worker_a.leave(self.ct.id, self.me.id)
+        self.assertEqual(worker_b.lookup(self.ct.id, [self.me.id]), {self.me.id: None})
+
+    def test_online_until_the_last_connection_leaves(self):
+        """Closing one of two sockets, even in another process, keeps the user online"""
+        worker_a = PresenceTracker(ttl=60, interval=20)
+        worker_b = PresenceTracker(ttl=60, interval=20)
+        worker_a.join(self.ct.id, self.me.id)
+        worker_b.join(self.ct.id, self.me.id)
+
+        self.assertFalse(worker_a.leave(self.ct.id, self.me.id))
+        self.assertIsNotNone(worker_a.lookup(self.ct.id, [self.me.id])[self.me.id])
+        self.assertTrue(worker_b.leave(self.ct.id, self.me.id))
+        self.assertEqual(worker_a.lookup(self.ct.id, [self.me.id]), {self.me.id: None})
+
+    def test_heartbeat_is_one_write(self):
+        """A heartbeat sets the presence key and nothing else"""
+        tracker = PresenceTracker(ttl=60, interval=20)
+        tracker.join(self.ct.id, self.me.id)
+        with mock.patch.object(tracker.cache, 'touch') as touch, \
+                mock.patch.object(tracker.cache, 'set', wraps=tracker.cache.set) as set_:
+            self.assertTrue(tracker.heartbeat(self.ct.id, self.me.id, force=True))
+        self.assertEqual(set_.call_count, 1)
+        touch.assert_not_called()
+
+    def test_count_of_a_dead_worker_is_reset(self):
+        """Connections that never left stop counting once the user has gone offline"""
+        dead_worker = PresenceTracker(ttl=60, interval=20)
+        dead_worker.join(self.ct.id, self.me.id)
+        caches['presence'].delete(presence_key(self.ct.id, self.me.id))  # the key expired
+
+        worker = PresenceTracker(ttl=60, interval=20)
+        worker.join(self.ct.id, self.me.id)
+        self.assertTrue(worker.leave(self.ct.id, self.me.id))
+
+    def test_presence_endpoint(self):
+        """Presence for several users comes back in one request"""
+        presence.heartbeat(self.ct.id, self.me.id, force=True)
+        client = APIClient()
+        client.force_authenticate(self.me)
+        response = client.get(reverse('chat:presence'), {'ids': f"{self.me.id},999999"})
+        self.assertEqual(response.status_code, 200)
+        online = {row['id']: row['online'] for row in response.json()['presence']}
+        self.assertEqual(online, {self.me.id: True, 999999: False})
+        self.assertEqual(client.get(reverse('chat:presence'), {'ids': 'x'}).status_code, 400)
@@ -0,0 +1,69 @@
+# File: apps/chat/unread.py
+"""
+Denormalised unread counters.
+
+``ChatParticipant.unread_count`` is incremented with an F() expression for
+every participant but the sender when messages are written
+(``count_new_messages``, in the insert's transaction, see persistence.py)
+and reset when a participant's read receipt is written (receipts.py), so
+the inbox reads a column instead of counting messages.
+``reconcile_unread_counts`` (``manage.py reconcile_unread_counts``)
+recomputes the counters from ``Message`` and ``ArchivedMessage`` to repair
+any drift; nothing on the write path counts messages.
+"""
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import ArchivedMessage, ChatParticipant, Message
+
+NEVER_READ = datetime.min.replace(tzinfo=dt_timezone.utc)
+
+
+def count_new_messages(messages):
+    """
+    Increment the unread counters for saved ``messages``: one UPDATE per
+    (room, sender) pair in the batch. Call inside the insert's transaction.
+    """
+    per_sender = Counter(
+        (message.room_id, message.sender_content_type_id, message.sender_object_id) for message in messages
+    )
+    for (room_id, ct_id, object_id), count in per_sender.items():
+        ChatParticipant.objects.filter(room_id=room_id).exclude(
+            content_type_id=ct_id, object_id=object_id
+        ).update(unread_count=F('unread_count') + count)
+
+
+def expected_unread_count():
+    """Per-participant message count the counter should equal, for annotate()/update()."""
+    def unread(model):
+        counted = (
+            model.objects.filter(
+                room=OuterRef('room'),
+                timestamp__gt=Coalesce(OuterRef('last_read'), Value(NEVER_READ)),
+            )
+            .exclude(sender_content_type=OuterRef('content_type'), sender_object_id=OuterRef('object_id'))
+            .values('room')
+            .annotate(count=Count('*'))
+            .values('count')
+        )
+        return Coalesce(Subquery(counted), 0)
+    # archived messages someone never read still count (see archive.py)
+    return unread(Message) + unread(ArchivedMessage)
+
+
+def reconcile_unread_counts(room_ids=None):
+    """Recompute drifted counters from the messages; returns how many were fixed."""
+    participants = ChatParticipant.objects.all()
+    if room_ids is not None:
+        participants = participants.filter(room_id__in=room_ids)
+    drifted = list(
+        participants.annotate(expected=expected_unread_count())
+        .filter(~Q(unread_count=F('expected')))
+        .values_list('id', flat=True)
+    )
+    if drifted:
+        ChatParticipant.objects.filter(id__in=drifted).update(unread_count=expected_unread_count())
+    return len(drifted)
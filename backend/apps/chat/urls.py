@@ -2,7 +2,7 @@
 from django.urls import path
 from .views import (
     ChatRoomListCreateView, MyChatRoomsView,
-    MessageListCreateView, SearchUsersView
+    MessageListCreateView, MarkReadView, MessageSearchView, SearchUsersView, PresenceView
 )
 
 app_name = 'chat'
@@ -10,5 +10,8 @@ urlpatterns = [
     path('rooms/', ChatRoomListCreateView.as_view(), name='chat_rooms'),
     path('rooms/my/', MyChatRoomsView.as_view(), name='my_chat_rooms'),
     path('rooms/<int:room_id>/messages/', MessageListCreateView.as_view(), name='chat_room_messages'),
+    path('rooms/<int:room_id>/read/', MarkReadView.as_view(), name='chat_room_read'),
+    path('messages/search/', MessageSearchView.as_view(), name='search_messages'),
     path('users/', SearchUsersView.as_view(), name='search_users'),
+    path('presence/', PresenceView.as_view(), name='presence'),
 ]
@@ -1,37 +1,48 @@
 # File: apps/chat/views.py
-from django.contrib.auth import get_user_model
+from datetime import datetime, timezone as dt_timezone
+
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Q
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.db.models import FloatField, Value
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 
 from rest_framework import generics, permissions, status
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from .models import ChatRoom, ChatParticipant, Message
-from .serializers import ChatRoomSerializer, MessageSerializer, UserSerializer
+from .directory import DEFAULT_LIMIT, USER_TYPES, room_handle, search_directory, user_model, user_type
+from .inbox import inbox_rooms, sender_models
+from .models import ArchivedMessage, ChatRoom, ChatParticipant, Message
+from .pagination import MessageKeysetPagination, SearchKeysetPagination
+from .persistence import message_writer
+from .presence import presence
+from .receipts import apply_receipts, read_receipts
+from .search import search_messages
+from .serializers import ChatRoomSerializer, MessageSearchResultSerializer, MessageSerializer
 
-User = get_user_model()
 
 class ChatRoomListCreateView(generics.ListCreateAPIView):
     serializer_class = ChatRoomSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        ct = ContentType.objects.get_for_model(user)
-        room_ids = ChatParticipant.objects.filter(
-            content_type=ct, object_id=user.id
-        ).values_list('room_id', flat=True)
-        return ChatRoom.objects.filter(id__in=room_ids).order_by('-created_at')
+        return inbox_rooms(self.request.user)
 
-    def create(self, request, *args, **kwargs):
-        user = request.user
-        other_id = request.data.get('other_user_id')
+    def get_other_user(self):
+        # other_user_type is a directory type (see directory.py); staff when omitted
+        other_id = self.request.data.get('other_user_id')
         if not other_id:
             raise PermissionDenied("You must specify other_user_id.")
-        other = get_object_or_404(User, pk=other_id)
+        model = user_model(self.request.data.get('other_user_type', 'staff'))
+        if model is None:
+            raise ValidationError({"other_user_type": f"Must be one of: {', '.join(USER_TYPES)}."})
+        return get_object_or_404(model, pk=other_id)
+
+    def create(self, request, *args, **kwargs):
+        user = request.user
+        other = self.get_other_user()
         if user == other:
             raise PermissionDenied("Cannot chat with yourself.")
 
@@ -56,8 +67,8 @@ class ChatRoomListCreateView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         # build a deterministic, unique name for this 1:1
         user = self.request.user
-        other = get_object_or_404(User, pk=self.request.data['other_user_id'])
-        names = sorted([user.username, other.username])
+        other = self.get_other_user()
+        names = sorted([room_handle(user), room_handle(other)])
         room_name = f"chat_{names[0]}_{names[1]}"
         room = serializer.save(name=room_name)
 
@@ -74,12 +85,8 @@ class MyChatRoomsView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        user = self.request.user
-        ct   = ContentType.objects.get_for_model(user)
-        room_ids = ChatParticipant.objects.filter(
-            content_type=ct, object_id=user.id
-        ).values_list("room_id", flat=True)
-        return ChatRoom.objects.filter(id__in=room_ids).order_by("-created_at")
+        # rooms, last message ids and unread counts in one query (see inbox.py)
+        return inbox_rooms(self.request.user)
 
     def get_serializer_context(self):
         # include request so our serializer can fetch `request.user`
@@ -91,9 +98,12 @@ class MyChatRoomsView(generics.ListAPIView):
 class MessageListCreateView(generics.ListCreateAPIView):
     serializer_class = MessageSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MessageKeysetPagination
 
     def get_room(self):
-        return get_object_or_404(ChatRoom, pk=self.kwargs['room_id'])
+        if not hasattr(self, '_room'):
+            self._room = get_object_or_404(ChatRoom, pk=self.kwargs['room_id'])
+        return self._room
 
     def check_participation(self, room, user):
         ct = ContentType.objects.get_for_model(user)
@@ -108,15 +118,22 @@ class MessageListCreateView(generics.ListCreateAPIView):
         if not self.check_participation(room, user):
             raise PermissionDenied("Not a participant in this room.")
 
-        # mark messages as “read” up to now
-        user_ct = ContentType.objects.get_for_model(user)
-        ChatParticipant.objects.filter(
-            room=room,
-            content_type=user_ct,
-            object_id=user.id
-        ).update(last_read=timezone.now())
+        # mark messages as “read” up to now; buffered and written at most once per
+        # interval (see receipts.py). Clients that send explicit receipts pass ?mark_read=false.
+        if self.request.query_params.get('mark_read', 'true').lower() != 'false':
+            ct = ContentType.objects.get_for_model(user)
+            read_receipts.record(room.id, ct.id, user.id, timezone.now())
 
-        return Message.objects.filter(room=room).order_by('timestamp')
+        # senders of a page are fetched with one query per user model
+        return Message.objects.filter(room=room).prefetch_related(
+            GenericPrefetch('sender', sender_models())
+        ).order_by('timestamp')
+
+    def get_archive_queryset(self):
+        # only read when a page runs past the hot window (see archive.py)
+        return ArchivedMessage.objects.filter(room=self.get_room()).prefetch_related(
+            GenericPrefetch('sender', sender_models())
+        )
 
     def get_serializer_context(self):
         ctx = super().get_serializer_context()
@@ -132,21 +149,115 @@ class MessageListCreateView(generics.ListCreateAPIView):
             raise PermissionDenied("Not a participant in this room.")
 
         ct = ContentType.objects.get_for_model(user)
-        serializer.save(
-            room=room,
-            sender_content_type=ct,
-            sender_object_id=user.id
+        # saved, with the unread counters, before the 201 (see persistence.py)
+        message = message_writer.add(room.id, ct.id, user.id, serializer.validated_data['text'])
+        message.sender = user
+        serializer.instance = message
+
+
+class MarkReadView(APIView):
+    """
+    POST {"message_id": <id>} — mark the room read up to that message, written
+    at once. ``last_read`` never moves backwards.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, room_id):
+        room = get_object_or_404(ChatRoom, pk=room_id)
+        user = request.user
+        ct = ContentType.objects.get_for_model(user)
+        participant = ChatParticipant.objects.filter(room=room, content_type=ct, object_id=user.id).first()
+        if participant is None:
+            raise PermissionDenied("Not a participant in this room.")
+
+        message_id = str(request.data.get('message_id', ''))
+        if not message_id.isdigit():
+            raise ValidationError({"message_id": "Must be a message id."})
+        message_id = int(message_id)
+        read_at = (
+            Message.objects.filter(room=room, pk=message_id).values_list('timestamp', flat=True).first()
+            or ArchivedMessage.objects.filter(room=room, pk=message_id).values_list('timestamp', flat=True).first()
         )
+        if read_at is None:
+            return Response({"detail": f"Message {message_id} is not in this room."},
+                            status=status.HTTP_404_NOT_FOUND)
 
+        apply_receipts({(room.id, ct.id, user.id): read_at})
+        participant.refresh_from_db(fields=['last_read', 'unread_count'])
+        return Response({"last_read": participant.last_read, "unread_count": participant.unread_count})
 
-class SearchUsersView(generics.ListAPIView):
-    serializer_class = UserSerializer
+
+class MessageSearchView(generics.ListAPIView):
+    """
+    GET ?q=<words>[&room=<id>] — messages matching ``q`` in the caller's
+    rooms, best match first, keyset-paginated (see search.py). Results cover
+    the last ``CHAT_HOT_RETENTION_DAYS`` only; archived messages are not
+    searched.
+    """
+    serializer_class = MessageSearchResultSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = SearchKeysetPagination
 
     def get_queryset(self):
         q = self.request.query_params.get('q', '').strip()
         if not q:
-            return User.objects.none()
-        return User.objects.filter(
-            Q(username__icontains=q) | Q(email__icontains=q)
-        )[:20]
+            return Message.objects.none().annotate(rank=Value(0.0, output_field=FloatField()))
+        room = self.request.query_params.get('room')
+        if room is not None and not room.isdigit():
+            raise ValidationError({"room": "Must be a room id."})
+        return search_messages(
+            self.request.user, q, room_id=int(room) if room else None
+        ).prefetch_related(GenericPrefetch('sender', sender_models()))
+
+
+class SearchUsersView(APIView):
+    """
+    GET ?q=<text>[&limit=<n>] — staff members and students matching ``q``,
+    tagged ``{type, id}`` so either can be passed straight to room creation
+    as ``other_user_type``/``other_user_id`` (see directory.py).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', DEFAULT_LIMIT))
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+        me = (user_type(request.user), request.user.pk)
+        return Response({"results": search_directory(request.query_params.get('q', ''), limit, exclude=me)})
+
+
+class PresenceView(APIView):
+    """
+    GET ?ids=1,2,3[&type=student] — online state of up to MAX_IDS users of
+    one model (staff members by default) from a single cache round trip.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    MAX_IDS = 200
+
+    def get(self, request):
+        model = user_model(request.query_params.get('type', 'staff'))
+        if model is None:
+            return Response({"detail": f"type must be one of: {', '.join(USER_TYPES)}."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()]
+        except ValueError:
+            return Response({"detail": "ids must be a comma-separated list of integers."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > self.MAX_IDS:
+            return Response({"detail": f"At most {self.MAX_IDS} ids per request."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        ct = ContentType.objects.get_for_model(model)
+        last_seen = presence.lookup(ct.id, ids)
+        return Response({
+            "presence": [
+                {
+                    "id": pk,
+                    "online": seen is not None,
+                    "last_seen": datetime.fromtimestamp(seen, tz=dt_timezone.utc).isoformat() if seen else None,
+                }
+                for pk, seen in last_seen.items()
+            ]
+        })
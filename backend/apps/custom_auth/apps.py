@@ -0,0 +1,9 @@
+# apps/custom_auth/apps.py
+from django.apps import AppConfig
+
+class CustomAuthConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'apps.custom_auth'
+
+    def ready(self):
+        import apps.custom_auth.signals  # Ensure signals are loaded
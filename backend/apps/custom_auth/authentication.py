@@ -1,12 +1,15 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.exceptions import InvalidToken, AuthenticationFailed
-from apps.student.models import Student
-from apps.staff_members.models import StaffMember
+from apps.custom_auth.claims import token_is_current
+from apps.custom_auth.principals import principal_cache, principal_model
 import logging
 
 logger = logging.getLogger(__name__)
 
 class CustomJWTAuthentication(JWTAuthentication):
+    # per-process snapshots of token users, see principals.py
+    principals = principal_cache
+
     def get_user(self, validated_token):
         """
         Override to handle user lookup for both Student and StaffMember models.
@@ -18,18 +21,14 @@ class CustomJWTAuthentication(JWTAuthentication):
             logger.error("Token missing user_id or userType")
             raise InvalidToken("Token contained no recognizable user identification")
 
-        logger.debug(f"Looking up user: ID={user_id}, Type={user_type}")
+        model = principal_model(user_type)
+        if model is None:
+            logger.error(f"Invalid userType in token: {user_type}")
+            raise AuthenticationFailed("Invalid user type in token")
 
-        user = None
         try:
-            if user_type == 'student':
-                user = Student.objects.get(id=user_id)
-            elif user_type == 'staff':
-                user = StaffMember.objects.get(id=user_id)
-            else:
-                logger.error(f"Invalid userType in token: {user_type}")
-                raise AuthenticationFailed("Invalid user type in token")
-        except (Student.DoesNotExist, StaffMember.DoesNotExist):
+            user = self.principals.get(user_type, user_id)
+        except model.DoesNotExist:
             logger.error(f"User not found: ID={user_id}, Type={user_type}")
             raise AuthenticationFailed("User not found")
         except Exception as e:
@@ -40,5 +39,8 @@ class CustomJWTAuthentication(JWTAuthentication):
             logger.warning(f"Inactive user attempted authentication: ID={user_id}")
             raise AuthenticationFailed("User is inactive")
 
-        logger.debug(f"Authenticated user: ID={user_id}, Type={user_type}")
-        return user
\ No newline at end of file
+        if not token_is_current(validated_token, user):
+            logger.info(f"Outdated token refused: ID={user_id}, Type={user_type}")
+            raise AuthenticationFailed("Token is outdated, please log in again")
+
+        return user
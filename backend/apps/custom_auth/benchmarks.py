@@ -0,0 +1,236 @@
+# apps/custom_auth/benchmarks.py
+"""
+Benchmarks for authentication.
+
+Run them with ``python manage.py benchmark_auth <suite>``; every suite
+returns a JSON-serialisable dict. Benchmark users are created under a
+``bench-auth`` prefix and deleted afterwards.
+"""
+import time
+from datetime import timedelta
+
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.staff_members.models import StaffMember
+from apps.student.models import Student
+
+from .authentication import CustomJWTAuthentication
+from .hashing import available_cores, hash_passwords, hash_workers
+from .lookup import find_user, sync_principals
+from .models import Principal, RevokedToken
+from .principals import PrincipalCache
+from .revocation import RevocationStore
+from .serializers import LoginSerializer, MyTokenObtainPairSerializer, MyTokenRefreshSerializer
+
+PREFIX = "bench-auth"
+
+
+def seed_users(count, password=''):
+    """``count`` staff members and ``count`` students; returns them all."""
+    staff = StaffMember.objects.bulk_create([
+        StaffMember(email=f"{PREFIX}-staff-{i}@example.invalid", username=f"{PREFIX}-staff-{i}", password=password)
+        for i in range(count)
+    ])
+    students = Student.objects.bulk_create([
+        Student(email=f"{PREFIX}-student-{i}@example.invalid", first_name="Bench", last_name=str(i),
+                password=password)
+        for i in range(count)
+    ])
+    # bulk_create sends no signals
+    sync_principals(staff + students)
+    return staff + students
+
+
+def cleanup():
+    StaffMember.objects.filter(email__startswith=f"{PREFIX}-").delete()
+    Student.objects.filter(email__startswith=f"{PREFIX}-").delete()
+    Principal.objects.filter(email__startswith=f"{PREFIX}-").delete()
+    RevokedToken.objects.filter(jti__startswith=f"{PREFIX}-").delete()
+
+
+def run_principals(options):
+    """
+    Queries and time per authenticated request in ``CustomJWTAuthentication``:
+    ``--requests`` requests spread over ``--users`` staff members and as many
+    students, with the principal cache disabled and enabled.
+    """
+    user_count = options.get('users') or 50
+    request_count = options.get('requests') or 5000
+    results = {'users': user_count * 2, 'requests': request_count, 'runs': []}
+
+    cleanup()
+    try:
+        factory = RequestFactory()
+        requests = [
+            factory.get('/', HTTP_AUTHORIZATION=f"Bearer {MyTokenObtainPairSerializer.get_token(user).access_token}")
+            for user in seed_users(user_count)
+        ]
+        for label, cache in (('uncached', PrincipalCache(ttl=0)), ('cached', PrincipalCache(version_alias=''))):
+            authenticator = type('BenchmarkJWTAuthentication', (CustomJWTAuthentication,), {'principals': cache})()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for i in range(request_count):
+                    authenticator.authenticate(requests[i % len(requests)])
+                elapsed = time.perf_counter() - start
+            results['runs'].append({
+                'mode': label,
+                'seconds': round(elapsed, 3),
+                'requests_per_s': round(request_count / elapsed, 1),
+                'queries': len(queries),
+                'queries_per_request': round(len(queries) / request_count, 3),
+            })
+        uncached, cached = results['runs']
+        results['queries_saved_per_request'] = round(
+            uncached['queries_per_request'] - cached['queries_per_request'], 3
+        )
+    finally:
+        cleanup()
+    return results
+
+
+def _latencies(fn, calls):
+    timings = []
+    with CaptureQueriesContext(connection) as queries:
+        for i in range(calls):
+            start = time.perf_counter()
+            fn(i)
+            timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 3),
+        'p99_ms': round(timings[int(len(timings) * 0.99)] * 1000, 3),
+        'queries_per_call': round(len(queries) / calls, 3),
+    }
+
+
+def run_login(options):
+    """
+    Login latency through ``LoginSerializer`` (the login endpoint's work
+    before the token is issued), successful and refused, and the email
+    lookup on its own. Passwords use a fast hasher unless
+    ``--real-hashing`` is given, so the lookup is not drowned out by PBKDF2.
+    """
+    user_count = options.get('users') or 1000
+    calls = options.get('requests') or 1000
+    hashers = None if options.get('real_hashing') else ['django.contrib.auth.hashers.MD5PasswordHasher']
+    results = {'users': user_count * 2, 'logins': calls, 'real_hashing': hashers is None, 'runs': []}
+
+    with override_settings(**({'PASSWORD_HASHERS': hashers} if hashers else {})):
+        cleanup()
+        try:
+            users = seed_users(user_count, password=make_password("bench-password"))
+            staff = users[:user_count]
+
+            def login(user, password="bench-password"):
+                return LoginSerializer(data={'email': user.email, 'password': password}).is_valid()
+
+            results['runs'].append({'mode': 'lookup_only', **_latencies(
+                lambda i: find_user(users[i % len(users)].email), calls
+            )})
+            results['runs'].append({'mode': 'login', **_latencies(
+                lambda i: login(staff[i % len(staff)]), calls
+            )})
+            # A refused login looks the account up a second time to explain why.
+            results['runs'].append({'mode': 'wrong_password', **_latencies(
+                lambda i: login(staff[i % len(staff)], "wrong-password"), calls
+            )})
+        finally:
+            cleanup()
+    return results
+
+
+def run_hashing(options):
+    """
+    Rows per second of the password hashing step of an Excel import:
+    ``--rows`` passwords hashed one by one, as ``set_password()`` per row did,
+    and through ``hash_passwords`` across processes. Uses the configured
+    hasher, as the import does.
+    """
+    row_count = options.get('rows') or 2000
+    passwords = [f"bench-password-{i}" for i in range(row_count)]
+    results = {
+        'rows': row_count,
+        'hasher': get_hasher().algorithm,
+        'available_cores': available_cores(),
+        'runs': [],
+    }
+    for label, workers in (('serial', 1), ('parallel', hash_workers())):
+        start = time.perf_counter()
+        hash_passwords(passwords, workers=workers)
+        elapsed = time.perf_counter() - start
+        results['runs'].append({
+            'mode': label,
+            'workers': workers,
+            'seconds': round(elapsed, 3),
+            'rows_per_s': round(row_count / elapsed, 1),
+        })
+    serial, parallel = results['runs']
+    results['speedup'] = round(parallel['rows_per_s'] / serial['rows_per_s'], 2)
+    return results
+
+
+class DatabaseRevocations(RevocationStore):
+    """The naive blacklist: one query per check."""
+
+    def is_revoked(self, jti):
+        self.lookups += 1
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+
+def run_refresh(options):
+    """
+    Refresh-path latency through ``MyTokenRefreshSerializer`` with
+    ``--revoked`` tokens already revoked, checking them with one query per
+    refresh and through the Bloom filter; each refresh also revokes the
+    token it used, as rotation does. Also times the revocation check alone
+    for tokens that were never revoked.
+    """
+    revoked_count = options.get('revoked') or 100000
+    calls = options.get('requests') or 1000
+    results = {'revoked': revoked_count, 'refreshes': calls, 'runs': []}
+
+    issued = []
+    cleanup()
+    try:
+        user = seed_users(1)[0]
+        expires_at = timezone.now() + timedelta(days=7)
+        RevokedToken.objects.bulk_create(
+            [RevokedToken(jti=f"{PREFIX}-{i}", expires_at=expires_at) for i in range(revoked_count)],
+            batch_size=5000,
+        )
+        unknown = [f"{PREFIX}-unknown-{i}" for i in range(calls)]
+
+        for label, store in (('database', DatabaseRevocations(version_alias='')),
+                             ('bloom', RevocationStore(version_alias=''))):
+            store.is_revoked(unknown[0])  # builds the filter outside the timings
+            serializer = type('BenchmarkRefreshSerializer', (MyTokenRefreshSerializer,), {'revocations': store})
+            tokens = [MyTokenObtainPairSerializer.get_token(user) for _ in range(calls)]
+            issued += [token['jti'] for token in tokens]
+            tokens = [str(token) for token in tokens]
+            refresh = _latencies(lambda i: serializer(data={'refresh': tokens[i]}).is_valid(raise_exception=True),
+                                 calls)
+            check = _latencies(lambda i: store.is_revoked(unknown[i]), calls)
+            results['runs'].append({
+                'mode': label,
+                'refresh': refresh,
+                'check_only': check,
+                'filter_bytes': store.memory(),
+                'false_positives': store.false_positives,
+            })
+    finally:
+        # Revoked by rotation during the run
+        RevokedToken.objects.filter(jti__in=issued).delete()
+        cleanup()
+    return results
+
+
+SUITES = {
+    'hashing': run_hashing,
+    'login': run_login,
+    'principals': run_principals,
+    'refresh': run_refresh,
+}
@@ -0,0 +1,79 @@
+# apps/custom_auth/claims.py
+"""
+Authorization claims carried by JWTs.
+
+``MyTokenObtainPairSerializer`` signs what permission checks need into the
+token: ``role``, ``groups`` (names) and ``is_superuser``, next to the
+``branch``, ``intake`` and ``track`` it already carried. Permission classes
+read them from ``request.auth`` with ``claim()``/``in_groups()`` instead of
+querying ``user.groups`` on every request.
+
+Claims are only as fresh as the token, so each user has a ``token_version``
+that is signed in as ``ver``. ``bump_token_versions`` moves it whenever a
+claim would change (signals.py: role, branch, intake/track, superuser,
+groups), and ``CustomJWTAuthentication`` refuses tokens carrying an older
+version: the user has to log in again for new claims.
+It is the only writer of the column; ``save()`` writes it back to itself, so
+an instance loaded before a bump cannot undo it.
+"""
+from django.db.models import F
+
+from apps.staff_members.models import StaffMember
+from apps.student.models import Student
+
+from .principals import principal_cache
+
+VERSION_CLAIM = 'ver'
+
+# Model fields whose value is signed into the token, per user model
+CLAIM_FIELDS = {
+    StaffMember: ('role', 'branch', 'is_superuser'),
+    Student: ('role', 'intake', 'track', 'is_superuser'),
+}
+
+
+def user_type(model):
+    return 'student' if issubclass(model, Student) else 'staff'
+
+
+def token_claims(user):
+    """The authorization claims for ``user``: one query, for the groups."""
+    return {
+        'role': getattr(user, 'role', 'unknown'),
+        'is_superuser': user.is_superuser,
+        'groups': sorted(user.groups.values_list('name', flat=True)),
+        VERSION_CLAIM: user.token_version,
+    }
+
+
+def token_is_current(token, user):
+    """Whether ``token`` was issued after the last change to ``user``'s claims."""
+    return token.get(VERSION_CLAIM, 0) == user.token_version
+
+
+def claim(request, name, default=None):
+    """A claim of the request's token, or ``default`` without a token or claim."""
+    token = getattr(request, 'auth', None)
+    if token is None or not hasattr(token, 'get'):
+        return default
+    return token.get(name, default)
+
+
+def in_groups(request, names):
+    """Whether the user is in any of the groups ``names``; from the token when it carries them."""
+    groups = claim(request, 'groups')
+    if groups is not None:
+        return not set(groups).isdisjoint(names)
+    # Tokens issued before groups were signed in, or another authentication class
+    return request.user.groups.filter(name__in=names).exists()
+
+
+def bump_token_versions(model, pks):
+    """Invalidate the tokens of the ``model`` users ``pks``, in every worker."""
+    pks = [pk for pk in pks if pk is not None]
+    if not pks:
+        return
+    model.objects.filter(pk__in=pks).update(token_version=F('token_version') + 1)
+    for pk in pks:
+        principal_cache.invalidate(user_type(model), pk)
+    principal_cache.bump_version()
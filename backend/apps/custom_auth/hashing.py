@@ -0,0 +1,71 @@
+# apps/custom_auth/hashing.py
+"""
+Password hashing for bulk imports.
+
+``set_password()`` runs the configured hasher (PBKDF2 by default) once per
+account, tens of milliseconds each, so an Excel import of a whole intake
+spends most of its time hashing on one core. ``hash_passwords`` hashes a
+batch across a ``ProcessPoolExecutor`` with one process per available
+core (``AUTH_PASSWORD_HASH_WORKERS``) and returns the encoded passwords in
+order, ready to assign to ``user.password`` before ``bulk_create``.
+
+The hasher and its salts are picked in the calling process, so the result
+is the same as ``make_password()`` there, whatever the settings of the
+worker processes. Small batches, a single worker, or a pool that cannot
+start fall back to hashing in-process.
+"""
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Below this many passwords, starting the workers costs more than it saves
+MIN_PARALLEL_BATCH = 8
+
+
+def available_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+def hash_workers():
+    """Worker processes for a batch: ``AUTH_PASSWORD_HASH_WORKERS``, or one per core when 0."""
+    return settings.AUTH_PASSWORD_HASH_WORKERS or available_cores()
+
+
+def _encode_chunk(hasher_path, pairs):
+    hasher = import_string(hasher_path)()
+    return [hasher.encode(password, salt) for password, salt in pairs]
+
+
+def hash_passwords(passwords, workers=None):
+    """Encoded ``passwords``, in order, as ``make_password()`` would return them."""
+    passwords = list(passwords)
+    hasher = get_hasher()
+    hasher_path = f"{type(hasher).__module__}.{type(hasher).__qualname__}"
+    pairs = [(password, hasher.salt()) for password in passwords]
+    workers = min(workers or hash_workers(), len(pairs))
+
+    if workers > 1 and len(pairs) >= MIN_PARALLEL_BATCH:
+        # A few chunks per worker, so a slow one does not hold up the batch
+        size = -(-len(pairs) // (workers * 4))
+        chunks = [pairs[i:i + size] for i in range(0, len(pairs), size)]
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                return [
+                    encoded
+                    for chunk in pool.map(_encode_chunk, [hasher_path] * len(chunks), chunks)
+                    for encoded in chunk
+                ]
+        except (BrokenProcessPool, OSError) as e:
+            logger.warning(f"Parallel password hashing failed ({e}); hashing {len(pairs)} passwords in-process")
+
+    return [hasher.encode(password, salt) for password, salt in pairs]
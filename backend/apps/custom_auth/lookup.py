@@ -0,0 +1,111 @@
+# apps/custom_auth/lookup.py
+"""
+Email -> account lookup shared by login and password reset.
+
+``Principal`` mirrors every Student and StaffMember as
+``(normalized email, user_type, user_id, intake_id)``. ``find_user`` reads
+the candidates for an email from it with one indexed query and loads the
+chosen account by primary key, instead of filtering, counting and
+iterating each model in turn.
+
+Rows are kept in step by ``post_save``/``post_delete`` (signals.py).
+``bulk_create`` and ``QuerySet.update()`` send no signals: call
+``sync_principals`` after them, or run ``manage.py rebuild_principals``.
+"""
+import logging
+from collections import namedtuple
+
+from django.db import transaction
+
+from apps.staff_members.models import StaffMember
+from apps.student.models import Student
+
+from .models import Principal
+
+logger = logging.getLogger(__name__)
+
+PRINCIPAL_MODELS = {Principal.UserType.STUDENT: Student, Principal.UserType.STAFF: StaffMember}
+
+PrincipalRow = namedtuple('PrincipalRow', ['model', 'id', 'intake_id'])
+
+
+def normalize_email(email):
+    return (email or '').strip().lower()
+
+
+def user_type_of(user):
+    return Principal.UserType.STUDENT if isinstance(user, Student) else Principal.UserType.STAFF
+
+
+def principal_for(user):
+    return Principal(
+        email=normalize_email(user.email),
+        user_type=user_type_of(user),
+        user_id=user.pk,
+        intake_id=getattr(user, 'intake_id', None),
+    )
+
+
+def find_principals(email, intake_id=None):
+    """
+    ``PrincipalRow``s for ``email``, students first, in one query. With an
+    ``intake_id`` only that intake's student account can match.
+    """
+    principals = Principal.objects.filter(email=normalize_email(email))
+    if intake_id:
+        principals = principals.filter(user_type=Principal.UserType.STUDENT, intake_id=intake_id)
+    rows = sorted(
+        principals.values_list('user_type', 'user_id', 'intake_id'),
+        key=lambda row: (row[0] != Principal.UserType.STUDENT, row[1]),
+    )
+    return [PrincipalRow(PRINCIPAL_MODELS[user_type], pk, intake) for user_type, pk, intake in rows]
+
+
+def find_user(email, intake_id=None):
+    """The account ``email`` (and ``intake_id``) refers to, or None; two queries at most."""
+    rows = find_principals(email, intake_id)
+    if not rows:
+        return None
+    chosen = rows[0]
+    if sum(row.model is chosen.model for row in rows) > 1:
+        logger.warning(
+            f"Multiple {chosen.model.__name__} found for email='{normalize_email(email)}'"
+            f"{f', intake_id={intake_id}' if intake_id else ''}: using ID {chosen.id}"
+        )
+    return chosen.model.objects.filter(pk=chosen.id).first()
+
+
+def save_principal(user):
+    Principal.objects.update_or_create(
+        user_type=user_type_of(user),
+        user_id=user.pk,
+        defaults={'email': normalize_email(user.email), 'intake_id': getattr(user, 'intake_id', None)},
+    )
+
+
+def delete_principal(user):
+    Principal.objects.filter(user_type=user_type_of(user), user_id=user.pk).delete()
+
+
+def sync_principals(users=None):
+    """
+    Upsert the rows of ``users`` (any mix of students and staff members),
+    or rebuild the whole table when None; returns the number of rows written.
+    """
+    if users is None:
+        with transaction.atomic():
+            Principal.objects.all().delete()
+            rows = [principal_for(user) for model in PRINCIPAL_MODELS.values()
+                    for user in model.objects.only('id', 'email', *(['intake_id'] if model is Student else []))]
+            Principal.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+    rows = [principal_for(user) for user in users]
+    Principal.objects.bulk_create(
+        rows,
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['user_type', 'user_id'],
+        update_fields=['email', 'intake_id'],
+    )
+    return len(rows)
@@ -0,0 +1,51 @@
+# apps/custom_auth/management/commands/benchmark_auth.py
+import json
+import platform
+import subprocess
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.custom_auth.benchmarks import SUITES
+
+
+class Command(BaseCommand):
+    help = "Run an authentication benchmark suite and print the results as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('suite', choices=sorted(SUITES))
+        parser.add_argument('--users', type=int, help="Synthetic staff members and students to seed (each).")
+        parser.add_argument('--requests', type=int, help="Authenticated requests (or logins) to time.")
+        parser.add_argument('--revoked', type=int, help="refresh: revoked tokens to seed.")
+        parser.add_argument('--rows', type=int, help="hashing: passwords to hash, as rows of an import.")
+        parser.add_argument(
+            '--real-hashing', action='store_true',
+            help="login: hash passwords with the configured hashers instead of a fast one.",
+        )
+        parser.add_argument(
+            '--output',
+            help="Also write the results to this JSON file, to compare runs between releases.",
+        )
+
+    def _git_revision(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def handle(self, *args, **options):
+        results = {
+            'suite': options['suite'],
+            'timestamp': timezone.now().isoformat(),
+            'git_revision': self._git_revision(),
+            'python': platform.python_version(),
+            'results': SUITES[options['suite']](options),
+        }
+        report = json.dumps(results, indent=2)
+        self.stdout.write(report)
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                fh.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
@@ -0,0 +1,15 @@
+# apps/custom_auth/management/commands/bump_principal_cache.py
+from django.core.management.base import BaseCommand
+
+from apps.custom_auth.principals import principal_cache
+
+
+class Command(BaseCommand):
+    help = (
+        "Make every worker drop its cached token users, e.g. after changing users "
+        "with QuerySet.update(), which sends no signals."
+    )
+
+    def handle(self, *args, **options):
+        principal_cache.bump_version()
+        self.stdout.write(self.style.SUCCESS("Principal cache version bumped."))
@@ -0,0 +1,12 @@
+# apps/custom_auth/management/commands/purge_revoked_tokens.py
+from django.core.management.base import BaseCommand
+
+from apps.custom_auth.revocation import revocations
+
+
+class Command(BaseCommand):
+    help = "Delete revoked refresh tokens that have expired anyway; run it daily, e.g. from cron."
+
+    def handle(self, *args, **options):
+        deleted = revocations.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired revoked tokens."))
@@ -0,0 +1,15 @@
+# apps/custom_auth/management/commands/rebuild_principals.py
+from django.core.management.base import BaseCommand
+
+from apps.custom_auth.lookup import sync_principals
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the email -> account lookup table from Student and StaffMember, "
+        "e.g. after bulk changes that sent no signals."
+    )
+
+    def handle(self, *args, **options):
+        count = sync_principals()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} principals."))
@@ -0,0 +1,68 @@
+from django.db import migrations, models
+
+
+def backfill(apps, schema_editor):
+    Principal = apps.get_model("custom_auth", "Principal")
+    rows = [
+        Principal(email=(email or "").strip().lower(), user_type="staff", user_id=pk)
+        for pk, email in apps.get_model("staff_members", "StaffMember").objects.values_list("id", "email")
+    ] + [
+        Principal(email=(email or "").strip().lower(), user_type="student", user_id=pk, intake_id=intake_id)
+        for pk, email, intake_id in apps.get_model("student", "Student").objects.values_list("id", "email", "intake_id")
+    ]
+    Principal.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ("staff_members", "0001_initial"),
+        ("student", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Principal",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "email",
+                    models.CharField(help_text="Lower-cased, stripped email of the account.", max_length=254),
+                ),
+                (
+                    "user_type",
+                    models.CharField(
+                        choices=[("staff", "Staff member"), ("student", "Student")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "user_id",
+                    models.PositiveIntegerField(help_text="Primary key in the model for user_type."),
+                ),
+                (
+                    "intake_id",
+                    models.PositiveIntegerField(blank=True, help_text="Intake of a student account.", null=True),
+                ),
+            ],
+            options={
+                "verbose_name": "Principal",
+                "verbose_name_plural": "Principals",
+                "indexes": [
+                    models.Index(fields=["email", "intake_id"], name="custom_auth_email_516ba0_idx"),
+                ],
+                "unique_together": {("user_type", "user_id")},
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# apps/custom_auth/models.py
+from django.db import models
+
+
+class Principal(models.Model):
+    """
+    One row per Student and StaffMember, keyed by normalized email, so a
+    login or password reset finds its account with one indexed query across
+    both models. Maintained by signals (see apps/custom_auth/lookup.py).
+    """
+    class UserType(models.TextChoices):
+        STAFF = 'staff', 'Staff member'
+        STUDENT = 'student', 'Student'
+
+    email = models.CharField(max_length=254, help_text='Lower-cased, stripped email of the account.')
+    user_type = models.CharField(max_length=10, choices=UserType.choices)
+    user_id = models.PositiveIntegerField(help_text='Primary key in the model for user_type.')
+    intake_id = models.PositiveIntegerField(null=True, blank=True, help_text='Intake of a student account.')
+
+    class Meta:
+        verbose_name = 'Principal'
+        verbose_name_plural = 'Principals'
+        unique_together = [['user_type', 'user_id']]
+        indexes = [
+            models.Index(fields=['email', 'intake_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.email} ({self.user_type} {self.user_id})"
+
+
+class RevokedToken(models.Model):
+    """
+    A refresh token that may no longer be used, until it would have expired
+    anyway. Checked through a Bloom filter (see apps/custom_auth/revocation.py).
+    """
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Revoked token'
+        verbose_name_plural = 'Revoked tokens'
+
+    def __str__(self):
+        return self.jti
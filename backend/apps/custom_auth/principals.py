@@ -0,0 +1,145 @@
+# apps/custom_auth/principals.py
+"""
+Per-process cache of authenticated principals.
+
+``CustomJWTAuthentication`` resolves the ``(userType, user_id)`` of every
+token to a ``Student`` or ``StaffMember``. ``PrincipalCache`` keeps a
+snapshot of each user (with the relations views usually touch) for
+``AUTH_PRINCIPAL_CACHE_TTL`` seconds, so repeated requests from the same
+user cost no query. Every request gets its own copy of the snapshot.
+
+Invalidation:
+
+* ``post_save``/``post_delete`` on either model drop the entry in this
+  process at once (signals.py);
+* changes to an existing user also bump a version number in the shared
+  ``AUTH_PRINCIPAL_VERSION_CACHE`` cache. Each process compares its version
+  at most every ``AUTH_PRINCIPAL_VERSION_CHECK_INTERVAL`` seconds and drops
+  everything when it moved. ``manage.py bump_principal_cache`` does the
+  same by hand, e.g. after a ``QuerySet.update()`` that sent no signals.
+
+Without a version cache (empty setting), other processes catch up when the
+TTL expires.
+"""
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'auth:principals:version'
+
+# userType claim -> (model, relations loaded with the snapshot)
+PRINCIPAL_TYPES = {
+    'staff': ('staff_members.StaffMember', ('branch',)),
+    'student': ('student.Student', ('intake', 'track')),
+}
+
+
+def principal_model(user_type):
+    """The model behind a ``userType`` claim, or None for an unknown one."""
+    entry = PRINCIPAL_TYPES.get(user_type)
+    return apps.get_model(entry[0]) if entry else None
+
+
+def load_principal(user_type, user_id):
+    """Fetch a principal from the database; raises the model's DoesNotExist."""
+    label, related = PRINCIPAL_TYPES[user_type]
+    return apps.get_model(label).objects.select_related(*related).get(pk=user_id)
+
+
+class PrincipalCache:
+    def __init__(self, ttl=None, maxsize=None, version_alias=None, version_check_interval=None):
+        """A ``ttl`` of 0 disables caching: every lookup goes to the database."""
+        self.ttl = ttl if ttl is not None else settings.AUTH_PRINCIPAL_CACHE_TTL
+        self.maxsize = maxsize or settings.AUTH_PRINCIPAL_CACHE_SIZE
+        self.version_alias = (
+            version_alias if version_alias is not None else settings.AUTH_PRINCIPAL_VERSION_CACHE
+        )
+        self.version_check_interval = (
+            version_check_interval if version_check_interval is not None
+            else settings.AUTH_PRINCIPAL_VERSION_CHECK_INTERVAL
+        )
+        self._entries = OrderedDict()  # (user_type, user_id) -> (expires_at, user), least recent first
+        self._lock = threading.Lock()
+        self._generation = 0  # moves on every invalidation, so a load racing one is not stored
+        self._version = None
+        self._version_checked_at = float('-inf')
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_type, user_id):
+        """A private copy of the user; raises the model's DoesNotExist."""
+        if self.ttl <= 0:
+            return load_principal(user_type, user_id)
+
+        self._check_version()
+        key = (user_type, str(user_id))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.copy(entry[1])
+            self.misses += 1
+            generation = self._generation
+
+        user = load_principal(user_type, user_id)
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, user)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return copy.copy(user)
+
+    def invalidate(self, user_type, user_id):
+        with self._lock:
+            self._entries.pop((user_type, str(user_id)), None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def bump_version(self):
+        """Make every process drop its cached principals within the check interval."""
+        self.clear()
+        if not self.version_alias:
+            return
+        try:
+            cache = caches[self.version_alias]
+            cache.add(VERSION_KEY, 0, None)
+            cache.incr(VERSION_KEY)
+        except Exception:
+            logger.warning("Could not bump the principal cache version; other workers catch up on TTL",
+                           exc_info=True)
+
+    def _check_version(self):
+        if not self.version_alias:
+            return
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        try:
+            version = caches[self.version_alias].get(VERSION_KEY, 0)
+        except Exception:
+            logger.warning("Could not read the principal cache version", exc_info=True)
+            return
+        if version != self._version:
+            if self._version is not None:
+                self.clear()
+            self._version = version
+
+
+# Shared by every request in this process
+principal_cache = PrincipalCache()
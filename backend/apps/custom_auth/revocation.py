@@ -0,0 +1,203 @@
+# apps/custom_auth/revocation.py
+"""
+Revoked refresh tokens.
+
+``SIMPLE_JWT`` rotates refresh tokens and asks for the old one to be
+blacklisted, but simplejwt's ``token_blacklist`` app is not installed, so a
+used refresh token stayed valid until it expired. ``RevocationStore``
+records each used (or logged-out) token's ``jti`` in ``RevokedToken`` and
+answers "is this revoked?" from a Bloom filter of the revoked ``jti``s kept
+in memory (about 1.8 bytes per token at a 0.1% error rate). Only a filter hit
+goes to the database, to tell a real revocation from a false positive, so
+the common case (a token that was never revoked) costs no query.
+
+Keeping the filter complete:
+
+* ``revoke()`` adds to this process's filter at once and bumps a version in
+  the shared ``AUTH_REVOCATION_VERSION_CACHE`` cache. Each process reads the
+  version at most every ``AUTH_REVOCATION_CHECK_INTERVAL`` seconds and adds
+  the rows revoked since its last sync when it moved;
+* the filter is rebuilt from the table every
+  ``AUTH_REVOCATION_REBUILD_INTERVAL`` seconds, or sooner once it holds more
+  than its capacity. Rows whose token has expired are left out, since an
+  expired token is refused anyway; ``manage.py purge_revoked_tokens``
+  deletes them from the table.
+
+Without a version cache (empty setting), other processes see new
+revocations at their next rebuild.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from .models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'auth:revocations:version'
+
+# Rows committed out of order can carry a revoked_at slightly before the last sync
+SYNC_OVERLAP = timedelta(minutes=1)
+
+
+class BloomFilter:
+    """A set of strings answering membership with no false negatives, in ``capacity`` × ~1.8 bytes."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        # Double hashing: k positions from one 128-bit digest
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        new = False
+        for position in self._positions(key):
+            mask = 1 << (position & 7)
+            if not self.bits[position >> 3] & mask:
+                self.bits[position >> 3] |= mask
+                new = True
+        # Keys added again (syncs overlap) do not count towards the capacity
+        if new:
+            self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    def __len__(self):
+        return self.count
+
+
+class RevocationStore:
+    def __init__(self, capacity=None, error_rate=None, version_alias=None, check_interval=None,
+                 rebuild_interval=None):
+        self.capacity = capacity or settings.AUTH_REVOCATION_BLOOM_CAPACITY
+        self.error_rate = error_rate or settings.AUTH_REVOCATION_BLOOM_ERROR_RATE
+        self.version_alias = (
+            version_alias if version_alias is not None else settings.AUTH_REVOCATION_VERSION_CACHE
+        )
+        self.check_interval = (
+            check_interval if check_interval is not None else settings.AUTH_REVOCATION_CHECK_INTERVAL
+        )
+        self.rebuild_interval = (
+            rebuild_interval if rebuild_interval is not None else settings.AUTH_REVOCATION_REBUILD_INTERVAL
+        )
+        self._filter = None
+        self._lock = threading.Lock()
+        self._built_at = float('-inf')
+        self._synced_at = None  # database time of the last rebuild or sync
+        self._version = None
+        self._version_checked_at = float('-inf')
+        self.lookups = 0  # filter hits checked against the database
+        self.false_positives = 0
+
+    def is_revoked(self, jti):
+        """Whether the token ``jti`` was revoked; queries only when the filter says it may be."""
+        self._refresh()
+        if jti not in self._filter:
+            return False
+        self.lookups += 1
+        revoked = RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    def revoke(self, jti, expires_at):
+        """
+        Revoke the token ``jti`` until ``expires_at``; returns False when it
+        already was, e.g. when one refresh token is used twice at once.
+        """
+        _, created = RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': expires_at})
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+        if created:
+            transaction.on_commit(self._bump_version)
+        return created
+
+    def rebuild(self):
+        """Replace the filter with one holding every unexpired revocation in the table."""
+        version = self._read_version()
+        started = timezone.now()
+        revoked = RevokedToken.objects.filter(expires_at__gt=started)
+        bloom = BloomFilter(max(self.capacity, 2 * revoked.count()), self.error_rate)
+        for jti in revoked.values_list('jti', flat=True).iterator(chunk_size=10000):
+            bloom.add(jti)
+        with self._lock:
+            self._filter = bloom
+            self._synced_at = started
+            self._built_at = time.monotonic()
+            self._version = version
+        logger.info(f"Revocation filter rebuilt: {len(bloom)} tokens in {len(bloom.bits)} bytes")
+
+    def purge_expired(self):
+        """Delete the rows of tokens that have expired anyway; returns how many."""
+        deleted, _ = RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+    def memory(self):
+        return len(self._filter.bits) if self._filter is not None else 0
+
+    def _refresh(self):
+        bloom = self._filter
+        if (bloom is None or len(bloom) > bloom.capacity
+                or time.monotonic() - self._built_at >= self.rebuild_interval):
+            self.rebuild()
+            return
+        if not self.version_alias or time.monotonic() - self._version_checked_at < self.check_interval:
+            return
+        version = self._read_version()
+        if version is not None and version != self._version:
+            self._sync(version)
+
+    def _sync(self, version):
+        # Revocations by other processes since the last sync
+        started = timezone.now()
+        new = RevokedToken.objects.filter(
+            revoked_at__gte=self._synced_at - SYNC_OVERLAP, expires_at__gt=started
+        ).values_list('jti', flat=True)
+        with self._lock:
+            for jti in new.iterator(chunk_size=10000):
+                self._filter.add(jti)
+            self._synced_at = started
+            self._version = version
+
+    def _read_version(self):
+        if not self.version_alias:
+            return None
+        self._version_checked_at = time.monotonic()
+        try:
+            return caches[self.version_alias].get(VERSION_KEY, 0)
+        except Exception:
+            logger.warning("Could not read the token revocation version", exc_info=True)
+            return None
+
+    def _bump_version(self):
+        if not self.version_alias:
+            return
+        try:
+            cache = caches[self.version_alias]
+            cache.add(VERSION_KEY, 0, None)
+            cache.incr(VERSION_KEY)
+        except Exception:
+            logger.warning("Could not bump the token revocation version; other workers catch up on rebuild",
+                           exc_info=True)
+
+
+# Shared by every request in this process
+revocations = RevocationStore()
@@ -1,5 +1,9 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import InvalidToken
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as SimpleJWTTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import datetime_from_epoch
 from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
@@ -7,6 +11,10 @@ from django.core.exceptions import ValidationError as DjangoValidationError
 from apps.student.models import Student, Intake
 from apps.staff_members.models import StaffMember
 from apps.custom_auth.backends import MultiModelAuthBackend
+from apps.custom_auth.claims import token_claims, token_is_current
+from apps.custom_auth.lookup import find_user
+from apps.custom_auth.principals import principal_cache
+from apps.custom_auth.revocation import revocations
 import logging
 
 User = get_user_model()
@@ -51,38 +59,15 @@ class LoginSerializer(serializers.Serializer):
             raise serializers.ValidationError({"detail": "An error occurred during authentication."})
 
         if user is None:
+            # Find the account anyway, to tell the caller what was wrong.
             try:
-                if intake:
-                    logger.debug(f"Querying Student with email='{email}', intake_id={intake.id}")
-                    students = Student.objects.filter(email=email, intake=intake)
-                    logger.debug(f"Found {students.count()} students for email='{email}', intake_id={intake.id}")
-                    if students.count() > 1:
-                        logger.warning(f"Multiple students found for email='{email}', intake_id={intake.id}: {students.count()} records")
-                        for student in students:
-                            logger.debug(f" - Student ID: {student.id}, Username: {student.username}")
-                    user = students.first()
-                    if not user:
-                        logger.warning(f"No student found with email='{email}', intake_id={intake.id}")
-                        raise serializers.ValidationError({"detail": "No student account found with that email and intake."})
-                else:
-                    logger.debug(f"Querying without intake_id for email='{email}'")
-                    for model in (Student, StaffMember):
-                        try:
-                            users = model.objects.filter(email=email)
-                            logger.debug(f"Found {users.count()} users in {model.__name__} for email='{email}'")
-                            if users.count() > 1:
-                                logger.warning(f"Multiple {model.__name__} found for email='{email}': {users.count()} records")
-                                for u in users:
-                                    logger.debug(f" - {model.__name__} ID: {u.id}, Username: {u.username}")
-                            user = users.first()
-                            if user:
-                                break
-                        except Exception as e:
-                            logger.error(f"Error querying {model.__name__} for email='{email}': {str(e)}")
-                            continue
+                user = find_user(email, intake.id if intake else None)
             except Exception as e:
                 logger.error(f"Error during user lookup for email='{email}': {str(e)}")
                 raise serializers.ValidationError({"detail": "An error occurred during authentication."})
+            if user is None and intake:
+                logger.warning(f"No student found with email='{email}', intake_id={intake.id}")
+                raise serializers.ValidationError({"detail": "No student account found with that email and intake."})
 
         if user is None:
             logger.warning(f"Login attempt with non-existent email: {email}")
@@ -114,7 +99,6 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
         token = super().get_token(user)
         token['sub'] = str(user.pk)
         token['email'] = user.email
-        token['role'] = getattr(user, 'role', 'unknown')
         token['userType'] = 'student' if isinstance(user, Student) else 'staff'
         token['username'] = getattr(user, 'username', user.email)
         token['is_active'] = user.is_active
@@ -136,6 +120,9 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
                 'name': user.branch.name
             } if user.branch else None
 
+        # role and groups for permission checks, and the token version
+        for name, value in token_claims(user).items():
+            token[name] = value
         return token
 
     def validate(self, attrs):
@@ -172,6 +159,32 @@ class MyTokenObtainPairSerializer(TokenObtainPairSerializer):
             }
         }
 
+class MyTokenRefreshSerializer(SimpleJWTTokenRefreshSerializer):
+    # used and logged-out refresh tokens, see revocation.py
+    revocations = revocations
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        jti = refresh[api_settings.JTI_CLAIM]
+        if self.revocations.is_revoked(jti):
+            logger.warning(f"Revoked refresh token used: jti={jti}")
+            raise InvalidToken("Token is revoked")
+
+        # A refresh token outlives claim changes too: no new access token with stale claims
+        try:
+            user = principal_cache.get(refresh['userType'], refresh['user_id'])
+        except (KeyError, ObjectDoesNotExist):
+            raise InvalidToken("User not found")
+        if not user.is_active or not token_is_current(refresh, user):
+            logger.info(f"Outdated refresh token refused: ID={user.pk}")
+            raise InvalidToken("Token is outdated, please log in again")
+
+        if api_settings.ROTATE_REFRESH_TOKENS and api_settings.BLACKLIST_AFTER_ROTATION:
+            # Each refresh token is good for one refresh; of two racing uses only one gets here first
+            if not self.revocations.revoke(jti, datetime_from_epoch(refresh['exp'])):
+                raise InvalidToken("Token is revoked")
+        return super().validate(attrs)
+
 class TokenRefreshSerializer(serializers.Serializer):
     refresh = serializers.CharField()
 
@@ -194,17 +207,17 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
     new_password = serializers.CharField(write_only=True)
 
     def validate_new_password(self, value):
-        email = self.initial_data.get('email')
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+        # validate() hands the account on to the view, so it is looked up once
+        self.user = find_user(self.initial_data.get('email'))
+        if self.user is None:
             raise serializers.ValidationError("No account found with that email.")
 
         try:
-            validate_password(value, user)
+            validate_password(value, self.user)
         except DjangoValidationError as e:
             raise serializers.ValidationError(e.messages)
         return value
 
     def validate(self, data):
+        data['user'] = self.user
         return data
\ No newline at end of file
@@ -0,0 +1,86 @@
+# apps/custom_auth/signals.py
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.staff_members.models import StaffMember
+from apps.student.models import Student
+
+from .claims import CLAIM_FIELDS, bump_token_versions
+from .lookup import delete_principal, save_principal
+from .principals import principal_cache
+
+
+def _principal_changed(user_type, instance, created=False, update_fields=None, deleted=False):
+    # the email -> account lookup table (lookup.py)
+    if deleted:
+        delete_principal(instance)
+    elif not update_fields or {'email', 'intake', 'intake_id'} & set(update_fields):
+        save_principal(instance)
+
+    # the version read in pre_save, in place of the F() the row was saved with
+    if '_stored_token_version' in instance.__dict__:
+        instance.token_version = instance.__dict__.pop('_stored_token_version')
+
+    # tokens signed with the old claims (claims.py)
+    if getattr(instance, '_claims_changed', False):
+        instance._claims_changed = False
+        bump_token_versions(type(instance), [instance.pk])
+        instance.token_version += 1
+
+    principal_cache.invalidate(user_type, instance.pk)
+    # A new user is in nobody's cache, and last_login is written on every login.
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    principal_cache.bump_version()
+
+
+@receiver(pre_save, sender=StaffMember)
+@receiver(pre_save, sender=Student)
+def claims_changing(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding or instance.pk is None:
+        return
+    fields = [f for f in CLAIM_FIELDS[sender] if not update_fields or f in update_fields]
+    saves_version = not update_fields or 'token_version' in update_fields
+    if not fields and not saves_version:
+        return
+    attnames = [sender._meta.get_field(f).attname for f in fields]
+    stored = sender.objects.filter(pk=instance.pk).values_list('token_version', *attnames).first()
+    if stored is None:
+        instance._claims_changed = False
+        return
+    instance._claims_changed = stored[1:] != tuple(getattr(instance, a) for a in attnames)
+    if saves_version:
+        # Only bump_token_versions() moves token_version: a save writes the column
+        # back to itself, never the (possibly stale) value this instance loaded.
+        instance._stored_token_version = stored[0]
+        instance.token_version = F('token_version')
+
+
+@receiver(post_save, sender=StaffMember)
+@receiver(post_delete, sender=StaffMember)
+def staff_member_changed(sender, instance, created=False, update_fields=None, signal=None, **kwargs):
+    _principal_changed('staff', instance, created, update_fields, deleted=signal is post_delete)
+
+
+@receiver(post_save, sender=Student)
+@receiver(post_delete, sender=Student)
+def student_changed(sender, instance, created=False, update_fields=None, signal=None, **kwargs):
+    _principal_changed('student', instance, created, update_fields, deleted=signal is post_delete)
+
+
+@receiver(m2m_changed, sender=StaffMember.groups.through)
+@receiver(m2m_changed, sender=Student.groups.through)
+def groups_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    user_model = model if reverse else type(instance)
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_token_versions(user_model, [instance.pk])
+    elif action == 'pre_clear':
+        # Clearing a group's members: they are gone by post_clear
+        instance._cleared_members = list(user_model.objects.filter(groups=instance).values_list('pk', flat=True))
+    elif action == 'post_clear':
+        bump_token_versions(user_model, getattr(instance, '_cleared_members', []))
+    elif action in ('post_add', 'post_remove'):
+        bump_token_versions(user_model, pk_set or [])
+
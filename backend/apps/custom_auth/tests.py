@@ -0,0 +1,347 @@
+from datetime import timedelta
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+import openpyxl
+from channels.db import database_sync_to_async
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import AnonymousUser, Group
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+
+from apps.staff_members.models import StaffMember
+from apps.staff_members.permissions import IsStudentManager, IsSupervisor
+from apps.student.models import Intake, Student
+from apps.student.serializers import ExcelUploadSerializer
+from apps.tracks.models import Track
+
+from .authentication import CustomJWTAuthentication
+from .claims import bump_token_versions
+from .hashing import hash_passwords
+from .lookup import find_user, sync_principals
+from .models import Principal, RevokedToken
+from .principals import PrincipalCache, principal_cache
+from .revocation import RevocationStore
+from .serializers import MyTokenObtainPairSerializer, MyTokenRefreshSerializer
+from .websocket import JWTAuthMiddleware
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'presence': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'presence'},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PrincipalCacheTestCase(TestCase):
+    def setUp(self):
+        self.staff = StaffMember.objects.create_user(email="staff@example.com", username="staff", password="pw")
+        self.student = Student.objects.create(email="student@example.com", first_name="Stu", last_name="Dent")
+        self.cache = PrincipalCache(ttl=60, version_check_interval=0)
+        self.auth = type('TestJWTAuthentication', (CustomJWTAuthentication,), {'principals': self.cache})()
+        principal_cache.clear()
+
+    def request(self, user):
+        token = MyTokenObtainPairSerializer.get_token(user).access_token
+        return RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def authenticate(self, user):
+        return self.auth.authenticate(self.request(user))[0]
+
+    def test_repeat_requests_skip_the_lookup(self):
+        """Only the first request of a user queries the database"""
+        # Minting the tokens queries the groups; only authentication is measured.
+        first_request, repeat_request = self.request(self.staff), self.request(self.staff)
+        with CaptureQueriesContext(connection) as first:
+            self.auth.authenticate(first_request)
+        with CaptureQueriesContext(connection) as repeat:
+            user = self.auth.authenticate(repeat_request)[0]
+        self.assertEqual(len(first), 1)
+        self.assertEqual(len(repeat), 0)
+        self.assertEqual(user, self.staff)
+
+    def test_student_token_resolves_a_student(self):
+        """userType picks the model, even when ids collide across models"""
+        user = self.authenticate(self.student)
+        self.assertIsInstance(user, Student)
+        self.assertEqual(user.pk, self.student.pk)
+
+    def test_requests_get_private_copies(self):
+        """Changing request.user does not leak into the next request"""
+        self.authenticate(self.staff).username = "changed"
+        self.assertEqual(self.authenticate(self.staff).username, "staff")
+
+    def test_saving_invalidates_every_worker(self):
+        """A deactivated user is refused at once, here and in other workers"""
+        self.authenticate(self.staff)
+        other_worker = PrincipalCache(ttl=60, version_check_interval=0)
+        other_worker.get('staff', self.staff.pk)
+
+        self.staff.is_active = False
+        self.staff.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(self.staff)
+        self.assertFalse(other_worker.get('staff', self.staff.pk).is_active)
+
+    def test_last_login_does_not_flush(self):
+        """Logins do not empty the other workers' caches"""
+        other_worker = PrincipalCache(ttl=60, version_check_interval=0)
+        other_worker.get('staff', self.staff.pk)
+        self.staff.save(update_fields=['last_login'])
+        with CaptureQueriesContext(connection) as queries:
+            other_worker.get('staff', self.staff.pk)
+        self.assertEqual(len(queries), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class PrincipalLookupTestCase(TestCase):
+    def setUp(self):
+        track = Track.objects.create(name="Python", description="Python track")
+        self.intake = Intake.objects.create(name="Intake 1", track=track)
+        self.other_intake = Intake.objects.create(name="Intake 2", track=track)
+        self.staff = StaffMember.objects.create_user(email="both@example.com", username="both", password="pw")
+        self.student = Student.objects.create(
+            email="both@example.com", first_name="Stu", last_name="Dent", intake=self.intake
+        )
+
+    def test_students_come_first(self):
+        """An email shared by a student and a staff member finds the student"""
+        self.assertEqual(find_user("both@example.com"), self.student)
+
+    def test_intake_narrows_to_students(self):
+        """With an intake only that intake's student matches"""
+        self.assertEqual(find_user("both@example.com", self.intake.id), self.student)
+        self.assertIsNone(find_user("both@example.com", self.other_intake.id))
+
+    def test_email_is_normalized(self):
+        """Case and surrounding spaces do not matter"""
+        self.assertEqual(find_user("  Both@Example.COM "), self.student)
+
+    def test_two_queries_at_most(self):
+        """One query for the lookup table, one for the account"""
+        with CaptureQueriesContext(connection) as queries:
+            find_user("both@example.com")
+        self.assertEqual(len(queries), 2)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(find_user("nobody@example.com"))
+        self.assertEqual(len(queries), 1)
+
+    def test_signals_keep_the_table_in_step(self):
+        """Email changes and deletions are reflected at once"""
+        self.student.email = "moved@example.com"
+        self.student.save()
+        self.assertEqual(find_user("both@example.com"), self.staff)
+        self.assertEqual(find_user("moved@example.com"), self.student)
+
+        self.student.delete()
+        self.assertIsNone(find_user("moved@example.com"))
+
+    def test_sync_after_bulk_changes(self):
+        """sync_principals catches up on writes that sent no signals"""
+        Student.objects.filter(pk=self.student.pk).update(email="bulk@example.com")
+        self.assertIsNone(find_user("bulk@example.com"))
+
+        sync_principals()
+        self.assertEqual(find_user("bulk@example.com"), self.student)
+        self.assertEqual(Principal.objects.count(), 2)
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_imported_students_can_log_in(self):
+        """Students created by the Excel import are in the lookup table without a sync"""
+        workbook = openpyxl.Workbook()
+        workbook.active.append(['First Name', 'Last Name', 'Email', 'Role'])
+        workbook.active.append(['New', 'Comer', 'newcomer@example.com', 'student'])
+        content = BytesIO()
+        workbook.save(content)
+        upload = ExcelUploadSerializer(data={
+            'excel_file': SimpleUploadedFile('students.xlsx', content.getvalue()),
+            'track_id': self.intake.track_id,
+            'intake_name': 'Intake 3',
+        })
+        self.assertTrue(upload.is_valid(), upload.errors)
+        with mock.patch.object(ExcelUploadSerializer, '_generate_password', return_value='imported-pw'):
+            self.assertEqual(upload.save()['created_count'], 1)
+
+        intake = Intake.objects.get(name='Intake 3')
+        response = self.client.post(reverse('api_login'), {
+            'email': 'newcomer@example.com', 'password': 'imported-pw', 'intake_id': intake.id,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['userType'], 'student')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class HashPasswordsTestCase(TestCase):
+    passwords = [f"password-{i}" for i in range(20)]
+
+    def test_parallel_hashes_verify_in_order(self):
+        """Worker processes use the caller's hasher and keep the order"""
+        encoded = hash_passwords(self.passwords, workers=2)
+        self.assertEqual(len(encoded), len(self.passwords))
+        for password, hashed in zip(self.passwords, encoded):
+            self.assertTrue(hashed.startswith('md5$'))
+            self.assertTrue(check_password(password, hashed))
+
+    def test_serial_fallback(self):
+        """A single worker hashes in-process with fresh salts"""
+        encoded = hash_passwords(["same", "same"], workers=1)
+        self.assertNotEqual(encoded[0], encoded[1])
+        self.assertTrue(all(check_password("same", hashed) for hashed in encoded))
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class TokenClaimsTestCase(TestCase):
+    def setUp(self):
+        self.staff = StaffMember.objects.create_user(
+            email="instructor@example.com", username="instructor", password="pw", role=StaffMember.Role.INSTRUCTOR
+        )
+        self.staff.groups.add(Group.objects.create(name=StaffMember.Role.SUPERVISOR))
+        self.staff.refresh_from_db()
+        self.auth = CustomJWTAuthentication()
+        principal_cache.clear()
+
+    def authenticate(self, token):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f"Bearer {token}")
+        user, validated = self.auth.authenticate(request)
+        return SimpleNamespace(user=user, auth=validated)
+
+    def test_group_permissions_need_no_query(self):
+        """Groups come from the token, not from user.groups"""
+        request = self.authenticate(MyTokenObtainPairSerializer.get_token(self.staff).access_token)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertTrue(IsSupervisor().has_permission(request, None))
+            self.assertTrue(IsStudentManager().has_permission(request, None))
+        self.assertEqual(len(queries), 0)
+
+    def test_role_change_refuses_old_tokens(self):
+        """Changing a claim makes earlier access and refresh tokens invalid"""
+        refresh = MyTokenObtainPairSerializer.get_token(self.staff)
+        self.staff.role = StaffMember.Role.ADMIN
+        self.staff.save()
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(refresh.access_token)
+        with self.assertRaises(InvalidToken):
+            MyTokenRefreshSerializer(data={'refresh': str(refresh)}).is_valid()
+        self.assertEqual(self.authenticate(MyTokenObtainPairSerializer.get_token(self.staff).access_token).user.role,
+                         StaffMember.Role.ADMIN)
+
+    def test_group_change_refuses_old_tokens(self):
+        """Leaving a group invalidates the tokens that listed it"""
+        token = MyTokenObtainPairSerializer.get_token(self.staff).access_token
+        self.staff.groups.clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_group_change_survives_a_later_save(self):
+        """A full save() after groups.add() does not write the old token_version back"""
+        token = MyTokenObtainPairSerializer.get_token(self.staff).access_token
+        self.staff.groups.add(Group.objects.create(name=StaffMember.Role.ADMIN))
+        self.staff.first_name = "Renamed"
+        self.staff.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        self.assertEqual(self.staff.token_version, StaffMember.objects.get(pk=self.staff.pk).token_version)
+
+    def test_unrelated_changes_keep_tokens(self):
+        """Saving fields that are not claims keeps tokens valid"""
+        token = MyTokenObtainPairSerializer.get_token(self.staff).access_token
+        self.staff.first_name = "Renamed"
+        self.staff.save()
+        self.assertEqual(self.authenticate(token).user.first_name, "Renamed")
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RevocationTestCase(TestCase):
+    def setUp(self):
+        self.staff = StaffMember.objects.create_user(email="staff@example.com", username="staff", password="pw")
+        self.store = RevocationStore(capacity=1000, check_interval=0)
+        self.serializer = type('TestRefreshSerializer', (MyTokenRefreshSerializer,), {'revocations': self.store})
+        self.expires_at = timezone.now() + timedelta(days=1)
+
+    def refresh(self, token):
+        serializer = self.serializer(data={'refresh': str(token)})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def test_refresh_token_is_used_once(self):
+        """Rotation revokes the old refresh token; the new one works"""
+        token = MyTokenObtainPairSerializer.get_token(self.staff)
+        rotated = self.refresh(token)['refresh']
+        with self.assertRaises(InvalidToken):
+            self.refresh(token)
+        self.assertIn('access', self.refresh(rotated))
+
+    def test_unrevoked_tokens_cost_no_query(self):
+        """Only a filter hit goes to the database"""
+        RevokedToken.objects.create(jti="revoked", expires_at=self.expires_at)
+        self.assertTrue(self.store.is_revoked("revoked"))
+        with CaptureQueriesContext(connection) as queries:
+            for i in range(100):
+                self.assertFalse(self.store.is_revoked(f"fresh-{i}"))
+        self.assertEqual(len(queries), self.store.false_positives)
+
+    def test_other_workers_see_revocations(self):
+        """A revocation in one process reaches the filter of another"""
+        other_worker = RevocationStore(capacity=1000, check_interval=0)
+        self.assertFalse(other_worker.is_revoked("jti"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.store.revoke("jti", self.expires_at))
+        self.assertFalse(self.store.revoke("jti", self.expires_at))
+        self.assertTrue(other_worker.is_revoked("jti"))
+
+    def test_expired_revocations_are_dropped(self):
+        """Tokens past their lifetime leave the table and the filter"""
+        RevokedToken.objects.create(jti="expired", expires_at=timezone.now() - timedelta(seconds=1))
+        self.store.rebuild()
+        self.assertFalse(self.store.is_revoked("expired"))
+        self.assertEqual(self.store.purge_expired(), 1)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class JWTAuthMiddlewareTestCase(TransactionTestCase):
+    def setUp(self):
+        self.staff = StaffMember.objects.create_user(email="ws@example.com", username="ws", password="pw")
+        self.access = str(MyTokenObtainPairSerializer.get_token(self.staff).access_token)
+        principal_cache.clear()
+
+    async def connect(self, **scope):
+        seen = {}
+
+        async def app(scope, receive, send):
+            seen.update(scope)
+
+        await JWTAuthMiddleware(app)({'type': 'websocket', 'query_string': b'', **scope}, None, None)
+        return seen
+
+    async def test_token_in_query_string(self):
+        """?token= resolves the user like the HTTP authentication"""
+        scope = await self.connect(query_string=f"token={self.access}".encode())
+        self.assertEqual(scope['user'], self.staff)
+        self.assertIsNone(scope['auth_subprotocol'])
+
+    async def test_token_as_subprotocol(self):
+        """A ["jwt", token] subprotocol pair is accepted and echoed back"""
+        scope = await self.connect(subprotocols=['jwt', self.access])
+        self.assertEqual(scope['user'], self.staff)
+        self.assertEqual(scope['auth_subprotocol'], 'jwt')
+
+    async def test_bad_or_outdated_token_is_anonymous(self):
+        """Tampered tokens and tokens older than the user's claims are refused"""
+        scope = await self.connect(query_string=b"token=not-a-token")
+        self.assertIsInstance(scope['user'], AnonymousUser)
+
+        await database_sync_to_async(bump_token_versions)(StaffMember, [self.staff.pk])
+        scope = await self.connect(query_string=f"token={self.access}".encode())
+        self.assertIsInstance(scope['user'], AnonymousUser)
+
+    async def test_no_token_keeps_the_session_user(self):
+        """Without a token the user set by the session middleware is kept"""
+        scope = await self.connect(user=self.staff)
+        self.assertEqual(scope['user'], self.staff)
+        self.assertNotIn('auth_subprotocol', scope)
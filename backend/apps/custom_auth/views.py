@@ -11,13 +11,19 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from apps.student.models import Student
 from apps.staff_members.models import StaffMember
+from apps.custom_auth.lookup import find_user
+from apps.custom_auth.revocation import revocations
 
 from .serializers import (
     LoginSerializer,
     MyTokenObtainPairSerializer,
+    MyTokenRefreshSerializer,
     PasswordResetRequestSerializer,
     PasswordResetVerifySerializer,
     PasswordResetConfirmSerializer,
@@ -95,6 +101,14 @@ def login_view(request):
 @api_view(['POST'])
 def logout_view(request):
     try:
+        # The refresh token must not outlive the session (revocation.py)
+        raw_refresh = request.data.get('refresh') or request.COOKIES.get('refresh_token')
+        if raw_refresh:
+            try:
+                refresh = RefreshToken(raw_refresh)
+                revocations.revoke(refresh[api_settings.JTI_CLAIM], datetime_from_epoch(refresh['exp']))
+            except TokenError:
+                pass  # expired or invalid already
         logout(request)
         resp = Response({'message': 'Logout successful'}, status=status.HTTP_200_OK)
         resp.delete_cookie("access_token", path="/")
@@ -113,41 +127,15 @@ class PasswordResetRequestView(APIView):
         intake_id = ser.validated_data.get('intake_id')
         logger.debug(f"Password reset request: email={email}, intake_id={intake_id}")
 
-        user = None
         try:
-            if intake_id:
-                logger.debug(f"Querying Student with email='{email}', intake_id={intake_id}")
-                students = Student.objects.filter(email=email, intake_id=intake_id)
-                logger.debug(f"Found {students.count()} students for email='{email}', intake_id={intake_id}")
-                if students.count() > 1:
-                    logger.warning(f"Multiple students found for email='{email}', intake_id={intake_id}: {students.count()} records")
-                    for student in students:
-                        logger.debug(f" - Student ID: {student.id}, Username: {student.username}")
-                user = students.first()
-                if not user:
-                    logger.warning(f"No student found with email='{email}', intake_id={intake_id}")
-                    raise AuthenticationFailed("No student account found with that email and intake.")
-            else:
-                logger.debug(f"Querying without intake_id for email='{email}'")
-                for model in (Student, StaffMember):
-                    try:
-                        users = model.objects.filter(email=email)
-                        logger.debug(f"Found {users.count()} users in {model.__name__} for email='{email}'")
-                        if users.count() > 1:
-                            logger.warning(f"Multiple {model.__name__} found for email='{email}': {users.count()} records")
-                            for u in users:
-                                logger.debug(f" - {model.__name__} ID: {u.id}, Username: {u.username}")
-                        user = users.first()
-                        if user:
-                            logger.debug(f"Selected user in {model.__name__}: ID={user.id}, Username={user.username}")
-                            break
-                    except Exception as e:
-                        logger.error(f"Error querying {model.__name__} for email='{email}': {str(e)}")
-                        continue
+            user = find_user(email, intake_id)
         except Exception as e:
             logger.error(f"Error during user lookup for email='{email}': {str(e)}")
             raise AuthenticationFailed("An error occurred during authentication.")
 
+        if not user and intake_id:
+            logger.warning(f"No student found with email='{email}', intake_id={intake_id}")
+            raise AuthenticationFailed("No student account found with that email and intake.")
         if not user:
             logger.warning(f"No account found for email='{email}'")
             raise AuthenticationFailed("No account found with that email.")
@@ -173,23 +161,8 @@ class PasswordResetVerifyView(APIView):
         otp = ser.validated_data['otp']
         logger.debug(f"Verifying OTP for email={email}")
 
-        user = None
         try:
-            for model in (Student, StaffMember):
-                try:
-                    users = model.objects.filter(email=email)
-                    logger.debug(f"Found {users.count()} users in {model.__name__} for email='{email}'")
-                    if users.count() > 1:
-                        logger.warning(f"Multiple {model.__name__} found for email='{email}': {users.count()} records")
-                        for u in users:
-                            logger.debug(f" - {model.__name__} ID: {u.id}, Username: {u.username}")
-                    user = users.first()
-                    if user:
-                        logger.debug(f"Selected user in {model.__name__}: ID={user.id}, Username={user.username}")
-                        break
-                except Exception as e:
-                    logger.error(f"Error querying {model.__name__} for email='{email}': {str(e)}")
-                    continue
+            user = find_user(email)
         except Exception as e:
             logger.error(f"Error during user lookup for email='{email}': {str(e)}")
             raise AuthenticationFailed("No account found with that email.")
@@ -217,30 +190,8 @@ class PasswordResetConfirmView(APIView):
         new_pw = ser.validated_data['new_password']
         logger.debug(f"Confirming password reset for email={email}")
 
-        user = None
-        try:
-            for model in (Student, StaffMember):
-                try:
-                    users = model.objects.filter(email=email)
-                    logger.debug(f"Found {users.count()} users in {model.__name__} for email='{email}'")
-                    if users.count() > 1:
-                        logger.warning(f"Multiple {model.__name__} found for email='{email}': {users.count()} records")
-                        for u in users:
-                            logger.debug(f" - {model.__name__} ID: {u.id}, Username: {u.username}")
-                    user = users.first()
-                    if user:
-                        logger.debug(f"Selected user in {model.__name__}: ID={user.id}, Username={user.username}")
-                        break
-                except Exception as e:
-                    logger.error(f"Error querying {model.__name__} for email='{email}': {str(e)}")
-                    continue
-        except Exception as e:
-            logger.error(f"Error during user lookup for email='{email}': {str(e)}")
-            raise AuthenticationFailed("No account found with that email.")
-
-        if not user:
-            logger.warning(f"No account found for email='{email}'")
-            raise AuthenticationFailed("No account found with that email.")
+        # looked up while validating new_password
+        user = ser.validated_data['user']
 
         if cache.get(f"pwdreset_{email}_{user.id}") != otp:
             logger.warning(f"Invalid or expired OTP for email={email}")
@@ -257,4 +208,5 @@ class MyTokenObtainPairView(TokenObtainPairView):
     permission_classes = [AllowAny]
 
 class MyTokenRefreshView(TokenRefreshView):
-    permission_classes = [AllowAny]
\ No newline at end of file
+    permission_classes = [AllowAny]
+    serializer_class = MyTokenRefreshSerializer
\ No newline at end of file
@@ -0,0 +1,63 @@
+# apps/custom_auth/websocket.py
+"""
+JWT authentication for WebSocket connections.
+
+Browsers cannot send an ``Authorization`` header with a WebSocket
+handshake, so ``JWTAuthMiddleware`` takes the access token from, in order:
+
+* the ``token`` query-string parameter (``/ws/chat/<room>/?token=<access>``);
+* the subprotocols ``["jwt", "<access>"]``; the consumer must then accept
+  with ``scope["auth_subprotocol"]`` or the browser drops the connection;
+* the ``access_token`` cookie set by ``login_view``.
+
+The token is validated and its user resolved by ``CustomJWTAuthentication``,
+exactly as for HTTP requests (``userType``/``user_id``, active user, current
+token version). Without a token ``scope["user"]`` is left to the session
+middleware around it; an invalid token makes it ``AnonymousUser``.
+"""
+import logging
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.exceptions import AuthenticationFailed
+
+from .authentication import CustomJWTAuthentication
+
+logger = logging.getLogger(__name__)
+
+SUBPROTOCOL = 'jwt'
+QUERY_PARAM = 'token'
+COOKIE = 'access_token'
+
+
+def token_from_scope(scope):
+    """``(raw token, subprotocol to accept)`` of a handshake; the token is None when it carries none."""
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    if query.get(QUERY_PARAM):
+        return query[QUERY_PARAM][0], None
+    subprotocols = list(scope.get('subprotocols') or [])
+    if SUBPROTOCOL in subprotocols:
+        position = subprotocols.index(SUBPROTOCOL)
+        if position + 1 < len(subprotocols):
+            return subprotocols[position + 1], SUBPROTOCOL
+    return (scope.get('cookies') or {}).get(COOKIE), None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    authentication = CustomJWTAuthentication()
+
+    async def __call__(self, scope, receive, send):
+        raw_token, subprotocol = token_from_scope(scope)
+        if raw_token:
+            scope = dict(scope, user=await self.get_user(raw_token), auth_subprotocol=subprotocol)
+        return await super().__call__(scope, receive, send)
+
+    @database_sync_to_async
+    def get_user(self, raw_token):
+        try:
+            return self.authentication.get_user(self.authentication.get_validated_token(raw_token))
+        except AuthenticationFailed as e:
+            logger.info(f"WebSocket token refused: {e}")
+            return AnonymousUser()
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("staff_members", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="staffmember",
+            name="token_version",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="token version"),
+        ),
+    ]
@@ -62,6 +62,8 @@ class StaffMember(AbstractUser):
 
     is_verified = models.BooleanField(default=False, verbose_name=_('verification status'))
     date_joined = models.DateTimeField(auto_now_add=True, verbose_name=_('date joined'))
+    # Bumped when a claim signed into this user's tokens changes (apps/custom_auth/claims.py)
+    token_version = models.PositiveIntegerField(default=0, editable=False, verbose_name=_('token version'))
 
     class Meta:
         db_table = 'staff_member'
@@ -1,6 +1,7 @@
 from rest_framework import permissions
 from django.utils.translation import gettext_lazy as _
 from apps.staff_members.models import StaffMember
+from apps.custom_auth.claims import in_groups
 
 class BaseRolePermission(permissions.BasePermission):
     """Base permission class for role-based access control."""
@@ -25,8 +26,8 @@ class BaseRolePermission(permissions.BasePermission):
         if user_role in self.allowed_roles:
             return True
         
-        # Fallback to checking groups if role field doesn't exist
-        if request.user.groups.filter(name__in=self.allowed_roles).exists():
+        # Fallback to checking groups if role field doesn't exist (signed into the token)
+        if in_groups(request, self.allowed_roles):
             return True
             
         # Check for superuser status if specified
@@ -73,7 +74,7 @@ class IsAdminOrBranchManager(permissions.BasePermission):
         return (
             request.user.is_superuser or
             user_role in [StaffMember.Role.BRANCH_MANAGER, StaffMember.Role.SUPERVISOR, StaffMember.Role.ADMIN] or
-            request.user.groups.filter(name__in=[StaffMember.Role.BRANCH_MANAGER, StaffMember.Role.SUPERVISOR, StaffMember.Role.ADMIN]).exists()
+            in_groups(request, [StaffMember.Role.BRANCH_MANAGER, StaffMember.Role.SUPERVISOR, StaffMember.Role.ADMIN])
         )
 
     def has_object_permission(self, request, view, obj):
@@ -118,9 +119,7 @@ class IsStudentManager(permissions.BasePermission):
             user_role in [
                 StaffMember.Role.ADMIN, StaffMember.Role.SUPERVISOR, StaffMember.Role.BRANCH_MANAGER
             ] or
-            request.user.groups.filter(
-                name__in=[StaffMember.Role.ADMIN, StaffMember.Role.SUPERVISOR, StaffMember.Role.BRANCH_MANAGER]
-            ).exists()
+            in_groups(request, [StaffMember.Role.ADMIN, StaffMember.Role.SUPERVISOR, StaffMember.Role.BRANCH_MANAGER])
         )
 
     def has_object_permission(self, request, view, obj):
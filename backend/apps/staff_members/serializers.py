@@ -12,6 +12,8 @@ import string
 import logging
 from django.contrib.auth.hashers import make_password
 import openpyxl
+from apps.custom_auth.hashing import hash_passwords
+from apps.custom_auth.lookup import sync_principals
 
 logger = logging.getLogger(__name__)
 
@@ -250,6 +252,7 @@ class ExcelUploadSupervisorSerializer(serializers.Serializer):
             raise serializers.ValidationError(_('Failed to process the Excel file. Please check the format.'))
 
         supervisors = []
+        passwords = []
         errors = []
         existing_emails = set(StaffMember.objects.values_list('email', flat=True))
 
@@ -282,8 +285,8 @@ class ExcelUploadSupervisorSerializer(serializers.Serializer):
                 )
                 
                 validate_password(password, supervisor)
-                supervisor.set_password(password)
                 supervisors.append(supervisor)
+                passwords.append(password)
                 existing_emails.add(email)
                 
             except Exception as e:
@@ -300,8 +303,13 @@ class ExcelUploadSupervisorSerializer(serializers.Serializer):
                 'message': _('No supervisors were created due to errors in the Excel file.')
             })
 
+        for supervisor, encoded in zip(supervisors, hash_passwords(passwords)):
+            supervisor.password = encoded
+
         try:
-            created_supervisors = StaffMember.objects.bulk_create(supervisors)
+            with transaction.atomic():
+                created_supervisors = StaffMember.objects.bulk_create(supervisors)
+                sync_principals(created_supervisors)
             result = {
                 'status': 'success' if not errors else 'partial',
                 'created': len(created_supervisors),
@@ -11,6 +11,8 @@ import logging
 from django.db import transaction
 from django.core.validators import validate_email
 from io import BytesIO
+from apps.custom_auth.hashing import hash_passwords
+from apps.custom_auth.lookup import sync_principals
 
 logger = logging.getLogger(__name__)
 
@@ -151,7 +153,6 @@ class ExcelUploadSerializer(serializers.Serializer):
                     verification_code=verification_code,
                     verified=False
                 )
-                student.set_password(password)
                 students_to_create.append(student)
                 existing_emails_in_intake.add(email)
                 email_password_map[email] = password
@@ -166,9 +167,15 @@ class ExcelUploadSerializer(serializers.Serializer):
                 'errors': errors
             })
 
+        # Hashed together across processes rather than one set_password() per row
+        encoded = hash_passwords(email_password_map[student.email] for student in students_to_create)
+        for student, password in zip(students_to_create, encoded):
+            student.password = password
+
         try:
             with transaction.atomic():
                 created_students = Student.objects.bulk_create(students_to_create)
+                sync_principals(created_students)
                 self._send_verification_emails(created_students, email_password_map)
         except Exception as e:
             logger.error(f"Database error during bulk create: {str(e)}")
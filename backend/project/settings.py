@@ -132,7 +132,7 @@ else:
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.custom_auth.authentication.CustomJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -153,6 +153,24 @@ SIMPLE_JWT = {
     'SIGNING_KEY': SECRET_KEY,
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
+# Token users are cached per process for this many seconds (0 disables; see apps/custom_auth/principals.py)
+AUTH_PRINCIPAL_CACHE_TTL = config('AUTH_PRINCIPAL_CACHE_TTL', default=60, cast=int)
+AUTH_PRINCIPAL_CACHE_SIZE = config('AUTH_PRINCIPAL_CACHE_SIZE', default=10000, cast=int)
+# Shared cache holding the version that makes every worker drop its cached users ('' to disable),
+# read by each worker at most once per check interval (seconds)
+AUTH_PRINCIPAL_VERSION_CACHE = 'presence'
+AUTH_PRINCIPAL_VERSION_CHECK_INTERVAL = config('AUTH_PRINCIPAL_VERSION_CHECK_INTERVAL', default=5, cast=float)
+# Processes hashing passwords during Excel imports (0 = one per available core, 1 = in-process)
+AUTH_PASSWORD_HASH_WORKERS = config('AUTH_PASSWORD_HASH_WORKERS', default=0, cast=int)
+# Used and logged-out refresh tokens are checked against a Bloom filter sized for this many tokens at this
+# false-positive rate, rebuilt from the database every rebuild interval (seconds; see apps/custom_auth/revocation.py)
+AUTH_REVOCATION_BLOOM_CAPACITY = config('AUTH_REVOCATION_BLOOM_CAPACITY', default=100000, cast=int)
+AUTH_REVOCATION_BLOOM_ERROR_RATE = config('AUTH_REVOCATION_BLOOM_ERROR_RATE', default=0.001, cast=float)
+AUTH_REVOCATION_REBUILD_INTERVAL = config('AUTH_REVOCATION_REBUILD_INTERVAL', default=3600, cast=int)
+# Shared cache announcing new revocations to every worker ('' to disable), read at most once per check
+# interval (seconds)
+AUTH_REVOCATION_VERSION_CACHE = 'presence'
+AUTH_REVOCATION_CHECK_INTERVAL = config('AUTH_REVOCATION_CHECK_INTERVAL', default=0, cast=float)
 
 # Static and media files
 STATIC_URL = '/static/'
@@ -161,6 +179,40 @@ STATICFILES_DIRS = [BASE_DIR / 'static'] if (BASE_DIR / 'static').exists() else
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# AI recommendations: memory-mapped assignment embeddings shared by all workers
+AI_EMBEDDINGS_DIR = Path(config('AI_EMBEDDINGS_DIR', default=str(BASE_DIR / 'embeddings')))
+# Unix socket of the BERT inference worker (manage.py run_inference_worker); empty loads the model in-process
+AI_INFERENCE_WORKER_SOCKET = config('AI_INFERENCE_WORKER_SOCKET', default='')
+# Texts per BERT forward pass; batches are length-bucketed and padded only to their longest row
+AI_EMBEDDING_BATCH_SIZE = config('AI_EMBEDDING_BATCH_SIZE', default=32, cast=int)
+# Opt-in fast mode: int8 dynamic quantization of the model (switching it re-encodes the store on the next sync), and float16/int8 storage of assignment vectors
+AI_QUANTIZED_INFERENCE = config('AI_QUANTIZED_INFERENCE', default='False', cast=bool)
+AI_EMBEDDING_DTYPE = config('AI_EMBEDDING_DTYPE', default='float32')
+# Similarity search backend: 'exact' (full scan) or 'ivf' (approximate, for large catalogs)
+AI_VECTOR_INDEX = config('AI_VECTOR_INDEX', default='exact')
+AI_IVF_LISTS = config('AI_IVF_LISTS', default=0, cast=int)  # 0 = sqrt(number of assignments)
+AI_IVF_NPROBE = config('AI_IVF_NPROBE', default=8, cast=int)
+# LRU/TTL cache of brief-description embeddings; AI_QUERY_CACHE_SHARED also stores them in the Django cache
+AI_QUERY_CACHE_SIZE = config('AI_QUERY_CACHE_SIZE', default=1024, cast=int)
+AI_QUERY_CACHE_TTL = config('AI_QUERY_CACHE_TTL', default=3600, cast=int)
+AI_QUERY_CACHE_SHARED = config('AI_QUERY_CACHE_SHARED', default='False', cast=bool)
+# Micro-batching of concurrent brief embeddings; a window of 0 runs each request on its own
+AI_BATCH_WINDOW_MS = config('AI_BATCH_WINDOW_MS', default=5, cast=float)
+AI_BATCH_MAX_SIZE = config('AI_BATCH_MAX_SIZE', default=32, cast=int)
+# Assignments precomputed per student (manage.py build_student_recommendations, refreshed on new grades)
+AI_STUDENT_RECOMMENDATIONS_TOP_K = config('AI_STUDENT_RECOMMENDATIONS_TOP_K', default=10, cast=int)
+
+# Caches: per-process by default; presence needs one shared by every worker
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'presence': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('REDIS_URL', default='redis://localhost:6379'),
+    },
+}
+
 # Channels (WebSockets)
 CHANNEL_LAYERS = {
     'default': {
@@ -172,6 +224,21 @@ CHANNEL_LAYERS = {
         },
     },
 }
+# Chat messages are group-committed: one bulk INSERT per CHAT_MESSAGE_BATCH_SIZE messages or per
+# interval, whichever comes first; senders wait for it (0 inserts each message at once)
+CHAT_MESSAGE_BATCH_SIZE = config('CHAT_MESSAGE_BATCH_SIZE', default=100, cast=int)
+CHAT_MESSAGE_FLUSH_INTERVAL_MS = config('CHAT_MESSAGE_FLUSH_INTERVAL_MS', default=20, cast=float)
+# Presence lives in a cache shared by all workers (never the database); TTL and heartbeat in seconds
+CHAT_PRESENCE_CACHE = 'presence'
+CHAT_PRESENCE_TTL = config('CHAT_PRESENCE_TTL', default=60, cast=int)
+CHAT_PRESENCE_HEARTBEAT_INTERVAL = config('CHAT_PRESENCE_HEARTBEAT_INTERVAL', default=20, cast=int)
+CHAT_TYPING_INTERVAL = config('CHAT_TYPING_INTERVAL', default=3, cast=float)
+# Read receipts from message fetches are buffered and written at most once per participant per
+# this many seconds (0 writes each one immediately)
+CHAT_READ_RECEIPT_INTERVAL = config('CHAT_READ_RECEIPT_INTERVAL', default=5, cast=float)
+# Messages older than this many days move to the archive table (manage.py archive_chat_messages)
+CHAT_HOT_RETENTION_DAYS = config('CHAT_HOT_RETENTION_DAYS', default=30, cast=int)
+CHAT_ARCHIVE_BATCH_SIZE = config('CHAT_ARCHIVE_BATCH_SIZE', default=5000, cast=int)
 
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -71,13 +71,12 @@ const ChatRoomList = () => {
   const filteredResults = (
     Array.isArray(searchResults) ? searchResults : searchResults?.results || []
   )
-    .filter((u) => u.id !== currentUserId)
     .filter((u) => u.role !== "admin" || currentUserRole === "branchmanager");
 
   // create or open chat
   const handleCreateRoom = async (user) => {
     try {
-      const action = await dispatch(createRoom(user.id));
+      const action = await dispatch(createRoom(user));
       if (createRoom.fulfilled.match(action)) {
         const room = action.payload;
         navigate(`/chat/rooms/${room.id}`, { state: { otherUser: user } });
@@ -22,10 +22,12 @@ export const fetchMyRooms = createAsyncThunk(
 // Create (or get) a room with another user
 export const createRoom = createAsyncThunk(
   "chat/createRoom",
-  async (otherUserId, thunkAPI) => {
+  async (otherUser, thunkAPI) => {
     try {
+      // directory results are tagged { type, id }; a bare id means a staff member
       const resp = await apiClient.post("/chat/rooms/", {
-        other_user_id: otherUserId,
+        other_user_id: otherUser?.id ?? otherUser,
+        other_user_type: otherUser?.type ?? "staff",
       });
       return resp.data;
     } catch (err) {